@@ -1,26 +1,367 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from service.cache.html_cache import HTMLCache
+from service.cache.image_cache import ImageMirrorCache
 from service.persistence.local_persistence import LocalPersistence
 from service.persistence.oa_system_persistence import OASystemPersistence
+from service.persistence.persistence import Persistence
 from service.scheduler.url_base_csdn_scheduler import CSDNURLProducer, CSDNURLConsumer
+from service.scheduler.task_backend import TaskBackend
 from service.scheduler.url_base_scheduler import URLScheduler
-from utils.logger import logger
+from service.scheduler.url_source import url_file_identity
+from utils.bloom_filter import BloomFilter
+from utils.config import config
+from utils.crawl_journal import CrawlJournal
+from utils.data import resolve_data_path
+from utils.http_client import http_client
+from utils.logger import logger, Logger
+from utils.metrics import metrics, MetricsServer, MetricsReporter
+from utils.rate_limiter import RateLimiter, HostRateLimiter
+from utils.retry import RetryPolicy, RetryBudget
+
+
+def configure_logging():
+    """
+    按 Logging 配置重新创建日志输出：默认异步输出，工作线程只把日志记录放入队列，由后台线程写入控制台和文件，
+    日志文件按大小轮转，RotateWhen 不为空时按时间轮转（取值同 TimedRotatingFileHandler 的 when，如 midnight）
+    """
+    section = config.get('Logging') or {}
+    Logger.reconfigure(
+        console_level=logging.getLevelName(section.get('ConsoleLevel') or 'INFO'),
+        file_level=logging.getLevelName(section.get('FileLevel') or 'DEBUG'),
+        async_mode=section.get('Async') is not False,
+        max_bytes=int((section.get('MaxSizeMB') or 0) * 1024 * 1024),
+        backup_count=section.get('BackupCount') or 10,
+        when=section.get('RotateWhen') or None
+    )
+
+
+def create_visited_tasks() -> BloomFilter:
+    """记录已爬取的文章，持久化到磁盘，重启后跳过已爬取的文章"""
+    return BloomFilter(
+        capacity=config.get('Crawler', 'VisitedFilterCapacity') or 20000000,
+        error_rate=config.get('Crawler', 'VisitedFilterErrorRate') or 0.001,
+        file_path=os.path.join(resolve_data_path('./scheduler'), 'csdn_visited.bloom')
+    )
+
+
+def create_image_cache(persistence: Persistence) -> ImageMirrorCache or None:
+    """跨文章、跨运行复用已镜像的图片，镜像链接只对同一种持久化服务有效"""
+    if not config.get('ImageCache', 'Enabled'):
+        return None
+    return ImageMirrorCache(
+        db_path=os.path.join(resolve_data_path('./cache'), 'image_mirror.sqlite3'),
+        namespace=type(persistence).__name__,
+        max_entries=config.get('ImageCache', 'MaxEntriesPerTable') or 200000,
+        # 本地存储的镜像链接是上次运行工作目录中的文件路径，工作目录可能已被清理
+        local_files=isinstance(persistence, LocalPersistence)
+    )
+
+
+def create_html_cache() -> HTMLCache or None:
+    """保存下载的网页，重新爬取时发送条件请求，修复解析器后重新解析无需再次下载"""
+    if not config.get('HTMLCache', 'Enabled'):
+        return None
+    return HTMLCache(
+        dir_path=resolve_data_path('./cache/html'),
+        ttl_seconds=config.get('HTMLCache', 'TTLSeconds') or 0,
+        max_bytes=(config.get('HTMLCache', 'MaxSizeMB') or 0) * 1024 * 1024
+    )
+
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    asyncio 引擎的所有消费者共享同一个限流器，控制对 CSDN 的整体请求频率，
+    线程引擎和流水线引擎使用按主机的 HostLimiter 配置
+    """
+    return RateLimiter(rate=config.get('AsyncEngine', 'RequestsPerSecond') or 0,
+                       burst=config.get('AsyncEngine', 'RequestsBurst') or 1)
+
+
+def create_host_limiter() -> HostRateLimiter:
+    """HTML 下载器和图片下载器共享的按主机自适应限流器，未单独配置的主机使用 HostLimiter 的默认配置"""
+    def to_options(section: dict) -> dict:
+        options = dict(rate=section.get('RequestsPerSecond'), burst=section.get('Burst'),
+                       min_rate=section.get('MinRequestsPerSecond'), max_concurrency=section.get('MaxConcurrency'),
+                       min_concurrency=section.get('MinConcurrency'))
+        return {key: value for key, value in options.items() if value is not None}
+
+    section = config.get('HostLimiter') or {}
+    hosts = section.get('Hosts') or {}
+    host_limiter = HostRateLimiter(**to_options(section),
+                                   hosts={host: to_options(options) for host, options in hosts.items()})
+    # 输出指标时实时读取各主机的限流状态
+    for name, key, documentation in [('crawler_host_rate', 'rate', '按主机自适应限流器当前的每秒请求数，0 为不限'),
+                                     ('crawler_host_concurrency', 'concurrency', '按主机自适应限流器当前的并发数上限'),
+                                     ('crawler_host_in_flight', 'in_flight', '各主机进行中的请求数')]:
+        metrics.gauge(name, documentation, ['host'],
+                      function=lambda key=key: {(host,): stats[key] for host, stats in host_limiter.stats().items()})
+    return host_limiter
+
+
+def create_retry_policy() -> RetryPolicy:
+    """所有 HTML 下载器共享同一个重试策略和重试预算，目标网站故障时重试请求不会占满连接池"""
+    return RetryPolicy(
+        max_attempts=config.get('Retry', 'MaxAttempts') or 3,
+        base_delay=config.get('Retry', 'BaseDelaySeconds') or 1,
+        max_delay=config.get('Retry', 'MaxDelaySeconds') or 60,
+        budget=RetryBudget(ratio=config.get('Retry', 'BudgetRatio') or 0.2,
+                           min_per_second=config.get('Retry', 'BudgetMinPerSecond') or 1)
+    )
+
+
+def create_crawl_journal() -> CrawlJournal or None:
+    """记录任务的入队和完成，进程被杀死或崩溃后重新运行时从中断的位置继续"""
+    if not config.get('Journal', 'Enabled'):
+        return None
+    url_file = CSDNURLProducer.url_file_path()
+    return CrawlJournal(
+        file_path=os.path.join(resolve_data_path('./scheduler'), 'csdn_crawl.journal'),
+        sync_interval=config.get('Journal', 'SyncIntervalSeconds') or 1,
+        sync_batch_size=config.get('Journal', 'SyncBatchSize') or 1000,
+        compact_records=config.get('Journal', 'CompactRecords') or 0,
+        compact_max_bytes=int((config.get('Journal', 'CompactMaxSizeMB') or 0) * 1024 * 1024),
+        # URL 文件被替换或修改后，上次记录的偏移量不再有效
+        source=url_file_identity(url_file) if url_file else None
+    )
+
+
+def create_task_backend() -> TaskBackend or None:
+    """
+    分布式模式下多个节点通过 Redis 共享待爬队列和去重集合，需要安装 redis，
+    所有节点的 KeyPrefix 和布隆过滤器参数需要相同，未启用时返回 None，调度器使用进程内的队列
+    """
+    if not config.get('Distributed', 'Enabled'):
+        return None
+    from service.scheduler.redis_task_backend import RedisTaskBackend
+    return RedisTaskBackend(
+        url=config.get('Distributed', 'RedisURL') or 'redis://localhost:6379/0',
+        prefix=config.get('Distributed', 'KeyPrefix') or 'blog-crawler',
+        queue_maxsize=config.get('Crawler', 'QueueMaxSize') or 0,
+        visibility_timeout=config.get('Distributed', 'VisibilityTimeoutSeconds') or 300,
+        capacity=config.get('Crawler', 'VisitedFilterCapacity') or 20000000,
+        error_rate=config.get('Crawler', 'VisitedFilterErrorRate') or 0.001,
+        poll_interval=config.get('Distributed', 'PollIntervalSeconds') or 1,
+        drain_grace=config.get('Distributed', 'DrainGraceSeconds') or 0,
+        producer_ttl=config.get('Distributed', 'ProducerTTLSeconds') or 30
+    )
+
+
+def create_scheduler(visited_tasks: BloomFilter, journal: CrawlJournal, backend: TaskBackend) -> URLScheduler:
+    """线程引擎和流水线引擎共用的调度器配置，提供 backend 时 visited_tasks 不再使用"""
+    return URLScheduler(stats_report_interval=config.get('Crawler', 'StatsReportIntervalSeconds') or 0,
+                        queue_maxsize=config.get('Crawler', 'QueueMaxSize') or 0,
+                        visited_tasks=visited_tasks, journal=journal, backend=backend,
+                        host_concurrency=config.get('Crawler', 'QueueHostConcurrency') or 0)
+
+
+def create_url_producer(scheduler: URLScheduler, journal: CrawlJournal) -> CSDNURLProducer or None:
+    """
+    有爬取日志时从上次的 URL 文件偏移量继续读取，并优先重新入队上次未完成的 URL
+    分布式模式下 Distributed.RunProducer 为 false 的节点只消费共享队列中的任务，不读取 URL 文件
+    """
+    if config.get('Distributed', 'Enabled') and config.get('Distributed', 'RunProducer') is False:
+        return None
+    if not journal:
+        return CSDNURLProducer(url_scheduler=scheduler)
+    return CSDNURLProducer(url_scheduler=scheduler, start_offset=journal.offset,
+                           resume_urls=journal.pending_urls(include_failed=bool(config.get('Journal', 'RetryFailed'))))
+
+
+def create_metrics() -> tuple:
+    """
+    Metrics.Port 不为 0 时启动 /metrics 接口供 Prometheus 抓取，
+    Metrics.SummaryIntervalSeconds 不为 0 时定期在日志中输出吞吐、耗时分位数和缓存命中等汇总
+    :return: (指标服务, 汇总日志线程)，未启用的为 None
+    """
+    if not config.get('Metrics', 'Enabled'):
+        return None, None
+    for name, key, documentation in [('crawler_http_pool_requests', 'requests', '各主机连接池累计发出的请求数'),
+                                     ('crawler_http_pool_connections', 'new_connections', '各主机连接池累计新建的连接数'),
+                                     ('crawler_http_pool_idle', 'idle', '各主机连接池当前的空闲连接数')]:
+        metrics.gauge(name, documentation, ['pool'],
+                      function=lambda key=key: {(pool,): stats[key] for pool, stats in http_client.stats().items()})
+    server = None
+    port = config.get('Metrics', 'Port')
+    if port:
+        server = MetricsServer(metrics, host=config.get('Metrics', 'Host') or '127.0.0.1', port=port)
+        server.start()
+    reporter = None
+    interval = config.get('Metrics', 'SummaryIntervalSeconds')
+    if interval:
+        reporter = MetricsReporter(metrics, interval=interval, names=[
+            'crawler_articles_total', 'crawler_tasks_total', 'crawler_task_retries_total',
+            'crawler_http_requests_total', 'crawler_http_received_bytes_total', 'crawler_images_total',
+            'crawler_html_cache_total', 'crawler_retry_budget_rejected_total', 'crawler_step_seconds',
+            'crawler_http_request_seconds', 'crawler_queue_depth', 'crawler_worker_utilization'
+        ])
+        reporter.start()
+    return server, reporter
+
+
+def run_thread_engine(persistence: Persistence, visited_tasks: BloomFilter, image_cache: ImageMirrorCache,
+                      journal: CrawlJournal = None, backend: TaskBackend = None):
+    """基于线程的爬虫引擎"""
+    scheduler = create_scheduler(visited_tasks, journal, backend)
+    producer = create_url_producer(scheduler, journal)
+    host_limiter = create_host_limiter()
+    html_cache = create_html_cache()
+    retry_policy = create_retry_policy()
+    # 多个消费者共同消费 CSDN-URL 队列，数量由 Crawler.ConsumerCount 配置
+    consumer_count = max(int(config.get('Crawler', 'ConsumerCount') or 1), 1)
+    consumers = [CSDNURLConsumer(url_scheduler=scheduler, persistence=persistence, worker_id=i,
+                                 image_cache=image_cache, html_cache=html_cache, host_limiter=host_limiter,
+                                 retry_policy=retry_policy)
+                 for i in range(consumer_count)]
+    scheduler.start()
+    if producer:
+        producer.start()
+    for consumer in consumers:
+        consumer.start()
+
+    scheduler.join()
+    if producer:
+        producer.join()
+    for consumer in consumers:
+        consumer.join()
+    host_limiter.log_stats()
+
+
+def run_pipeline_engine(persistence: Persistence, visited_tasks: BloomFilter, image_cache: ImageMirrorCache,
+                        journal: CrawlJournal = None, backend: TaskBackend = None):
+    """
+    基于流水线的爬虫引擎：下载、解析、镜像、持久化四个阶段各有自己的队列和消费者数量，
+    解析阶段在进程池中执行，不受 GIL 限制，可以用满所有 CPU 核
+    """
+    from service.parser.csdn_parser import init_extract_worker
+    from service.scheduler.url_base_csdn_pipeline import CSDNDownloadConsumer, CSDNParseConsumer, \
+        CSDNMirrorConsumer, CSDNPersistConsumer
+
+    scheduler = create_scheduler(visited_tasks, journal, backend)
+    producer = create_url_producer(scheduler, journal)
+    host_limiter = create_host_limiter()
+    html_cache = create_html_cache()
+    retry_policy = create_retry_policy()
+    parse_processes = max(int(config.get('Pipeline', 'ParseProcesses') or os.cpu_count() or 1), 1)
+    # 使用 spawn 启动解析进程，避免在已有多个线程的进程中 fork
+    executor = ProcessPoolExecutor(max_workers=parse_processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=init_extract_worker)
+    consumers = []
+    for i in range(max(int(config.get('Pipeline', 'DownloadWorkers') or 1), 1)):
+        consumers.append(CSDNDownloadConsumer(url_scheduler=scheduler, worker_id=i, html_cache=html_cache,
+                                              host_limiter=host_limiter, retry_policy=retry_policy))
+    # 每个解析线程同一时间只等待一个解析结果，线程数与进程数相同
+    for i in range(parse_processes):
+        consumers.append(CSDNParseConsumer(url_scheduler=scheduler, executor=executor, worker_id=i))
+    for i in range(max(int(config.get('Pipeline', 'MirrorWorkers') or 1), 1)):
+        consumers.append(CSDNMirrorConsumer(url_scheduler=scheduler, persistence=persistence, worker_id=i,
+                                            image_cache=image_cache, host_limiter=host_limiter))
+    for i in range(max(int(config.get('Pipeline', 'PersistWorkers') or 1), 1)):
+        consumers.append(CSDNPersistConsumer(url_scheduler=scheduler, persistence=persistence, worker_id=i))
+    scheduler.start()
+    if producer:
+        producer.start()
+    for consumer in consumers:
+        consumer.start()
+
+    scheduler.join()
+    if producer:
+        producer.join()
+    for consumer in consumers:
+        consumer.join()
+    host_limiter.log_stats()
+    executor.shutdown()
+
+
+def warn_asyncio_unsupported(journal: CrawlJournal, backend: TaskBackend):
+    """
+    asyncio 引擎只实现了下载、解析和持久化，线程引擎和流水线引擎的以下功能不会生效，开启时输出警告，
+    避免误以为中断后可以恢复或请求受到按主机限流的保护
+    """
+    unsupported = []
+    if journal:
+        unsupported.append('爬取日志（Journal），中断后无法从上次的位置继续')
+    if config.get('HTMLCache', 'Enabled'):
+        unsupported.append('网页缓存（HTMLCache），每次都重新下载网页')
+    if backend:
+        unsupported.append('分布式模式（Distributed），将只使用本地队列')
+    for feature in unsupported:
+        logger.warning(f"asyncio 引擎不支持{feature}")
+    logger.warning("asyncio 引擎不使用 HostLimiter 和 Retry 配置，请求频率由 AsyncEngine.RequestsPerSecond 控制，"
+                   "下载失败时原地重试")
+
+
+async def run_asyncio_engine(persistence: Persistence, visited_tasks: BloomFilter, image_cache: ImageMirrorCache):
+    """基于 asyncio 的爬虫引擎，需要安装 aiohttp"""
+    from service.downloader.async_downloader import create_client_session, AsyncHTMLDownloader, \
+        AsyncCSDNImageDownloader
+    from service.parser.csdn_parser import CSDNContentParser
+    from service.scheduler.async_scheduler import AsyncBaseScheduler
+    from service.scheduler.async_url_base_csdn_scheduler import AsyncCSDNURLProducer, AsyncCSDNURLConsumer
+
+    scheduler = AsyncBaseScheduler(queue_maxsize=config.get('Crawler', 'QueueMaxSize') or 0,
+                                   visited_tasks=visited_tasks)
+    AsyncCSDNURLProducer(scheduler=scheduler)
+    # 解析和持久化在线程池中执行，线程数即同时解析的文章数
+    executor = ThreadPoolExecutor(max_workers=config.get('AsyncEngine', 'ParseWorkers') or 4,
+                                  thread_name_prefix='async-parse')
+    async with create_client_session(limit=config.get('AsyncEngine', 'ConnectionLimit') or 100,
+                                     limit_per_host=config.get('AsyncEngine', 'HostConcurrency') or 8) as session:
+        html_downloader = AsyncHTMLDownloader(session, rate_limiter=create_rate_limiter())
+        image_downloader = AsyncCSDNImageDownloader(session, asyncio.get_running_loop())
+        parser = CSDNContentParser(persistence, image_downloader, image_cache=image_cache)
+        consumer_count = max(int(config.get('AsyncEngine', 'ConsumerCount') or 1), 1)
+        for i in range(consumer_count):
+            AsyncCSDNURLConsumer(scheduler=scheduler, persistence=persistence, parser=parser,
+                                 html_downloader=html_downloader, executor=executor, worker_id=i)
+        await scheduler.run()
+    executor.shutdown()
 
 
 def main():
-    scheduler = URLScheduler()
+    configure_logging()
     # 使用 OASystem 进行存储，适用 OASystem 内部人员
     # persistence = OASystemPersistence()
     # 使用本地存储服务进行测试，适用所有人
-    persistence = LocalPersistence()
-    producer = CSDNURLProducer(url_scheduler=scheduler)
-    consumer = CSDNURLConsumer(url_scheduler=scheduler, persistence=persistence)
-    scheduler.start()
-    producer.start()
-    consumer.start()
+    journal = create_crawl_journal()
+    # 从爬取日志恢复时继续写入上次运行的工作目录
+    persistence = LocalPersistence(work_dir=journal.meta.get('work_dir') if journal else None)
+    if journal:
+        journal.set_meta(work_dir=persistence.work_dir)
+    visited_tasks = create_visited_tasks()
+    image_cache = create_image_cache(persistence)
+    backend = create_task_backend()
+    metrics_server, metrics_reporter = create_metrics()
 
-    scheduler.join()
-    producer.join()
-    consumer.join()
+    # Crawler.Engine 为 asyncio 时使用基于 asyncio 的引擎，为 pipeline 时使用多阶段流水线引擎，否则使用基于线程的引擎
+    # asyncio 引擎不写爬取日志，也不支持网页缓存、按主机限流、延迟重试和分布式模式
+    engine = config.get('Crawler', 'Engine')
+    if engine == 'asyncio':
+        warn_asyncio_unsupported(journal, backend)
+        asyncio.run(run_asyncio_engine(persistence, visited_tasks, image_cache))
+    elif engine == 'pipeline':
+        run_pipeline_engine(persistence, visited_tasks, image_cache, journal, backend)
+    else:
+        run_thread_engine(persistence, visited_tasks, image_cache, journal, backend)
 
+    # 先提交持久化服务缓冲区中的文章，提交结束的回调仍需写入去重状态和爬取日志
+    persistence.close()
+    http_client.log_stats()
+    if metrics_reporter:
+        metrics_reporter.stop()
+    if metrics_server:
+        metrics_server.stop()
+    if backend:
+        backend.close()
+    visited_tasks.close()
+    if journal:
+        journal.close()
+    if image_cache:
+        image_cache.close()
     logger.info('爬虫结束')
 
 
@@ -0,0 +1,106 @@
+"""
+离线重放：修改 CSDNContentParser 后，使用网页缓存中已下载的页面重新生成文章，不访问网络。
+- 解析在进程池中并行执行，用满所有 CPU 核
+- 图片只从图片镜像缓存中按原始链接查找，未命中的图片保留原始链接
+- 页面按缓存目录顺序流式读取，同时提交的解析任务数有上限，内存占用与缓存大小无关
+用法: python replay.py [网页缓存目录]，默认使用 data/cache/html
+"""
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from main import create_image_cache
+from service.cache.html_cache import HTMLCache
+from service.downloader.image_downloader import OfflineImageDownloader
+from service.parser.csdn_parser import CSDNContentParser, extract_article, init_extract_worker
+from service.persistence.local_persistence import LocalPersistence
+from service.persistence.oa_system_persistence import OASystemPersistence
+from utils.config import config
+from utils.data import resolve_data_path
+from utils.logger import logger
+
+
+def extract_cached_page(html_path: str, url: str) -> dict:
+    """
+    在解析进程中读取缓存的页面并解析，只在进程间传递文件路径，避免传输网页内容
+    :param html_path: 缓存的网页内容文件路径
+    :param url: 网页 URL
+    :return: extract_article 的解析结果
+    """
+    with open(html_path, 'r', encoding='utf-8') as file:
+        return extract_article(file.read(), url)
+
+
+def replay(html_cache: HTMLCache, parser: CSDNContentParser, persistence, processes: int) -> tuple:
+    """
+    重放网页缓存中的所有页面
+    :param html_cache: 网页缓存
+    :param parser: 离线解析器，用于替换镜像图片
+    :param persistence: 持久化服务
+    :param processes: 解析进程数
+    :return: 成功数和失败数
+    """
+    succeeded, failed = 0, 0
+    # 只保留有限个未完成的解析任务，解析结果按提交顺序处理
+    max_in_flight = processes * 4
+    in_flight = deque()
+
+    def handle(url, future):
+        nonlocal succeeded, failed
+        try:
+            result = parser.apply_mirrored_images(future.result())
+            persistence.save_article(
+                title=result['title'],
+                cover=result['cover'],
+                content=result['html'],
+                category='编程开发',
+                brief=result['brief'],
+                urls=result['image_urls']
+            )
+            succeeded += 1
+        except Exception as e:
+            logger.error(f"重放 {url} 时发生错误: {e}")
+            failed += 1
+
+    # 使用 spawn 启动解析进程，与流水线引擎一致
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_extract_worker) as executor:
+        for url, html_path in html_cache.iter_pages():
+            if len(in_flight) >= max_in_flight:
+                handle(*in_flight.popleft())
+            in_flight.append((url, executor.submit(extract_cached_page, html_path, url)))
+        while in_flight:
+            handle(*in_flight.popleft())
+    return succeeded, failed
+
+
+def main():
+    dir_path = sys.argv[1] if len(sys.argv) > 1 else resolve_data_path('./cache/html')
+    # 使用 OASystem 进行存储，适用 OASystem 内部人员
+    # persistence = OASystemPersistence()
+    # 使用本地存储服务进行测试，适用所有人
+    persistence = LocalPersistence()
+    image_cache = create_image_cache(persistence)
+    if not image_cache:
+        logger.warning("图片镜像缓存未启用（ImageCache.Enabled），所有图片都将保留原始链接")
+    # 只打开已有的缓存，不做淘汰
+    html_cache = HTMLCache(dir_path, max_bytes=0)
+    parser = CSDNContentParser(persistence, OfflineImageDownloader(), image_concurrency=1, image_cache=image_cache)
+    processes = max(int(config.get('Pipeline', 'ParseProcesses') or os.cpu_count() or 1), 1)
+
+    start_time = time.time()
+    succeeded, failed = replay(html_cache, parser, persistence, processes)
+    elapsed = time.time() - start_time
+    logger.info(f"重放结束: 成功 {succeeded} 篇，失败 {failed} 篇，耗时 {elapsed:.1f} 秒，"
+                f"{succeeded / max(elapsed, 1e-6):.1f} 篇/秒")
+
+    if image_cache:
+        image_cache.close()
+    persistence.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils.logger import logger
+from utils.url import canonicalize_url
+
+
+class HTMLCache:
+    """
+    网页原始 HTML 缓存，以规范化 URL 的 MD5 为键保存在磁盘上：
+    - {md5}.html 保存网页内容，{md5}.json 保存 url、ETag、Last-Modified 和下载时间
+    - 缓存在 TTL 内视为新鲜，直接使用而不访问网络；过期后由下载器发送条件请求，304 时继续使用缓存内容
+    - 缓存总大小超过上限后，按最近下载/验证时间淘汰最旧的页面
+    文件按 MD5 的前两位分散到子目录中，避免单个目录下文件过多
+    """
+
+    def __init__(self, dir_path: str, ttl_seconds: float = 86400, max_bytes: int = 2 * 1024 ** 3):
+        """
+        :param dir_path: 缓存目录
+        :param ttl_seconds: 缓存的有效期（秒），为 0 时每次都发送条件请求验证
+        :param max_bytes: 缓存的最大总大小（字节），为 0 时不限制
+        """
+        self.dir_path = dir_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.dir_path, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path, _ in self._iter_files())
+        logger.info(f"已加载网页缓存: {dir_path}，共 {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def _paths(self, url: str) -> tuple:
+        """
+        :return: 网页内容文件和元数据文件的路径
+        """
+        key = hashlib.md5(canonicalize_url(url).encode('utf-8')).hexdigest()
+        base_path = os.path.join(self.dir_path, key[:2], key)
+        return f'{base_path}.html', f'{base_path}.json'
+
+    def _iter_files(self):
+        """
+        遍历缓存中的所有页面
+        :return: (网页内容文件路径, 元数据文件路径) 生成器
+        """
+        for sub_dir in os.scandir(self.dir_path):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith('.html'):
+                    yield entry.path, entry.path[:-len('.html')] + '.json'
+
+    def iter_pages(self):
+        """
+        遍历缓存中的所有页面，不读取网页内容，用于离线重放
+        :return: (网页 URL, 网页内容文件路径) 生成器
+        """
+        for html_path, meta_path in self._iter_files():
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as file:
+                    yield json.load(file)['url'], html_path
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def get(self, url: str) -> dict or None:
+        """
+        读取缓存的页面
+        :param url: 网页 URL
+        :return: 包含 url、body、etag、last_modified、fetched_at 的字典，未缓存时返回 None
+        """
+        html_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+            with open(html_path, 'r', encoding='utf-8') as file:
+                entry['body'] = file.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """判断缓存的页面是否仍在有效期内，有效期内无需访问网络"""
+        return self.ttl_seconds > 0 and time.time() - entry['fetched_at'] < self.ttl_seconds
+
+    def put(self, url: str, body: str, etag: str = None, last_modified: str = None):
+        """
+        保存页面，写入临时文件后再替换，中途退出不会留下不完整的缓存
+        :param url: 网页 URL
+        :param body: 网页内容
+        :param etag: 响应头中的 ETag
+        :param last_modified: 响应头中的 Last-Modified
+        """
+        html_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(html_path), exist_ok=True)
+        old_size = os.path.getsize(html_path) if os.path.exists(html_path) else 0
+        self._write_atomic(html_path, body)
+        self._write_meta(meta_path, url, etag, last_modified)
+        with self.lock:
+            self.total_bytes += os.path.getsize(html_path) - old_size
+            over_limit = self.max_bytes and self.total_bytes > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def touch(self, url: str, entry: dict):
+        """
+        服务器返回 304 时调用，更新缓存的验证时间，使其重新进入有效期
+        :param url: 网页 URL
+        :param entry: get 返回的缓存页面
+        """
+        html_path, meta_path = self._paths(url)
+        try:
+            os.utime(html_path)
+        except OSError:
+            # 读取缓存后页面已被淘汰，重新写入
+            self.put(url, entry['body'], entry.get('etag'), entry.get('last_modified'))
+            return
+        self._write_meta(meta_path, url, entry.get('etag'), entry.get('last_modified'))
+
+    def _write_meta(self, meta_path: str, url: str, etag: str or None, last_modified: str or None):
+        meta = dict(url=url, etag=etag, last_modified=last_modified, fetched_at=time.time())
+        self._write_atomic(meta_path, json.dumps(meta, ensure_ascii=False))
+
+    @staticmethod
+    def _write_atomic(path: str, content: str):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def _evict(self):
+        """按最近下载/验证时间淘汰页面，直到总大小降到上限的 90%，一次淘汰多个以减少扫描目录的次数"""
+        with self.lock:
+            if self.total_bytes <= self.max_bytes:
+                return
+            files = []
+            for html_path, meta_path in self._iter_files():
+                try:
+                    stat = os.stat(html_path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, html_path, meta_path))
+            files.sort()
+            target_bytes = self.max_bytes * 0.9
+            evicted = 0
+            for _, size, html_path, meta_path in files:
+                if self.total_bytes <= target_bytes:
+                    break
+                for path in (meta_path, html_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self.total_bytes -= size
+                evicted += 1
+        logger.info(f"网页缓存淘汰了 {evicted} 个页面，当前共 {self.total_bytes / 1024 / 1024:.1f} MB")
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import threading
+import time
+
+from utils.logger import logger
+
+
+class ImageMirrorCache:
+    """
+    图片镜像缓存，基于 SQLite 持久化，跨文章、跨运行复用已镜像的图片：
+    - 原始链接 -> 图片内容的 SHA-256：相同链接的图片无需再次下载和上传
+    - 图片内容的 SHA-256 -> 镜像链接：不同链接、相同内容的图片无需再次上传
+    缓存只保存链接之间的映射，不保存图片内容，因此按条目数而不是字节数限制大小，
+    条目数超过上限后按最近使用时间淘汰（LRU），size 列只用于统计镜像图片的总大小。
+    持久化服务把图片保存为本地文件（如 LocalPersistence）时，命中前检查文件是否仍然存在，
+    文件已被删除或工作目录已清理时删除该条目并视为未命中
+    """
+
+    def __init__(self, db_path: str, namespace: str = 'default', max_entries: int = 200000,
+                 local_files: bool = False):
+        """
+        :param db_path: SQLite 数据库文件路径
+        :param namespace: 缓存命名空间，镜像链接只在同一个持久化服务内有效，不同的持久化服务应使用不同的命名空间
+        :param max_entries: 每张表的最大条目数，超过后淘汰最久未使用的条目
+        :param local_files: 镜像链接是否为本地文件的绝对路径，为 True 时命中前检查文件是否存在
+        """
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.local_files = local_files
+        self.lock = threading.Lock()
+        self.writes_since_evict = 0
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS url_mapping (
+                namespace TEXT NOT NULL,
+                url TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, url)
+            );
+            CREATE TABLE IF NOT EXISTS content_mapping (
+                namespace TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                mirror_url TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, sha256)
+            );
+            CREATE INDEX IF NOT EXISTS idx_url_mapping_last_used ON url_mapping (namespace, last_used);
+            CREATE INDEX IF NOT EXISTS idx_content_mapping_last_used ON content_mapping (namespace, last_used);
+        ''')
+        logger.info(f"已加载图片镜像缓存: {db_path}")
+
+    def get_by_url(self, url: str) -> str or None:
+        """
+        根据原始链接查询镜像链接
+        :param url: 规范化后的图片原始链接
+        :return: 镜像链接，未命中时返回 None
+        """
+        with self.lock:
+            row = self.connection.execute('''
+                SELECT c.sha256, c.mirror_url FROM url_mapping u
+                JOIN content_mapping c ON c.namespace = u.namespace AND c.sha256 = u.sha256
+                WHERE u.namespace = ? AND u.url = ?
+            ''', (self.namespace, url)).fetchone()
+            if not row:
+                return None
+            if not self._is_available(row[0], row[1]):
+                return None
+            now = time.time()
+            self.connection.execute('UPDATE url_mapping SET last_used = ? WHERE namespace = ? AND url = ?',
+                                    (now, self.namespace, url))
+            self.connection.execute('UPDATE content_mapping SET last_used = ? WHERE namespace = ? AND sha256 = ?',
+                                    (now, self.namespace, row[0]))
+            return row[1]
+
+    def get_by_content(self, sha256: str) -> str or None:
+        """
+        根据图片内容的 SHA-256 查询镜像链接
+        :param sha256: 图片内容的 SHA-256 十六进制摘要
+        :return: 镜像链接，未命中时返回 None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT mirror_url FROM content_mapping WHERE namespace = ? AND sha256 = ?',
+                (self.namespace, sha256)).fetchone()
+            if not row or not self._is_available(sha256, row[0]):
+                return None
+            self.connection.execute('UPDATE content_mapping SET last_used = ? WHERE namespace = ? AND sha256 = ?',
+                                    (time.time(), self.namespace, sha256))
+            return row[0]
+
+    def _is_available(self, sha256: str, mirror_url: str) -> bool:
+        """
+        检查镜像链接是否仍然可用，镜像链接为本地文件且文件不存在时删除相关条目，调用方需持有锁
+        :param sha256: 图片内容的 SHA-256 十六进制摘要
+        :param mirror_url: 镜像链接
+        :return: 是否可用
+        """
+        if not self.local_files or os.path.exists(mirror_url):
+            return True
+        logger.info("图片镜像文件已不存在，删除缓存条目: %s", mirror_url)
+        self.connection.execute('BEGIN')
+        self.connection.execute('DELETE FROM url_mapping WHERE namespace = ? AND sha256 = ?', (self.namespace, sha256))
+        self.connection.execute('DELETE FROM content_mapping WHERE namespace = ? AND sha256 = ?',
+                                (self.namespace, sha256))
+        self.connection.execute('COMMIT')
+        return False
+
+    def stats(self) -> dict:
+        """
+        获取缓存的统计信息
+        :return: {urls: 原始链接数, images: 镜像图片数, bytes: 镜像图片总大小}
+        """
+        with self.lock:
+            urls = self.connection.execute('SELECT COUNT(*) FROM url_mapping WHERE namespace = ?',
+                                           (self.namespace,)).fetchone()[0]
+            images, size = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM content_mapping WHERE namespace = ?',
+                (self.namespace,)).fetchone()
+        return {'urls': urls, 'images': images, 'bytes': size}
+
+    def put(self, url: str, sha256: str, mirror_url: str, size: int):
+        """
+        记录一张图片的镜像结果
+        :param url: 规范化后的图片原始链接
+        :param sha256: 图片内容的 SHA-256 十六进制摘要
+        :param mirror_url: 镜像链接
+        :param size: 图片大小（字节）
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN')
+            self.connection.execute('''
+                INSERT INTO content_mapping (namespace, sha256, mirror_url, size, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (namespace, sha256) DO UPDATE SET last_used = excluded.last_used
+            ''', (self.namespace, sha256, mirror_url, size, now))
+            self.connection.execute('''
+                INSERT INTO url_mapping (namespace, url, sha256, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (namespace, url) DO UPDATE SET sha256 = excluded.sha256, last_used = excluded.last_used
+            ''', (self.namespace, url, sha256, now))
+            self.connection.execute('COMMIT')
+            self.writes_since_evict += 1
+            if self.writes_since_evict >= 1000:
+                self._evict()
+                self.writes_since_evict = 0
+
+    def _evict(self):
+        """淘汰最久未使用的条目，调用方需持有锁"""
+        for table in ('url_mapping', 'content_mapping'):
+            count = self.connection.execute(f'SELECT COUNT(*) FROM {table} WHERE namespace = ?',
+                                            (self.namespace,)).fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self.connection.execute(f'''
+                    DELETE FROM {table} WHERE rowid IN (
+                        SELECT rowid FROM {table} WHERE namespace = ? ORDER BY last_used LIMIT ?
+                    )
+                ''', (self.namespace, overflow))
+                logger.info(f"图片镜像缓存 {table} 淘汰了 {overflow} 个条目")
+
+    def close(self):
+        stats = self.stats()
+        logger.info(f"图片镜像缓存: {stats['urls']} 个原始链接，{stats['images']} 张图片，"
+                    f"共 {stats['bytes'] / 1024 / 1024:.1f} MB")
+        with self.lock:
+            self._evict()
+            self.connection.close()
@@ -0,0 +1,125 @@
+import asyncio
+import os
+
+from fake_useragent import UserAgent
+
+from service.downloader.image_downloader import ImageDownloader, CHUNK_SIZE
+from utils.config import config
+from utils.logger import logger
+from utils.rate_limiter import RateLimiter
+
+try:
+    import aiohttp
+except ImportError:  # asyncio 引擎为可选功能，未安装 aiohttp 时无法使用
+    aiohttp = None
+
+
+def create_client_session(limit: int = 100, limit_per_host: int = 8) -> 'aiohttp.ClientSession':
+    """
+    创建 aiohttp 会话，需要在事件循环中调用
+    :param limit: 连接总数上限
+    :param limit_per_host: 每个主机的连接数上限，即每个主机的并发请求数上限
+    """
+    if aiohttp is None:
+        raise RuntimeError("asyncio 引擎需要安装 aiohttp: pip install aiohttp")
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
+    # aiohttp 默认不读取系统代理配置，与同步下载器禁用系统代理的行为一致
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+
+
+class AsyncHTMLDownloader:
+    def __init__(self, session: 'aiohttp.ClientSession', retry_count: int = 3, rate_limiter: RateLimiter = None):
+        """
+        初始化异步 HTML 下载器
+        :param session: aiohttp 会话，多个下载器共享同一个会话以复用连接
+        :param retry_count: 下载失败时的重试次数
+        :param rate_limiter: 请求限流器，不提供则不限流
+        """
+        self.session = session
+        self.retry_count = retry_count
+        self.rate_limiter = rate_limiter
+        self.ua = UserAgent()
+
+    async def download(self, url: str) -> str or None:
+        """
+        下载网页内容
+        :param url: 网页 URL
+        :return: 网页内容，下载失败时返回 None
+        """
+        attempt = 0
+        while attempt < self.retry_count:
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire_async()
+                logger.info("第 %d 次尝试下载 %s", attempt + 1, url)
+                async with self.session.get(url, headers={'User-Agent': self.ua.random}) as response:
+                    if response.status == 200:
+                        logger.info("下载 %s 成功", url)
+                        return await response.text()
+                    logger.warning("下载时发生错误: HTTP %s", response.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error("下载 %s 时发生错误: %r", url, e)
+            attempt += 1
+            await asyncio.sleep(1)  # 避免过于频繁的请求
+        logger.error("%d 次重试后仍无法下载 %s", self.retry_count, url)
+        return None
+
+
+class AsyncCSDNImageDownloader(ImageDownloader):
+    """
+    基于 aiohttp 的 CSDN 图片下载器
+    图片下载在事件循环中进行，同时实现了同步的 download_image 接口，
+    供运行在线程池中的 CSDNContentParser 调用
+    """
+
+    def __init__(self, session: 'aiohttp.ClientSession', loop: asyncio.AbstractEventLoop, max_bytes: int = None,
+                 allowed_content_types=None):
+        """
+        :param session: aiohttp 会话
+        :param loop: 会话所在的事件循环
+        :param max_bytes: 单张图片的最大字节数，不提供时读取 ImageDownload.MaxSizeMB 配置，为 0 时不限制
+        :param allowed_content_types: 允许的 Content-Type 前缀，不提供时读取 ImageDownload.AllowedContentTypes 配置
+        """
+        super().__init__(save_dir='./csdn_images')
+        self.session = session
+        self.loop = loop
+        self.ua = UserAgent()
+        if max_bytes is None:
+            max_bytes = int((config.get('ImageDownload', 'MaxSizeMB') or 0) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.allowed_content_types = tuple(
+            allowed_content_types or config.get('ImageDownload', 'AllowedContentTypes') or ('image/',))
+
+    async def download_image_async(self, url: str, filename: str = None) -> bytes:
+        """
+        下载 CSDN 图片并保存到本地，返回图片的二进制内容，下载失败时抛出异常
+        :param url: 图片 URL
+        :param filename: 保存的文件名，如不提供则不保存
+        """
+        async with self.session.get(url, headers={'User-Agent': self.ua.random}) as response:
+            if response.status != 200:
+                raise Exception(f"图片下载失败, HTTP 状态码: {response.status}")
+            # 与 CSDNImageDownloader 相同的 Content-Type 和大小限制，超过大小上限时立即中止下载
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.lower().startswith(self.allowed_content_types):
+                raise Exception(f"图片下载失败, 不支持的 Content-Type: {content_type}")
+            if self.max_bytes and response.content_length and response.content_length > self.max_bytes:
+                raise Exception(f"图片下载失败, 图片大小 {response.content_length} 字节超过上限 {self.max_bytes} 字节")
+            buffer = bytearray()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                buffer.extend(chunk)
+                if self.max_bytes and len(buffer) > self.max_bytes:
+                    raise Exception(f"图片下载失败, 图片大小超过上限 {self.max_bytes} 字节")
+            content = bytes(buffer)
+        if filename:
+            file_path = os.path.join(self.save_dir, filename)
+            with open(file_path, 'wb') as f:
+                f.write(content)
+        return content
+
+    def download_image(self, url: str, filename: str = None) -> bytes:
+        """
+        同步下载接口，只能在事件循环以外的线程中调用
+        """
+        future = asyncio.run_coroutine_threadsafe(self.download_image_async(url, filename), self.loop)
+        return future.result()
@@ -1,23 +1,38 @@
 import hashlib
 import os.path
 
-import requests
 import time
 
 from fake_useragent import UserAgent
 from requests.exceptions import RequestException
 
+from service.cache.html_cache import HTMLCache
 from utils.data import resolve_data_path
+from utils.http_client import http_client
 from utils.logger import logger
+from utils.metrics import metrics, STEP_SECONDS
+from utils.rate_limiter import RateLimiter, HostRateLimiter, parse_retry_after
+from utils.retry import RetryPolicy, RetryLater
+
+HTML_CACHE = metrics.counter('crawler_html_cache_total', '网页缓存查询结果：hit 未过期，not_modified 条件请求验证通过，miss 重新下载',
+                             ['result'])
 
 
 class HTMLDownloader:
-    def __init__(self, retry_count: int = 3):
+    def __init__(self, retry_count: int = 3, rate_limiter: RateLimiter = None, html_cache: HTMLCache = None,
+                 host_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None):
         """
         初始化 HTML 下载器
-        :param retry_count: 下载失败时的重试次数
+        :param retry_count: 最多尝试次数，只在不提供 retry_policy 时使用
+        :param rate_limiter: 请求限流器，多个下载器共享同一个限流器即可控制全局请求频率，不提供则不限流
+        :param html_cache: 网页缓存，有效期内的页面不访问网络，过期的页面发送条件请求验证，不提供则不使用缓存
+        :param host_limiter: 按主机的自适应限流器，与图片下载器共享
+        :param retry_policy: 重试策略，多个下载器共享同一个策略即共享重试预算
         """
-        self.retry_count = retry_count
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=retry_count)
+        self.rate_limiter = rate_limiter
+        self.html_cache = html_cache
+        self.host_limiter = host_limiter
         self.ua = UserAgent()
 
     def get_requests_configs(self) -> dict:
@@ -37,28 +52,89 @@ class HTMLDownloader:
             'timeout': 10,
         }
 
+    @staticmethod
+    def get_conditional_headers(cached: dict) -> dict:
+        """
+        根据缓存的 ETag 和 Last-Modified 生成条件请求头
+        :param cached: 缓存的页面
+        :return: 条件请求头，缓存中没有验证信息时为空
+        """
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def try_download(self, url: str, attempt: int = 0) -> str or None:
+        """
+        尝试下载一次网页内容，不在失败后等待
+        :param url: 网页 URL
+        :param attempt: 第几次尝试（从 0 开始）
+        :return: 网页内容，永久失败或不应再重试时返回 None
+        :raise RetryLater: 可以重试的失败，包含重试前需要等待的秒数
+        """
+        with STEP_SECONDS.time(step='download'):
+            return self._try_download(url, attempt)
+
+    def _try_download(self, url: str, attempt: int) -> str or None:
+        cached = self.html_cache.get(url) if self.html_cache else None
+        if cached and self.html_cache.is_fresh(cached):
+            logger.info("网页缓存命中: %s", url)
+            HTML_CACHE.inc(result='hit')
+            return cached['body']
+        status_code, retry_after = None, None
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            logger.info("第 %d 次尝试下载 %s", attempt + 1, url)
+            self.retry_policy.record_request(attempt)
+            configs = self.get_requests_configs()
+            # 429/5xx 由重试策略延迟重试，不由 urllib3 在工作线程中原地等待
+            configs['status_retries'] = False
+            if cached:
+                configs['headers'].update(self.get_conditional_headers(cached))
+            if self.host_limiter:
+                response = self.host_limiter.send(url, lambda: http_client.get(url, **configs))
+            else:
+                response = http_client.get(url, **configs)
+            if response.status_code == 304 and cached:
+                logger.info("网页未修改，使用缓存: %s", url)
+                HTML_CACHE.inc(result='not_modified')
+                self.html_cache.touch(url, cached)
+                return cached['body']
+            if response.status_code == 200:
+                logger.info("下载 %s 成功", url)
+                if self.html_cache:
+                    HTML_CACHE.inc(result='miss')
+                    self.html_cache.put(url, response.text, etag=response.headers.get('ETag'),
+                                        last_modified=response.headers.get('Last-Modified'))
+                return response.text
+            status_code = response.status_code
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            logger.warning("下载时发生错误: HTTP %s", status_code)
+        except RequestException as e:
+            logger.error("下载 %s 时发生错误: %s", url, e)
+        delay = self.retry_policy.next_delay(attempt, status_code, retry_after)
+        if delay is None:
+            logger.error("第 %d 次尝试后放弃下载 %s", attempt + 1, url)
+            return None
+        raise RetryLater(delay, f"下载 {url} 失败")
+
     def download(self, url: str) -> str or None:
         """
-        下载网页内容
+        下载网页内容，失败时按重试策略原地等待后重试，在调度器以外使用
         :param url: 网页 URL
         :return: 网页内容，下载失败时返回 None
         """
         attempt = 0
-        while attempt < self.retry_count:
+        while True:
             try:
-                logger.info(f"第 {attempt + 1} 次尝试下载 {url}")
-                response = requests.get(url, **self.get_requests_configs())
-                if response.status_code == 200:
-                    logger.info(f"下载 {url} 成功")
-                    return response.text
-                else:
-                    logger.warning(f"下载时发生错误: HTTP {response.status_code}")
-            except RequestException as e:
-                logger.error(f"下载 {url} 时发生错误: {e}")
-            attempt += 1
-            time.sleep(1)  # 避免过于频繁的请求
-        logger.error(f"{self.retry_count} 次重试后仍无法下载 {url}")
-        return None
+                return self.try_download(url, attempt)
+            except RetryLater as e:
+                logger.info("%.2f 秒后重试下载 %s", e.delay, url)
+                time.sleep(e.delay)
+                attempt += 1
 
 
 def main():
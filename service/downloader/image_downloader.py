@@ -1,10 +1,61 @@
 from abc import ABC, abstractmethod
-import requests
+import contextlib
+import hashlib
+import mimetypes
 import os
+import tempfile
+from urllib.parse import urlsplit
 
 from fake_useragent import UserAgent
 
+from utils.config import config
 from utils.data import resolve_data_path
+from utils.http_client import http_client, HTTP_RECEIVED_BYTES
+from utils.rate_limiter import HostRateLimiter
+
+# 流式下载时每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+class DownloadedImage:
+    """
+    已下载到临时文件的图片，使用 with 语句确保临时文件被删除
+    """
+
+    def __init__(self, path: str, sha256: str, size: int, content_type: str = None):
+        """
+        :param path: 临时文件路径
+        :param sha256: 图片内容的 SHA-256
+        :param size: 图片大小（字节）
+        :param content_type: 响应头中的 Content-Type
+        """
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.content_type = content_type
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def create_image_temp_file(content_type: str = None):
+    """
+    在数据目录的 tmp/images 下创建临时文件，扩展名根据 Content-Type 推断，上传时保留扩展名
+    :param content_type: 响应头中的 Content-Type
+    :return: 以二进制写模式打开的临时文件，不会自动删除
+    """
+    mime_type = (content_type or '').split(';')[0].strip().lower()
+    suffix = (mimetypes.guess_extension(mime_type) if mime_type else None) or '.png'
+    return tempfile.NamedTemporaryFile(dir=resolve_data_path('./tmp/images'), suffix=suffix, delete=False)
 
 
 class ImageDownloader(ABC):
@@ -25,11 +76,33 @@ class ImageDownloader(ABC):
         """
         pass
 
+    def download_to_file(self, url: str) -> DownloadedImage:
+        """
+        下载图片到临时文件，返回的 DownloadedImage 需要在使用后关闭，下载失败时抛出异常
+        默认实现先下载到内存再写入临时文件，支持流式下载的子类应覆盖此方法
+        :param url: 图片 URL
+        """
+        content = self.download_image(url)
+        with create_image_temp_file() as temp_file:
+            temp_file.write(content)
+        return DownloadedImage(temp_file.name, hashlib.sha256(content).hexdigest(), len(content))
+
 
 class CSDNImageDownloader(ImageDownloader):
-    def __init__(self):
+    def __init__(self, host_limiter: HostRateLimiter = None, max_bytes: int = None, allowed_content_types=None):
+        """
+        :param host_limiter: 按主机的自适应限流器，与 HTML 下载器共享，不提供则不限流
+        :param max_bytes: 单张图片的最大字节数，不提供时读取 ImageDownload.MaxSizeMB 配置，为 0 时不限制
+        :param allowed_content_types: 允许的 Content-Type 前缀，不提供时读取 ImageDownload.AllowedContentTypes 配置
+        """
         super().__init__(save_dir='./csdn_images')
         self.ua = UserAgent()
+        self.host_limiter = host_limiter
+        if max_bytes is None:
+            max_bytes = int((config.get('ImageDownload', 'MaxSizeMB') or 0) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.allowed_content_types = tuple(
+            allowed_content_types or config.get('ImageDownload', 'AllowedContentTypes') or ('image/',))
 
     def get_requests_configs(self) -> dict:
         """
@@ -54,7 +127,12 @@ class CSDNImageDownloader(ImageDownloader):
         :param url: 图片 URL
         :param filename: 保存的文件名，如不提供则不保存
         """
-        response = requests.get(url, **self.get_requests_configs())
+        configs = self.get_requests_configs()
+        if self.host_limiter:
+            # 每个 429/503 响应都交给限流器调整频率，不由 urllib3 在占用并发数时原地重试
+            response = self.host_limiter.send(url, lambda: http_client.get(url, status_retries=False, **configs))
+        else:
+            response = http_client.get(url, **configs)
         if response.status_code == 200:
             if filename:
                 file_path = os.path.join(self.save_dir, filename)
@@ -64,6 +142,60 @@ class CSDNImageDownloader(ImageDownloader):
         else:
             raise Exception(f"图片下载失败, HTTP 状态码: {response.status_code}")
 
+    def _check_response(self, response):
+        """检查流式下载的响应，状态码、Content-Type 或 Content-Length 不符合要求时抛出异常"""
+        if response.status_code != 200:
+            raise Exception(f"图片下载失败, HTTP 状态码: {response.status_code}")
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.lower().startswith(self.allowed_content_types):
+            raise Exception(f"图片下载失败, 不支持的 Content-Type: {content_type}")
+        content_length = response.headers.get('Content-Length')
+        if self.max_bytes and content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise Exception(f"图片下载失败, 图片大小 {content_length} 字节超过上限 {self.max_bytes} 字节")
+
+    def download_to_file(self, url: str) -> DownloadedImage:
+        """
+        流式下载 CSDN 图片到临时文件，分块读取并同时计算 SHA-256，内存占用与图片大小无关，
+        超过大小上限时立即中止下载
+        :param url: 图片 URL
+        """
+        configs = self.get_requests_configs()
+        configs['stream'] = True
+        if self.host_limiter:
+            # 读取完响应体后才释放该主机的并发数，流式读取同样受并发上限限制
+            limited = self.host_limiter.stream(url, lambda: http_client.get(url, status_retries=False, **configs))
+        else:
+            limited = contextlib.nullcontext(http_client.get(url, **configs))
+        with limited as response, response:
+            self._check_response(response)
+            sha256 = hashlib.sha256()
+            size = 0
+            temp_file = create_image_temp_file(response.headers.get('Content-Type'))
+            try:
+                with temp_file:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        size += len(chunk)
+                        if self.max_bytes and size > self.max_bytes:
+                            raise Exception(f"图片下载失败, 图片大小超过上限 {self.max_bytes} 字节")
+                        sha256.update(chunk)
+                        temp_file.write(chunk)
+            except BaseException:
+                os.remove(temp_file.name)
+                raise
+            finally:
+                HTTP_RECEIVED_BYTES.inc(size, host=urlsplit(url).hostname or '')
+        return DownloadedImage(temp_file.name, sha256.hexdigest(), size, response.headers.get('Content-Type'))
+
+
+class OfflineImageDownloader(ImageDownloader):
+    """离线图片下载器，不访问网络，用于离线重放时只使用图片镜像缓存中已有的图片"""
+
+    def __init__(self):
+        super().__init__(save_dir='./csdn_images')
+
+    def download_image(self, url: str, filename: str = None) -> bytes:
+        raise Exception(f"离线模式不下载图片: {url}")
+
 
 def main():
     downloader = CSDNImageDownloader()
@@ -0,0 +1,56 @@
+import glob
+import os
+import sys
+import time
+
+from service.parser.csdn_parser import CSDNContentParser
+from service.parser.parser import PARSER_BACKENDS, resolve_parser_backend
+from utils.data import resolve_data_path
+from utils.logger import logger
+
+
+def benchmark(pages: list, backend: str, parse_only: bool, rounds: int = 3) -> float:
+    """
+    测量解析一个页面的平均耗时，包括构建文档树、获取标题和一次遍历完成的简介提取、转载声明、代码块优化，不包括图片镜像
+    :param pages: 页面 HTML 列表
+    :param backend: 解析后端
+    :param parse_only: 是否只解析需要的子树
+    :param rounds: 重复次数
+    :return: 平均每个页面的耗时（毫秒）
+    """
+    parser = CSDNContentParser(uploader=None, backend=backend)
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            soup, content_views_element = parser.init(page, parse_only=parse_only)
+            parser.get_title(soup)
+            parser.transform(soup, content_views_element, 'https://blog.csdn.net/',
+                             lambda images: [img['src'] for img in images])
+            content_views_element.decode_contents()
+    return (time.perf_counter() - start_time) / (rounds * len(pages)) * 1000
+
+
+def main():
+    """
+    对比各个解析后端在已保存的 CSDN 页面上的性能
+    页面默认从 data/csdn-html 目录读取（html_downloader.main 保存的位置），也可以通过命令行参数指定目录
+    """
+    dir_path = sys.argv[1] if len(sys.argv) > 1 else resolve_data_path('./csdn-html/')
+    pages = []
+    for file_path in sorted(glob.glob(os.path.join(dir_path, '*.html'))):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            pages.append(file.read())
+    if not pages:
+        logger.warning(f"目录 {dir_path} 中没有保存的页面，请先运行 html_downloader 下载页面")
+        return
+    logger.info(f"共 {len(pages)} 个页面，平均大小 {sum(len(page) for page in pages) / len(pages) / 1024:.1f} KB")
+    for backend in PARSER_BACKENDS:
+        if resolve_parser_backend(backend) != backend:
+            continue
+        for parse_only in (False, True):
+            elapsed = benchmark(pages, backend, parse_only)
+            logger.info(f"解析后端 {backend:<12} {'只解析需要的子树' if parse_only else '解析完整页面'}: {elapsed:.2f} ms/页")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,76 @@
+import html
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from service.cache.image_cache import ImageMirrorCache
 from service.downloader.image_downloader import CSDNImageDownloader, ImageDownloader
-from service.parser.parser import ContentParser
-from bs4 import BeautifulSoup
+from service.parser.parser import ContentParser, resolve_parser_backend
+from service.parser.transform import BriefRule, CodeBlockRule, ImageRewriteRule, TransformPipeline, TransformRule, \
+    clean_code_element
+from bs4 import BeautifulSoup, SoupStrainer
 
 from service.persistence.persistence import Persistence
+from utils.config import config
 from utils.logger import logger
+from utils.metrics import STEP_SECONDS, IMAGES
+from utils.url import canonicalize_url
+
+
+def _is_article_part(name, attrs=None) -> bool:
+    """
+    判断标签是否为解析时需要的部分：文章内容、标题和版权声明
+    bs4 4.12 传入标签名和属性字典；bs4 4.13 及以上版本在创建标签前只传入标签名，此时无法按属性过滤，只能解析完整页面
+    """
+    if attrs is None:
+        if not hasattr(name, 'attrs'):
+            return True
+        attrs = name.attrs
+    classes = attrs.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return attrs.get('id') in ('content_views', 'articleContentId') or 'article-copyright' in classes
+
+
+# 只构建需要的子树，跳过页面中的导航、评论、推荐等其余部分
+ARTICLE_STRAINER = SoupStrainer(_is_article_part)
+
+# extract 时替换图片 src 的占位符
+IMAGE_PLACEHOLDER_PREFIX = '__BLOG_CRAWLER_IMAGE_'
+IMAGE_PLACEHOLDER = IMAGE_PLACEHOLDER_PREFIX + '{}__'
+
+
+class RepostNoticeRule(TransformRule):
+    """在文章内容末尾添加转载声明，见 CSDNContentParser.add_repost_notice"""
+
+    def __init__(self, soup: BeautifulSoup, url: str):
+        self.soup = soup
+        self.url = url
+
+    def finish(self, root):
+        CSDNContentParser.add_repost_notice(self.soup, root, self.url)
 
 
 class CSDNContentParser(ContentParser):
     def __init__(self,
                  uploader: Persistence,
-                 image_downloader: ImageDownloader = CSDNImageDownloader()):
+                 image_downloader: ImageDownloader = CSDNImageDownloader(),
+                 image_concurrency: int = None,
+                 image_cache: ImageMirrorCache = None,
+                 backend: str = None):
         """
         初始化 CSDN 内容解析器
+        :param uploader: 图片上传使用的持久化服务
+        :param image_downloader: 图片下载器
+        :param image_concurrency: 每篇文章同时镜像的图片数量上限，不提供时读取 Parser.ImageMirrorConcurrency 配置
+        :param image_cache: 跨文章共享的图片镜像缓存，不提供则不使用缓存
+        :param backend: BeautifulSoup 解析后端（lxml、html.parser），不提供时读取 Parser.Backend 配置
         """
         self.uploader = uploader
         self.image_downloader = image_downloader
+        self.image_cache = image_cache
+        self.backend = resolve_parser_backend(backend or config.get('Parser', 'Backend') or 'html.parser')
+        self.image_concurrency = max(int(image_concurrency or config.get('Parser', 'ImageMirrorConcurrency') or 1), 1)
         super().__init__()
 
     def parse(self, content: str, **kwargs) -> dict:
@@ -24,39 +80,82 @@ class CSDNContentParser(ContentParser):
         :param content: HTML 内容
         :return: 解析结果
         """
+        start = time.perf_counter()
+        mirror_seconds = 0.0
+
+        def mirror(images: list) -> list:
+            nonlocal mirror_seconds
+            mirror_start = time.perf_counter()
+            try:
+                return self.image_mirror_storage(images, mirrored_images)
+            finally:
+                mirror_seconds += time.perf_counter() - mirror_start
+
         # 1. 初始化
         soup, content_views_element = self.init(content, **kwargs)
 
         # 2. 获取标题
         title = self.get_title(soup)
 
-        # 3. 获取文章前 100 个字符作为简介
-        brief = content_views_element.get_text()[:100]
-
-        # 4. 获取封面图片
-        cover = self.get_cover(content_views_element)
-
-        # 5. 遍历所有 img 标签，转换 src 属性，返回图片链接列表
-        image_urls = self.image_mirror_storage(content_views_element)
-
-        # 6. 添加转载声明
+        # 3. 一次遍历文章内容：提取简介、镜像图片、添加转载声明、代码块优化
+        # 本篇文章的图片镜像结果（原始链接 -> 镜像链接），相同链接的图片只下载/上传一次
+        mirrored_images = {}
         blog_url = kwargs['url'] if 'url' in kwargs else None
-        self.add_repost_notice(soup, content_views_element, blog_url)
+        brief, image_urls = self.transform(soup, content_views_element, blog_url, mirror)
 
-        # 7. 代码块优化
-        self.parse_code(content_views_element)
+        # 4. 从镜像结果中获取封面图片，不再重复下载/上传
+        cover = self.get_cover(mirrored_images)
 
-        return dict(
+        result = dict(
             title=title,
             cover=cover,
             html=content_views_element.decode_contents(),  # 返回标签内部的 HTML 内容
             brief=brief,
             image_urls=image_urls
         )
+        # 解析耗时不包括图片镜像，镜像耗时单独按 step=mirror 统计
+        STEP_SECONDS.observe(time.perf_counter() - start - mirror_seconds, step='parse')
+        return result
 
-    @staticmethod
-    def init(content: str, **kwargs):
-        soup = BeautifulSoup(content, 'html.parser')
+    def transform(self, soup: BeautifulSoup, content_views_element: BeautifulSoup, url: str,
+                  mirror_images: Callable[[list], list]) -> tuple:
+        """
+        在一次遍历中对文章内容执行所有变换规则
+        :param soup: BeautifulSoup 对象
+        :param content_views_element: 文章内容元素
+        :param url: 文章链接
+        :param mirror_images: 改写 img 标签 src 的函数，接收 img 标签列表，返回图片链接列表
+        :return: 文章前 100 个字符组成的简介和图片链接列表
+        """
+        brief_rule = BriefRule(100)
+        image_rule = ImageRewriteRule(mirror_images)
+        rules = [
+            brief_rule,
+            image_rule,
+            RepostNoticeRule(soup, url),
+            CodeBlockRule(),
+            *self.extra_transform_rules(soup, url)
+        ]
+        TransformPipeline(rules).apply(content_views_element)
+        return brief_rule.brief, image_rule.image_urls
+
+    def extra_transform_rules(self, soup: BeautifulSoup, url: str) -> list:
+        """
+        子类可以覆盖此方法添加站点相关的变换规则，这些规则在内置规则之后执行
+        :param soup: BeautifulSoup 对象
+        :param url: 文章链接
+        :return: TransformRule 列表
+        """
+        return []
+
+    def init(self, content: str, parse_only: bool = True, **kwargs):
+        """
+        解析 HTML
+        :param content: HTML 内容
+        :param parse_only: 是否只解析文章内容、标题和版权声明所在的子树
+        :return: soup 对象和文章内容元素
+        """
+        soup = BeautifulSoup(content, self.backend, parse_only=ARTICLE_STRAINER if parse_only else None)
 
         # 1. 获取 id="content_views" 的内容
         content_views_element = soup.find(id='content_views')
@@ -65,29 +164,134 @@ class CSDNContentParser(ContentParser):
             raise Exception("未找到文章内容")
         return soup, content_views_element
 
-    def image_mirror_storage(self, content_views_element: BeautifulSoup) -> list:
+    def mirror_image(self, original_src: str) -> str or None:
         """
-        将文章图片镜像存储
-        :param content_views_element: 文章内容元素
-        :return: 转换后的图片链接列表
+        下载并上传单张图片，优先使用图片镜像缓存：
+        链接命中时不下载也不上传，内容命中时只下载不上传
+        :param original_src: 图片原始链接
+        :return: 镜像后的图片链接，失败时返回 None
         """
+        cache_key = canonicalize_url(original_src)
+        try:
+            if self.image_cache:
+                cached_src = self.image_cache.get_by_url(cache_key)
+                if cached_src:
+                    logger.info("图片镜像缓存命中: %s -> %s", original_src, cached_src)
+                    IMAGES.inc(result='cached')
+                    return cached_src
+            # 图片流式下载到临时文件，以文件路径交给上传接口，不在内存中保留完整图片
+            with self.image_downloader.download_to_file(original_src) as image:
+                if self.image_cache:
+                    cached_src = self.image_cache.get_by_content(image.sha256)
+                    if cached_src:
+                        self.image_cache.put(cache_key, image.sha256, cached_src, image.size)
+                        logger.info("图片内容缓存命中: %s -> %s", original_src, cached_src)
+                        IMAGES.inc(result='cached')
+                        return cached_src
+                upload_response = self.uploader.upload_image(image.path)
+            if upload_response and upload_response.get('code') == 200:
+                new_src = upload_response.get('data').get('url')
+                if self.image_cache:
+                    self.image_cache.put(cache_key, image.sha256, new_src, image.size)
+                logger.info("图片转换成功: %s -> %s", original_src, new_src)
+                IMAGES.inc(result='mirrored')
+                return new_src
+        except Exception as e:
+            logger.error("图片镜像存储过程中下载/上传图片失败: %s", e)
+        IMAGES.inc(result='failed')
+        return None
+
+    def image_mirror_storage(self, images: list, mirrored_images: dict = None) -> list:
+        """
+        将文章图片镜像存储，同一篇文章中最多同时下载/上传 image_concurrency 张图片
+        :param images: 文章中带 src 属性的 img 标签列表，按出现顺序排列
+        :param mirrored_images: 图片镜像结果缓存（原始链接 -> 镜像链接，失败时为 None），
+                                已在缓存中的图片不会重复镜像，新的结果按图片在文章中出现的顺序写入
+        :return: 转换后的图片链接列表，顺序与文章中图片出现的顺序一致
+        """
+        if mirrored_images is None:
+            mirrored_images = {}
+        if not images:
+            return []
+        self.mirror_images([img['src'] for img in images], mirrored_images)
         image_urls = []
-        images = content_views_element.find_all('img')
         for img in images:
-            original_src = img.get('src', None)
-            if original_src:
-                try:
-                    img_data = self.image_downloader.download_image(original_src)
-                    upload_response = self.uploader.upload_image(img_data)
-                    if upload_response and upload_response.get('code') == 200:
-                        new_src = upload_response.get('data').get('url')
-                        img['src'] = new_src
-                        logger.info(f"图片转换成功: {original_src} -> {new_src}")
-                except Exception as e:
-                    logger.error(f"图片镜像存储过程中下载/上传图片失败: {e}")
-                image_urls.append(img['src'])
+            new_src = mirrored_images.get(img['src'])
+            if new_src:
+                img['src'] = new_src
+            image_urls.append(img['src'])
         return image_urls
 
+    def mirror_images(self, srcs: list, mirrored_images: dict):
+        """
+        并发镜像存储图片，同一篇文章中最多同时下载/上传 image_concurrency 张图片
+        :param srcs: 图片原始链接列表，可以包含重复链接
+        :param mirrored_images: 图片镜像结果缓存（原始链接 -> 镜像链接，失败时为 None），
+                                已在缓存中的图片不会重复镜像，新的结果按图片在文章中出现的顺序写入
+        """
+        pending_srcs = [src for src in dict.fromkeys(srcs) if src not in mirrored_images]
+        if not pending_srcs:
+            return
+        max_workers = min(self.image_concurrency, len(pending_srcs))
+        with STEP_SECONDS.time(step='mirror'):
+            if max_workers <= 1:
+                new_srcs = [self.mirror_image(src) for src in pending_srcs]
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-mirror') as executor:
+                    new_srcs = list(executor.map(self.mirror_image, pending_srcs))
+        mirrored_images.update(zip(pending_srcs, new_srcs))
+
+    def extract(self, content: str, url: str = None) -> dict:
+        """
+        只做 CPU 密集的解析部分，不下载/上传图片，结果只包含基本类型，可以在进程间传递。
+        图片的 src 被替换为占位符，由 apply_mirrored_images 在镜像完成后替换为镜像链接
+        :param content: HTML 内容
+        :param url: 文章链接
+        :return: 标题、带占位符的 HTML、简介和图片原始链接列表（按占位符序号排列，不重复）
+        """
+        soup, content_views_element = self.init(content)
+        title = self.get_title(soup)
+        image_srcs = {}
+
+        def replace_with_placeholders(images: list) -> list:
+            for img in images:
+                img['src'] = IMAGE_PLACEHOLDER.format(image_srcs.setdefault(img['src'], len(image_srcs)))
+            return []
+
+        brief, _ = self.transform(soup, content_views_element, url, replace_with_placeholders)
+        # 每个 img 标签对应的占位符序号，用于生成按出现顺序排列的图片链接列表
+        image_indexes = [int(img['src'][len(IMAGE_PLACEHOLDER_PREFIX):-2])
+                         for img in content_views_element.find_all('img')
+                         if img.get('src', '').startswith(IMAGE_PLACEHOLDER_PREFIX)]
+        return dict(
+            title=title,
+            html=content_views_element.decode_contents(),
+            brief=brief,
+            image_srcs=list(image_srcs),
+            image_indexes=image_indexes
+        )
+
+    def apply_mirrored_images(self, extracted: dict) -> dict:
+        """
+        镜像 extract 结果中的图片，并将占位符替换为镜像链接（失败时为原始链接）
+        :param extracted: extract 的返回结果
+        :return: 与 parse 相同格式的解析结果
+        """
+        image_srcs = extracted['image_srcs']
+        mirrored_images = {}
+        self.mirror_images(image_srcs, mirrored_images)
+        new_srcs = [mirrored_images.get(src) or src for src in image_srcs]
+        content_html = extracted['html']
+        for index, new_src in enumerate(new_srcs):
+            content_html = content_html.replace(IMAGE_PLACEHOLDER.format(index), html.escape(new_src))
+        return dict(
+            title=extracted['title'],
+            cover=self.get_cover(mirrored_images),
+            html=content_html,
+            brief=extracted['brief'],
+            image_urls=[new_srcs[index] for index in extracted['image_indexes']]
+        )
+
     @staticmethod
     def add_repost_notice(soup: BeautifulSoup, content_views_element: BeautifulSoup, url: str) -> BeautifulSoup:
         """
@@ -134,25 +338,17 @@ class CSDNContentParser(ContentParser):
         logger.info("转载声明已添加到 content_views")
         return soup
 
-    def get_cover(self, content_views_element: BeautifulSoup) -> str or None:
+    @staticmethod
+    def get_cover(mirrored_images: dict) -> str or None:
         """
-        从文章内容中获取第一张图片作为封面图片
-        :param content_views_element: 文章内容元素
+        从文章的图片镜像结果中获取第一张镜像成功的图片作为封面图片
+        :param mirrored_images: 图片镜像结果（原始链接 -> 镜像链接），按图片在文章中出现的顺序排列
         :return: 封面图片链接
         """
-        covers = content_views_element.find_all('img')
-        for cover in covers:
-            if not cover or not cover.get('src'):
-                continue
-            try:
-                img_data = self.image_downloader.download_image(cover.get('src'))
-                upload_response = self.uploader.upload_image(img_data)
-                if upload_response and upload_response.get('code') == 200:
-                    cover_src = upload_response.get('data').get('url')
-                    return cover_src
-            except Exception as e:
-                logger.info(f"下载/上传封面图片失败: {e}")
-        logger.info("文章中未出现图片，不使用封面")
+        for new_src in mirrored_images.values():
+            if new_src:
+                return new_src
+        logger.info("文章中没有镜像成功的图片，不使用封面")
         return None
 
     @staticmethod
@@ -179,18 +375,8 @@ class CSDNContentParser(ContentParser):
         :param content_views_element: 文章内容元素
         :return: 转换后的 soup 对象
         """
-        code_elements = content_views_element.findAll('code')
-        for code_element in code_elements:
-            # 1. 提取纯文本内容，去除标签
-            clean_code = code_element.get_text('', strip=False)
-            clean_code = '\r\n'.join(line for line in clean_code.splitlines())
-            code_element.string = clean_code
-            # 2. 清除 code 标签多余的类名，只保留 language-xxx
-            if 'class' not in code_element.attrs:
-                continue
-            for class_name in code_element['class']:
-                if 'language-' not in class_name:
-                    code_element['class'].remove(class_name)
+        for code_element in content_views_element.find_all('code'):
+            clean_code_element(code_element)
         return content_views_element
 
     @staticmethod
@@ -213,3 +399,28 @@ class CSDNContentParser(ContentParser):
                 return "暂无标题"
             return title
         return tit_element.get_text()
+
+
+# 解析进程中使用的解析器，由 init_extract_worker 在进程启动时创建
+_extract_parser: CSDNContentParser or None = None
+
+
+def init_extract_worker(backend: str = None):
+    """
+    解析进程的初始化函数，用作 ProcessPoolExecutor 的 initializer
+    :param backend: BeautifulSoup 解析后端，不提供时读取 Parser.Backend 配置
+    """
+    global _extract_parser
+    _extract_parser = CSDNContentParser(uploader=None, backend=backend)
+
+
+def extract_article(content: str, url: str = None) -> dict:
+    """
+    在解析进程中执行 CSDNContentParser.extract，参数和返回值都可以被 pickle
+    :param content: HTML 内容
+    :param url: 文章链接
+    :return: extract 的解析结果
+    """
+    if _extract_parser is None:
+        init_extract_worker()
+    return _extract_parser.extract(content, url)
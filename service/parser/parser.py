@@ -1,5 +1,30 @@
+import importlib.util
 from abc import ABC, abstractmethod
 
+from utils.logger import logger
+
+# BeautifulSoup 支持的解析后端及其依赖的模块，None 表示无需额外依赖
+PARSER_BACKENDS = {
+    'lxml': 'lxml',
+    'html.parser': None,
+}
+
+
+def resolve_parser_backend(backend: str) -> str:
+    """
+    检查 BeautifulSoup 解析后端是否可用，不可用时回退到标准库的 html.parser
+    :param backend: 期望使用的解析后端，如 lxml、html.parser
+    :return: 实际使用的解析后端
+    """
+    if backend not in PARSER_BACKENDS:
+        logger.warning(f"不支持的解析后端 {backend}，使用 html.parser")
+        return 'html.parser'
+    module_name = PARSER_BACKENDS[backend]
+    if module_name and importlib.util.find_spec(module_name) is None:
+        logger.warning(f"解析后端 {backend} 需要安装 {module_name}，使用 html.parser")
+        return 'html.parser'
+    return backend
+
 
 class ContentParser(ABC):
     def __init__(self):
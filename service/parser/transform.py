@@ -0,0 +1,119 @@
+from typing import Callable, Dict, List
+
+from bs4 import CData, NavigableString, Tag
+
+
+class TransformRule:
+    """
+    DOM 变换规则，由 TransformPipeline 在一次遍历中调用
+    - tag_names 中列出的标签会传给 visit_tag
+    - visits_text 为 True 时，文本节点会传给 visit_text
+    遍历过程中规则只收集节点，修改文档树的操作应放在 finish 中，避免影响正在进行的遍历
+    """
+    tag_names: tuple = ()
+    visits_text: bool = False
+
+    def visit_tag(self, tag: Tag):
+        pass
+
+    def visit_text(self, text: NavigableString):
+        pass
+
+    def finish(self, root: Tag):
+        """遍历结束后按规则注册的顺序调用"""
+        pass
+
+
+class TransformPipeline:
+    """
+    对文章内容元素只遍历一次，将每个节点分发给关心它的规则
+    """
+
+    def __init__(self, rules: List[TransformRule]):
+        self.rules = rules
+        self.tag_rules: Dict[str, List[TransformRule]] = {}
+        for rule in rules:
+            for tag_name in rule.tag_names:
+                self.tag_rules.setdefault(tag_name, []).append(rule)
+        self.text_rules = [rule for rule in rules if rule.visits_text]
+
+    def apply(self, root: Tag):
+        for node in root.descendants:
+            if isinstance(node, Tag):
+                for rule in self.tag_rules.get(node.name, ()):
+                    rule.visit_tag(node)
+            # 与 get_text() 一致，只处理普通文本和 CDATA，不包括注释、脚本等
+            elif type(node) is NavigableString or type(node) is CData:
+                for rule in self.text_rules:
+                    rule.visit_text(node)
+        for rule in self.rules:
+            rule.finish(root)
+
+
+class BriefRule(TransformRule):
+    """提取文章开头的若干个字符作为简介，结果与 get_text()[:length] 相同"""
+    visits_text = True
+
+    def __init__(self, length: int = 100):
+        self.length = length
+        self.parts = []
+        self.collected = 0
+
+    def visit_text(self, text: NavigableString):
+        if self.collected < self.length:
+            self.parts.append(text)
+            self.collected += len(text)
+
+    @property
+    def brief(self) -> str:
+        return ''.join(self.parts)[:self.length]
+
+
+class ImageRewriteRule(TransformRule):
+    """
+    收集所有带 src 的 img 标签，遍历结束后交给 rewrite_images 统一改写 src
+    rewrite_images 接收 img 标签列表，返回改写后的图片链接列表
+    """
+    tag_names = ('img',)
+
+    def __init__(self, rewrite_images: Callable[[List[Tag]], list]):
+        self.rewrite_images = rewrite_images
+        self.images: List[Tag] = []
+        self.image_urls = []
+
+    def visit_tag(self, tag: Tag):
+        if tag.get('src', None):
+            self.images.append(tag)
+
+    def finish(self, root: Tag):
+        self.image_urls = self.rewrite_images(self.images) if self.images else []
+
+
+def clean_code_element(code_element: Tag):
+    """
+    将代码块中的高亮标签转换为纯文本，并只保留 language-xxx 类名
+    :param code_element: code 标签
+    """
+    # 1. 提取纯文本内容，去除标签
+    clean_code = code_element.get_text('', strip=False)
+    clean_code = '\r\n'.join(line for line in clean_code.splitlines())
+    code_element.string = clean_code
+    # 2. 清除 code 标签多余的类名，只保留 language-xxx
+    if 'class' not in code_element.attrs:
+        return
+    code_element['class'] = [class_name for class_name in code_element['class'] if 'language-' in class_name]
+
+
+class CodeBlockRule(TransformRule):
+    """代码块优化，见 clean_code_element"""
+    tag_names = ('code',)
+
+    def __init__(self):
+        self.code_elements: List[Tag] = []
+
+    def visit_tag(self, tag: Tag):
+        self.code_elements.append(tag)
+
+    def finish(self, root: Tag):
+        for code_element in self.code_elements:
+            clean_code_element(code_element)
@@ -1,7 +1,11 @@
 import json
 import os.path
+import shutil
+import sqlite3
+import threading
 import time
 import uuid
+from typing import Callable
 
 from service.persistence.persistence import Persistence
 from utils.data import resolve_data_path
@@ -11,41 +15,54 @@ from utils.utils import generate_random_string
 class LocalPersistence(Persistence):
     """
     本地数据持久化服务
+    文章保存在工作目录下的 SQLite 数据库 db.sqlite3 中（WAL 模式），每篇文章只追加一行，
+    写入开销与已保存的文章数量无关，多线程、多进程写入由 SQLite 保证安全，文章 id 即主键
     """
 
-    def __init__(self):
+    def __init__(self, work_dir: str = None):
+        """
+        :param work_dir: 工作目录（相对数据目录），从爬取日志恢复时传入上次运行的工作目录，不提供则新建
+        """
         super().__init__()
-        work_dir = f'./local-persistence/{time.strftime("%Y%m%d%H%M%S")}-{generate_random_string()}'
+        work_dir = work_dir or f'./local-persistence/{time.strftime("%Y%m%d%H%M%S")}-{generate_random_string()}'
+        self.work_dir = work_dir
         db_dir_path = resolve_data_path(f'{work_dir}')
         self.img_dir_path = resolve_data_path(f'{work_dir}/img')
         self.html_dir_path = resolve_data_path(f'{work_dir}/html')
-        self.data_file_path = os.path.join(db_dir_path, f'db.json')
-        with open(self.data_file_path, 'w', encoding='utf-8') as db_file:
-            json.dump([], db_file)
+        self.data_file_path = os.path.join(db_dir_path, f'db.sqlite3')
+        # 多个消费者共享同一个连接，写入时需要加锁
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.data_file_path, check_same_thread=False, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS article (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT,
+                cover TEXT,
+                content TEXT,
+                category TEXT,
+                brief TEXT,
+                urls TEXT,
+                created_at TEXT
+            )
+        ''')
+        self.connection.commit()
 
-    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list):
+    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list,
+                     on_saved: Callable[[bool], None] = None):
         """
-        保存文章到本地数据库
+        保存文章到本地数据库，同步保存，不调用 on_saved
         """
-        with open(self.data_file_path, 'r', encoding='utf-8') as db_file:
-            try:
-                data = json.load(db_file)
-            except json.JSONDecodeError:
-                data = []
-            article_id = len(data) + 1
-            article = {
-                'id': article_id,
-                'title': title,
-                'cover': cover,
-                'content': content,
-                'category': category,
-                'brief': brief,
-                'urls': urls,
-                'created_at': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
-            data.append(article)
-        with open(self.data_file_path, 'w', encoding='utf-8') as db_file:
-            json.dump(data, db_file, ensure_ascii=False, indent=4)
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT INTO article (title, cover, content, category, brief, urls, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (title, cover, content, category, brief, json.dumps(urls, ensure_ascii=False),
+                 time.strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            self.connection.commit()
+            article_id = cursor.lastrowid
         html_file_path = os.path.join(self.html_dir_path, f'{article_id}.html')
         with open(html_file_path, 'w', encoding='utf-8') as html_file:
             for url in urls:
@@ -116,18 +133,31 @@ class LocalPersistence(Persistence):
             'data': {'id': article_id, 'url': os.path.abspath(html_file_path)}
         }
 
+    def get_article(self, article_id: int) -> dict or None:
+        """
+        根据 id 获取文章
+        :param article_id: 文章 id
+        :return: 文章字典，不存在时返回 None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT id, title, cover, content, category, brief, urls, created_at FROM article WHERE id = ?',
+                (article_id,)
+            ).fetchone()
+        if not row:
+            return None
+        keys = ('id', 'title', 'cover', 'content', 'category', 'brief', 'urls', 'created_at')
+        article = dict(zip(keys, row))
+        article['urls'] = json.loads(article['urls'])
+        return article
+
     def upload_image(self, file: str or bytes) -> dict:
         """
         上传文件到数据库
         :param file: 文件路径或二进制内容
         :return: 上传结果，应当是 {code: int, message: str, data: {url: str}} 的形式
         """
-        if isinstance(file, str) and os.path.exists(file):
-            with open(file, 'rb') as f:
-                content = f.read()
-        elif isinstance(file, bytes):
-            content = file
-        else:
+        if not (isinstance(file, str) and os.path.exists(file)) and not isinstance(file, bytes):
             return {'code': 500, 'message': '非法的文件', 'data': {}}
 
         file_id = uuid.uuid4()
@@ -135,11 +165,19 @@ class LocalPersistence(Persistence):
         file_name = f'{file_id}{file_extension}'
         file_path = os.path.join(self.img_dir_path, file_name)
 
-        with open(file_path, 'wb') as img_file:
-            img_file.write(content)
+        if isinstance(file, str):
+            # 分块复制文件，不将整个文件读入内存
+            shutil.copyfile(file, file_path)
+        else:
+            with open(file_path, 'wb') as img_file:
+                img_file.write(file)
 
         return {
             'code': 200,
             'message': '文件上传成功',
             'data': {'url': os.path.abspath(file_path)}
         }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
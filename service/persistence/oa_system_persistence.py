@@ -1,23 +1,55 @@
+import json
 import os
-import requests
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from fake_useragent import UserAgent
 
 from service.persistence.persistence import Persistence
 from utils.config import config
+from utils.data import resolve_data_path
+from utils.http_client import http_client
 from utils.logger import logger
 
 
 class OASystemPersistence(Persistence):
     """
     使用 OA 系统的 HTTP 接口进行数据库持久化
+    开启批量模式（OASystem.BatchMode）后，save_article 只将文章放入缓冲区并立即返回，
+    由后台线程按数量（BatchSize）或时间窗口（BatchIntervalSeconds）攒批提交：
+    配置了批量接口（BatchAddArticleApiPath）时一次提交整批文章，否则并发调用单篇文章接口。
+    提交失败时按指数退避重试，仍失败的文章写入 data/oa-system/failed_articles.jsonl，close 时提交剩余的文章。
+    缓冲区最多保存 BatchQueueMaxSize 篇文章，已满时 save_article 阻塞等待（背压）；
+    批量模式下 asynchronous 为 True，文章所在的批次提交成功或最终失败后才调用 on_saved，
+    调用方在回调中记录任务完成，进程崩溃时缓冲区中的文章不会被记录为已爬取，下次运行时重新爬取
     """
 
-    def __init__(self):
+    def __init__(self, batch_mode: bool = None):
+        """
+        :param batch_mode: 是否开启批量模式，不提供时读取 OASystem.BatchMode 配置
+        """
         super().__init__()
         self.base_url = config.get('OASystem', 'BaseURL')
         self.upload_api_path = config.get('OASystem', 'UploadApiPath')
         self.add_article_api_path = config.get('OASystem', 'AddArticleApiPath')
         self.ua = UserAgent()
+        self.batch_mode = config.get('OASystem', 'BatchMode') if batch_mode is None else batch_mode
+        self.asynchronous = bool(self.batch_mode)
+        # 元素为 (文章, on_saved 回调)，关闭时放入 None
+        self.pending_articles = queue.Queue(maxsize=config.get('OASystem', 'BatchQueueMaxSize') or 100)
+        self.flush_thread = None
+        if self.batch_mode:
+            self.batch_size = config.get('OASystem', 'BatchSize') or 20
+            self.batch_interval = config.get('OASystem', 'BatchIntervalSeconds') or 2
+            self.batch_concurrency = config.get('OASystem', 'BatchConcurrency') or 4
+            self.batch_api_path = config.get('OASystem', 'BatchAddArticleApiPath')
+            self.max_retries = config.get('OASystem', 'MaxRetries') or 3
+            self.executor = ThreadPoolExecutor(max_workers=self.batch_concurrency, thread_name_prefix='oa-submit')
+            self.flush_thread = threading.Thread(target=self._flush_loop, name='oa-flush', daemon=True)
+            self.flush_thread.start()
 
     def get_requests_configs(self) -> dict:
         """
@@ -56,8 +88,12 @@ class OASystemPersistence(Persistence):
             'timeout': 10,
         }
 
-    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list) -> dict:
-        """保存文章到远程 HTTP 数据库接口"""
+    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list,
+                     on_saved: Callable[[bool], None] = None) -> dict:
+        """
+        保存文章到远程 HTTP 数据库接口，批量模式下只放入缓冲区，缓冲区已满时阻塞等待
+        :param on_saved: 批量模式下文章所在批次提交结束后的回调，参数为是否提交成功
+        """
         payload = {
             'title': title,
             'cover': cover,
@@ -66,12 +102,120 @@ class OASystemPersistence(Persistence):
             'brief': brief,
             'urls': urls
         }
-        response = requests.post(self.base_url + self.add_article_api_path, json=payload, **self.get_requests_configs())
+        if self.batch_mode:
+            self.pending_articles.put((payload, on_saved))
+            return {'code': 202, 'message': '文章已加入提交队列', 'data': {}}
+        return self._post_article(payload)
+
+    def _post_article(self, payload: dict) -> dict:
+        response = http_client.post(self.base_url + self.add_article_api_path, json=payload,
+                                    **self.get_requests_configs())
+        if response.status_code == 200 and response.json()['code'] == 200:
+            logger.info("成功保存文章: 《%s》", payload['title'])
+            return response.json()
+        else:
+            raise Exception(f"保存文章【{payload['title']}】失败 {response.status_code}: {response.text}")
+
+    def _post_articles(self, payloads: list) -> dict:
+        response = http_client.post(self.base_url + self.batch_api_path, json=payloads,
+                                    **self.get_requests_configs())
         if response.status_code == 200 and response.json()['code'] == 200:
-            logger.info(f"成功保存文章: 《{title}》")
+            logger.info(f"成功批量保存 {len(payloads)} 篇文章")
             return response.json()
         else:
-            raise Exception(f"保存文章【{title}】失败 {response.status_code}: {response.text}")
+            raise Exception(f"批量保存 {len(payloads)} 篇文章失败 {response.status_code}: {response.text}")
+
+    def _with_retry(self, func, *args) -> bool:
+        """
+        执行提交操作，失败时按指数退避重试
+        :return: 最终是否成功
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                func(*args)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("%d 次重试后仍提交失败: %s", self.max_retries, e)
+                    return False
+                delay = 2 ** attempt
+                logger.warning("提交失败，%d 秒后第 %d 次重试: %s", delay, attempt + 1, e)
+                time.sleep(delay)
+        return False
+
+    def _save_failed_articles(self, payloads: list):
+        """将最终提交失败的文章写入本地文件，便于之后重新提交"""
+        failed_file_path = os.path.join(resolve_data_path('./oa-system'), 'failed_articles.jsonl')
+        with open(failed_file_path, 'a', encoding='utf-8') as failed_file:
+            for payload in payloads:
+                failed_file.write(json.dumps(payload, ensure_ascii=False) + '\n')
+        logger.error(f"{len(payloads)} 篇文章提交失败，已保存到 {failed_file_path}")
+
+    def _submit_batch(self, batch: list):
+        """
+        提交一批文章，并按提交结果调用每篇文章的 on_saved 回调
+        :param batch: (文章, on_saved 回调) 列表
+        """
+        payloads = [payload for payload, _ in batch]
+        try:
+            if self.batch_api_path:
+                results = [self._with_retry(self._post_articles, payloads)] * len(payloads)
+            else:
+                # 没有批量接口时并发调用单篇文章接口
+                results = list(self.executor.map(lambda payload: self._with_retry(self._post_article, payload),
+                                                 payloads))
+        except Exception as e:
+            logger.error(f"提交 {len(payloads)} 篇文章时发生错误，整批视为失败: {e}", exc_info=True)
+            results = [False] * len(payloads)
+        failed_payloads = [payload for payload, success in zip(payloads, results) if not success]
+        if failed_payloads:
+            try:
+                self._save_failed_articles(failed_payloads)
+            except Exception as e:
+                logger.error(f"保存 {len(failed_payloads)} 篇提交失败的文章时发生错误: {e}", exc_info=True)
+        for (payload, on_saved), success in zip(batch, results):
+            if on_saved is None:
+                continue
+            try:
+                on_saved(success)
+            except Exception as e:
+                logger.error("文章【%s】提交后的回调发生错误: %s", payload['title'], e)
+
+    def _flush_loop(self):
+        """后台提交线程：攒够 batch_size 篇文章或等待超过 batch_interval 秒后提交一批，收到 None 时提交剩余文章并退出"""
+        closing = False
+        while not closing:
+            first = self.pending_articles.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.pending_articles.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self._submit_batch(batch)
+            except Exception as e:
+                # 提交线程退出后缓冲区满时 save_article 会一直阻塞，close 也无法提交剩余的文章
+                logger.error(f"提交 {len(batch)} 篇文章时发生未预期的错误: {e}", exc_info=True)
+
+    def close(self):
+        """提交缓冲区中剩余的文章"""
+        if self.flush_thread:
+            logger.info(f"正在提交缓冲区中剩余的 {self.pending_articles.qsize()} 篇文章")
+            self.pending_articles.put(None)
+            self.flush_thread.join()
+            self.flush_thread = None
+            self.executor.shutdown()
 
     def upload_image(self, file) -> dict:
         """上传文件到 HTTP 接口，支持文件路径或二进制内容"""
@@ -81,18 +225,18 @@ class OASystemPersistence(Persistence):
                 raise FileNotFoundError(f"文件未找到: {file}")
             with open(file, 'rb') as f:
                 files = {'file': (os.path.basename(file), f)}
-                response = requests.post(self.base_url + self.upload_api_path, files=files,
-                                         **self.get_file_requests_configs())
+                response = http_client.post(self.base_url + self.upload_api_path, files=files,
+                                            **self.get_file_requests_configs())
         elif isinstance(file, bytes):
             files = {'file': (f'image.jpg', file)}
-            response = requests.post(self.base_url + self.upload_api_path, files=files,
-                                     **self.get_file_requests_configs())
+            response = http_client.post(self.base_url + self.upload_api_path, files=files,
+                                        **self.get_file_requests_configs())
         else:
             logger.error("不支持的文件类型。预期为文件路径 (str) 或二进制内容 (bytes)。")
             raise TypeError("不支持的文件类型。预期为文件路径 (str) 或二进制内容 (bytes)。")
 
         if response.status_code == 200:
-            logger.info(f"文件上传成功")
+            logger.info("文件上传成功")
             return response.json()
         else:
             logger.error(f"上传失败: {response.status_code}: {response.text}")
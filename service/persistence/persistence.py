@@ -1,17 +1,25 @@
 from abc import ABC, abstractmethod
+from typing import Callable
 
 
 class Persistence(ABC):
     """
     数据库持久化抽象类
     """
+    # 为 True 时 save_article 返回只表示文章已被接收，真正保存（或最终失败）后才调用 on_saved 回调，
+    # 调用方应在回调中记录任务的完成状态，否则进程崩溃时尚未保存的文章会被当作已爬取而不再重新爬取
+    asynchronous = False
 
     def __init__(self):
         pass
 
     @abstractmethod
-    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list):
-        """保存文章到数据库"""
+    def save_article(self, title: str, cover: str, content: str, category: str, brief: str, urls: list,
+                     on_saved: Callable[[bool], None] = None):
+        """
+        保存文章到数据库
+        :param on_saved: 保存结束后的回调，参数为是否保存成功，只有 asynchronous 为 True 的实现会调用
+        """
         pass
 
     @abstractmethod
@@ -22,3 +30,7 @@ class Persistence(ABC):
         :return:    上传结果，应当是 {code: int, message: str, data: {url: str}} 的形式
         """
         pass
+
+    def close(self):
+        """释放持久化服务占用的资源，爬虫结束时调用"""
+        pass
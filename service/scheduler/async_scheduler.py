@@ -0,0 +1,155 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Set, List
+
+from service.scheduler.scheduler import DEFERRED
+from utils.bloom_filter import BloomFilter
+from utils.logger import logger
+
+
+class AsyncBaseScheduler(ABC):
+    """
+    基于 asyncio 的基础调度器，与 BaseScheduler 对应，所有生产者和消费者都是同一个事件循环中的协程。
+    所有生产者结束且所有队列中的任务都已处理完成（Queue.join）后停止，无需轮询。
+    注意：需要在事件循环中创建
+    """
+
+    def __init__(self, queue_maxsize: int = 0, visited_tasks: BloomFilter = None):
+        """
+        :param queue_maxsize: 每个任务队列的最大长度，队列满时生产者等待，为 0 时不限制
+        :param visited_tasks: 记录已成功完成任务的布隆过滤器，不提供则只在本次运行内去重
+        """
+        self.queue_maxsize = queue_maxsize
+        self.task_queues: Dict[str, asyncio.Queue] = {}
+        self.visited_tasks: BloomFilter = visited_tasks or BloomFilter(capacity=1000000)
+        self.pending_tasks: Set[str] = set()
+        self.producers: List['AsyncBaseProducer'] = []
+        self.consumers: List['AsyncBaseConsumer'] = []
+        self.running = True
+
+    def register_task_type(self, task_type: str):
+        if task_type not in self.task_queues:
+            self.task_queues[task_type] = asyncio.Queue(maxsize=self.queue_maxsize)
+
+    def register_producer(self, producer: 'AsyncBaseProducer'):
+        self.producers.append(producer)
+
+    def register_consumer(self, consumer: 'AsyncBaseConsumer'):
+        self.consumers.append(consumer)
+
+    def claim_task(self, key: str) -> bool:
+        """与 BaseScheduler.claim_task 相同，协程之间无需加锁"""
+        if key in self.pending_tasks or key in self.visited_tasks:
+            return False
+        self.pending_tasks.add(key)
+        return True
+
+    def complete_task(self, key: str, success: bool):
+        """与 BaseScheduler.complete_task 相同，异步保存的回调会在其他线程中调用，集合操作和布隆过滤器都是线程安全的"""
+        self.pending_tasks.discard(key)
+        if success:
+            self.visited_tasks.add(key)
+
+    def stop(self):
+        if self.running:
+            logger.info("AsyncBaseScheduler 已停止")
+            self.running = False
+
+    def report_consumer_stats(self):
+        """输出消费者的吞吐统计"""
+        total_processed = sum(consumer.processed_count for consumer in self.consumers)
+        total_failed = sum(consumer.failed_count for consumer in self.consumers)
+        elapsed = max(max((time.time() - consumer.started_at for consumer in self.consumers), default=0), 1e-6)
+        logger.info(f"共 {len(self.consumers)} 个异步消费者，累计成功 {total_processed} / 失败 {total_failed}，"
+                    f"吞吐 {total_processed / elapsed * 60:.2f} 个/分钟")
+
+    @staticmethod
+    def _log_exceptions(role: str, results: list):
+        """
+        输出 gather 结果中的异常，异常退出的生产者或消费者不应看起来像正常结束
+        :param role: 生产者或消费者
+        :param results: asyncio.gather(..., return_exceptions=True) 的结果
+        """
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"异步{role}异常退出: {result!r}", exc_info=result)
+
+    async def run(self):
+        consumer_tasks = [asyncio.create_task(consumer.run()) for consumer in self.consumers]
+        producer_tasks = [asyncio.create_task(producer.run()) for producer in self.producers]
+        self._log_exceptions('生产者', await asyncio.gather(*producer_tasks, return_exceptions=True))
+        for task_queue in self.task_queues.values():
+            await task_queue.join()
+        self.stop()
+        for task in consumer_tasks:
+            task.cancel()
+        # 被取消的消费者返回 CancelledError，不属于 Exception，不输出
+        self._log_exceptions('消费者', await asyncio.gather(*consumer_tasks, return_exceptions=True))
+        self.visited_tasks.flush()
+        self.report_consumer_stats()
+
+
+class AsyncBaseProducer(ABC):
+    """基于 asyncio 的基础生产者，负责注册到调度器"""
+
+    def __init__(self, scheduler: AsyncBaseScheduler, task_type='DEFAULT'):
+        self.scheduler = scheduler
+        self.task_type = task_type
+        self.scheduler.register_task_type(self.task_type)
+        self.scheduler.register_producer(self)
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            logger.info(f"AsyncProducer {self.task_type} 已停止")
+            self.running = False
+
+    @abstractmethod
+    async def run(self):
+        pass
+
+
+class AsyncBaseConsumer(ABC):
+    """基于 asyncio 的基础消费者，负责注册到调度器，并统计自身的吞吐情况"""
+
+    def __init__(self, scheduler: AsyncBaseScheduler, task_type='DEFAULT', worker_id: int = 0):
+        self.name = f'{task_type}-AsyncConsumer-{worker_id}'
+        self.scheduler = scheduler
+        self.task_type = task_type
+        self.worker_id = worker_id
+        self.scheduler.register_task_type(self.task_type)
+        self.scheduler.register_consumer(self)
+        self.started_at = time.time()
+        self.processed_count = 0
+        self.failed_count = 0
+
+    @abstractmethod
+    async def process(self, task) -> bool:
+        """
+        处理任务，由子类实现具体逻辑
+        :return: 是否处理成功，交给异步保存时返回 DEFERRED，完成状态由保存结束后的回调记录
+        """
+        pass
+
+    async def run(self):
+        self.started_at = time.time()
+        task_queue = self.scheduler.task_queues[self.task_type]
+        while True:
+            task = await task_queue.get()
+            try:
+                result = await self.process(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 单个任务失败不应导致整个消费者退出
+                logger.error(f"{self.name} 处理任务时发生错误: {e}")
+                result = False
+            success = result is DEFERRED or bool(result)
+            if result is not DEFERRED:
+                self.scheduler.complete_task(task.key, success)
+            if success:
+                self.processed_count += 1
+            else:
+                self.failed_count += 1
+            task_queue.task_done()
@@ -0,0 +1,78 @@
+import asyncio
+import functools
+from concurrent.futures import Executor
+
+from service.downloader.async_downloader import AsyncHTMLDownloader
+from service.parser.csdn_parser import CSDNContentParser
+from service.persistence.persistence import Persistence
+from service.scheduler.async_scheduler import AsyncBaseScheduler, AsyncBaseProducer, AsyncBaseConsumer
+from service.scheduler.scheduler import DEFERRED
+from service.scheduler.url_base_csdn_scheduler import CSDNURLProducer
+from service.scheduler.url_base_scheduler import Task
+from utils.logger import logger
+
+
+class AsyncCSDNURLProducer(AsyncBaseProducer):
+    def __init__(self, scheduler: AsyncBaseScheduler, start_offset: int = 0):
+        """
+        :param scheduler: 异步调度器
+        :param start_offset: URL 文件的起始字节偏移量，用于从上次中断的位置继续
+        """
+        self.url_source = CSDNURLProducer.load_urls(start_offset)
+        super().__init__(scheduler=scheduler, task_type='CSDN-URL')
+
+    async def run(self):
+        task_queue = self.scheduler.task_queues[self.task_type]
+        for index, url in enumerate(self.url_source or ()):
+            if not (self.running and self.scheduler.running):
+                break
+            task = Task(url, self.task_type)
+            if not self.scheduler.claim_task(task.key):
+                logger.info("跳过已爬取或重复的 URL: %s", url)
+                continue
+            # 队列满时在此等待，实现背压
+            await task_queue.put(task)
+            logger.info("生成 URL: %s", url)
+            if index % 100 == 0:
+                # 队列未满时 put 不会让出事件循环，定期主动让出
+                await asyncio.sleep(0)
+        self.stop()
+
+
+class AsyncCSDNURLConsumer(AsyncBaseConsumer):
+    """
+    异步 CSDN 博客消费者：HTML 下载在事件循环中进行，
+    CPU 密集的解析和同步的持久化接口放到线程池中执行，不阻塞事件循环
+    """
+
+    def __init__(self, scheduler: AsyncBaseScheduler, persistence: Persistence, parser: CSDNContentParser,
+                 html_downloader: AsyncHTMLDownloader, executor: Executor, worker_id: int = 0):
+        super().__init__(scheduler=scheduler, task_type='CSDN-URL', worker_id=worker_id)
+        self.persistence = persistence
+        self.parser = parser
+        self.html_downloader = html_downloader
+        self.executor = executor
+
+    async def process(self, task: Task) -> bool:
+        url = task.url
+        logger.info("开始处理CSDN博客: %s", url)
+        html_content = await self.html_downloader.download(url)
+        if not html_content:
+            logger.error("CSDN博客爬取失败: %s", url)
+            return False
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self.executor, functools.partial(self.parser.parse, html_content, url=url))
+        # 异步保存的文章在提交成功后才记录为已爬取，回调在持久化服务的后台线程中调用
+        on_saved = functools.partial(self.scheduler.complete_task, task.key) if self.persistence.asynchronous else None
+        await loop.run_in_executor(self.executor, functools.partial(
+            self.persistence.save_article,
+            title=result['title'],
+            cover=result['cover'],
+            content=result['html'],
+            category='编程开发',
+            brief=result['brief'],
+            urls=result['image_urls'],
+            on_saved=on_saved
+        ))
+        logger.info("CSDN博客爬取成功: %s", url)
+        return DEFERRED if on_saved else True
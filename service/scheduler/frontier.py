@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict
+
+
+class _HostQueue:
+    """单个主机的待处理任务，按优先级排列的堆"""
+
+    def __init__(self):
+        # 元素为 (-优先级, 序号, 任务)，优先级相同时按入队顺序
+        self.tasks = []
+        # 正在被消费者处理的任务数
+        self.in_flight = 0
+        # 主机在调度堆中最新条目的轮次，其余条目已过期，在弹出时跳过
+        self.version = None
+        self.scheduled = False
+
+
+class Frontier:
+    """
+    待处理任务队列，与 queue.Queue 的 put/get/task_done 用法相同，线程安全：
+    - 每个主机一个按优先级排列的子队列，Task.priority 越大越先处理
+    - 主机之间按各自最高优先级的任务排列，优先级相同的主机轮流出队（round-robin），
+      单个作者或单个主机的大量任务不会阻塞其他主机的任务
+    - host_concurrency 大于 0 时，每个主机同时被处理的任务数不超过该值，
+      响应缓慢或被限流的主机只会占用有限的消费者，其余消费者继续处理其他主机的任务
+    - maxsize 为所有主机的任务总数上限，队列满时 put 阻塞等待（背压）
+    """
+
+    def __init__(self, maxsize: int = 0, host_concurrency: int = 0):
+        """
+        :param maxsize: 所有主机的任务总数上限，为 0 时不限制
+        :param host_concurrency: 每个主机同时被处理的任务数上限，为 0 时不限制
+        """
+        self.maxsize = maxsize
+        self.host_concurrency = host_concurrency
+        self.hosts: Dict[str, _HostQueue] = {}
+        # 可以出队的主机，元素为 (-最高优先级, 轮次, 主机)，轮次保证优先级相同的主机轮流出队
+        self.schedule = []
+        self.rounds = itertools.count()
+        self.sequence = itertools.count()
+        self.size = 0
+        # 待发出的停止信号数量，get 收到停止信号时返回 None
+        self.stop_signals = 0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+    def _schedule(self, host: str, host_queue: _HostQueue):
+        """主机有任务且未达到并发上限时放入调度堆，调用方需持有锁"""
+        if not host_queue.tasks:
+            host_queue.scheduled = False
+            return
+        if self.host_concurrency and host_queue.in_flight >= self.host_concurrency:
+            host_queue.scheduled = False
+            return
+        host_queue.version = next(self.rounds)
+        host_queue.scheduled = True
+        heapq.heappush(self.schedule, (host_queue.tasks[0][0], host_queue.version, host))
+
+    def _pop(self):
+        """取出下一个任务，没有可以出队的主机时返回 None，调用方需持有锁"""
+        while self.schedule:
+            _, version, host = heapq.heappop(self.schedule)
+            host_queue = self.hosts.get(host)
+            if host_queue is None or version != host_queue.version:
+                continue
+            _, _, task = heapq.heappop(host_queue.tasks)
+            host_queue.in_flight += 1
+            self.size -= 1
+            # 重新排到同优先级主机的末尾
+            self._schedule(host, host_queue)
+            self.not_full.notify()
+            return task
+        return None
+
+    def put(self, task, block: bool = True, timeout: float = None) -> bool:
+        """
+        放入任务，队列已满时阻塞等待
+        :param task: 任务，需要有 host 和 priority 属性
+        :param block: 队列已满时是否等待
+        :param timeout: 最长等待时间（秒），不提供则一直等待
+        :return: 是否成功放入
+        """
+        with self.not_full:
+            if self.maxsize > 0:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.size >= self.maxsize:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not block or (remaining is not None and remaining <= 0):
+                        return False
+                    self.not_full.wait(remaining)
+            host = task.host or ''
+            host_queue = self.hosts.get(host)
+            if host_queue is None:
+                host_queue = self.hosts[host] = _HostQueue()
+            head = host_queue.tasks[0][0] if host_queue.tasks else None
+            heapq.heappush(host_queue.tasks, (-task.priority, next(self.sequence), task))
+            self.size += 1
+            # 主机尚未在调度堆中，或新任务的优先级更高时更新调度堆中的条目
+            if not host_queue.scheduled or (head is not None and -task.priority < head):
+                self._schedule(host, host_queue)
+            self.not_empty.notify()
+            return True
+
+    def get(self):
+        """
+        取出下一个任务，没有可以出队的任务时阻塞等待，处理完成后必须调用 task_done
+        :return: 任务，收到停止信号时返回 None
+        """
+        with self.not_empty:
+            while True:
+                if self.stop_signals:
+                    self.stop_signals -= 1
+                    return None
+                task = self._pop()
+                if task is not None:
+                    return task
+                self.not_empty.wait()
+
+    def task_done(self, task):
+        """
+        任务处理完成，释放该主机的并发数
+        :param task: get 返回的任务
+        """
+        with self.lock:
+            host = task.host or ''
+            host_queue = self.hosts[host]
+            host_queue.in_flight -= 1
+            if not host_queue.scheduled:
+                self._schedule(host, host_queue)
+                if host_queue.scheduled:
+                    self.not_empty.notify()
+            if not host_queue.tasks and not host_queue.in_flight:
+                del self.hosts[host]
+
+    def stop_consumers(self, count: int):
+        """向 count 个消费者发送停止信号"""
+        with self.lock:
+            self.stop_signals += count
+            self.not_empty.notify_all()
+
+    def drain(self) -> list:
+        """取出所有尚未开始处理的任务"""
+        with self.lock:
+            tasks = [task for host_queue in self.hosts.values() for _, _, task in sorted(host_queue.tasks)]
+            for host, host_queue in list(self.hosts.items()):
+                host_queue.tasks = []
+                host_queue.scheduled = False
+                if not host_queue.in_flight:
+                    del self.hosts[host]
+            self.schedule = []
+            self.size = 0
+            self.not_full.notify_all()
+            return tasks
+
+    def qsize(self) -> int:
+        """尚未开始处理的任务数"""
+        with self.lock:
+            return self.size
+
+    def host_count(self) -> int:
+        """有待处理或正在处理任务的主机数"""
+        with self.lock:
+            return len(self.hosts)
@@ -0,0 +1,294 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from service.scheduler.task_backend import TaskBackend
+from service.scheduler.url_base_scheduler import Task
+from utils.bloom_filter import bloom_size, bloom_positions
+from utils.logger import logger
+
+try:
+    import redis
+    from redis import RedisError
+except ImportError:  # 分布式模式为可选功能，未安装 redis 时无法使用
+    redis = None
+    # 传入其他兼容客户端时仍可捕获其异常
+    RedisError = Exception
+
+# 从队列头部取出任务，同时放入执行中集合，分数为可见性超时的到期时间
+_GET_SCRIPT = '''
+local item = redis.call('LPOP', KEYS[1])
+if not item then
+    return false
+end
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[2], tonumber(now[1]) + tonumber(now[2]) / 1000000 + tonumber(ARGV[1]), item)
+return item
+'''
+
+# 队列未满时放入队列尾部
+_PUT_SCRIPT = '''
+local maxsize = tonumber(ARGV[2])
+if maxsize > 0 and redis.call('LLEN', KEYS[1]) >= maxsize then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+return 1
+'''
+
+# 放入延迟重试集合，分数为到期时间
+_PUT_DELAYED_SCRIPT = '''
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[1], tonumber(now[1]) + tonumber(now[2]) / 1000000 + tonumber(ARGV[2]), ARGV[1])
+return 1
+'''
+
+# 可见性超时的任务放回队列头部尽快重新处理，到期的延迟任务放回队列尾部
+_RELEASE_SCRIPT = '''
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+for _, item in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], item)
+    redis.call('LPUSH', KEYS[1], item)
+end
+local ready = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now, 'LIMIT', 0, tonumber(ARGV[1]))
+for _, item in ipairs(ready) do
+    redis.call('ZREM', KEYS[3], item)
+    redis.call('RPUSH', KEYS[1], item)
+end
+return {#expired, #ready}
+'''
+
+# 既不在执行中也不在已完成的布隆过滤器（位图）中时标记为执行中，ARGV[2..] 为布隆过滤器的位置
+_CLAIM_SCRIPT = '''
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+local visited = true
+for i = 2, #ARGV do
+    if redis.call('GETBIT', KEYS[2], ARGV[i]) == 0 then
+        visited = false
+        break
+    end
+end
+if visited then
+    return 0
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+return 1
+'''
+
+# 更新本节点的生产者心跳，所有节点都没有存活的生产者且队列、执行中、延迟重试的任务都为空时返回 1
+_DRAINED_SCRIPT = '''
+local now = tonumber(redis.call('TIME')[1])
+if tonumber(ARGV[2]) > 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], now + tonumber(ARGV[3]))
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+local producers = redis.call('HGETALL', KEYS[1])
+local alive = false
+for i = 1, #producers, 2 do
+    if tonumber(producers[i + 1]) > now then
+        alive = true
+    else
+        redis.call('HDEL', KEYS[1], producers[i])
+    end
+end
+if alive then
+    return 0
+end
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        return 0
+    end
+end
+return 1
+'''
+
+
+class RedisTaskBackend(TaskBackend):
+    """
+    基于 Redis 的共享任务存储后端，多个爬虫节点共享同一个待爬队列和去重集合：
+    - 每种任务类型一个列表作为队列，任务序列化为 JSON，payload 需要可 JSON 序列化；
+      任务按入队顺序处理，不支持 Frontier 的优先级和按主机轮流出队
+    - 取出的任务放入执行中集合（有序集合，分数为可见性超时的到期时间），处理完成后确认（ack）才删除，
+      节点崩溃或处理超时的任务在到期后由任意节点放回队列重新处理，因此任务至少被处理一次
+    - 延迟重试的任务保存在延迟集合中，到期后由任意节点放回队列，节点崩溃不会丢失
+    - 已完成的任务记录在 Redis 位图实现的布隆过滤器中，执行中的任务记录在集合中，所有节点共享去重
+    - 所有节点的生产者都已停止（通过心跳判断），且队列、执行中、延迟重试的任务持续 drain_grace 秒为空时停止
+    所有操作均为 Lua 脚本，保证多个节点并发访问时的原子性；键名使用 {prefix} 作为哈希标签，兼容 Redis Cluster。
+    注意：生产者在 claim 之后、入队之前崩溃时，该任务会留在执行中集合（pending）中，需要手动删除才会重新爬取
+    """
+    shared = True
+
+    def __init__(self, client: 'redis.Redis' = None, url: str = 'redis://localhost:6379/0',
+                 prefix: str = 'blog-crawler', queue_maxsize: int = 0, visibility_timeout: float = 300,
+                 capacity: int = 20000000, error_rate: float = 0.001, poll_interval: float = 1.0,
+                 drain_grace: float = 10, producer_ttl: float = 30, node_id: str = None):
+        """
+        :param client: Redis 客户端，不提供则按 url 创建
+        :param url: Redis 地址
+        :param prefix: 键名前缀，同一个爬取任务的所有节点需要相同
+        :param queue_maxsize: 每个任务队列的最大长度，为 0 时不限制
+        :param visibility_timeout: 可见性超时（秒），取出后超过该时间未确认的任务会被重新投递，应大于单个任务的最长处理时间
+        :param capacity: 布隆过滤器的预计元素数量，所有节点需要相同
+        :param error_rate: 布隆过滤器的期望误判率，所有节点需要相同
+        :param poll_interval: 队列为空时的最长轮询间隔，以及检查超时任务和停止条件的间隔（秒）
+        :param drain_grace: 全局任务为空持续该时间后才停止，避免其他节点的生产者尚未启动时提前停止（秒）
+        :param producer_ttl: 生产者心跳的有效期，节点崩溃后超过该时间不再视为有存活的生产者（秒）
+        :param node_id: 节点标识，不提供则使用主机名和进程号
+        """
+        if client is None:
+            if redis is None:
+                raise RuntimeError("分布式模式需要安装 redis: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.queue_maxsize = queue_maxsize
+        self.visibility_timeout = visibility_timeout
+        self.bit_size, self.hash_count = bloom_size(capacity, error_rate)
+        self.poll_interval = poll_interval
+        self.drain_grace = drain_grace
+        self.producer_ttl = producer_ttl
+        self.node_id = node_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.task_types = []
+        # 本节点待发出的停止信号数量，消费者的 get 在收到停止信号时返回 None
+        self.stop_signals = {}
+        self.lock = threading.Lock()
+        self.drained_since = None
+        self.get_script = client.register_script(_GET_SCRIPT)
+        self.put_script = client.register_script(_PUT_SCRIPT)
+        self.put_delayed_script = client.register_script(_PUT_DELAYED_SCRIPT)
+        self.release_script = client.register_script(_RELEASE_SCRIPT)
+        self.claim_script = client.register_script(_CLAIM_SCRIPT)
+        self.drained_script = client.register_script(_DRAINED_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join(['{%s}' % self.prefix, *parts])
+
+    def _task_keys(self, task_type: str) -> list:
+        """任务类型的队列、执行中集合、延迟集合的键名"""
+        return [self._key('queue', task_type), self._key('inflight', task_type), self._key('delayed', task_type)]
+
+    @staticmethod
+    def _dumps(task) -> str:
+        # 每次序列化生成新的 id，保证相同内容的任务在有序集合中是不同的成员
+        return json.dumps({'id': uuid.uuid4().hex, 'task': task.to_dict()}, ensure_ascii=False)
+
+    def register_task_type(self, task_type: str):
+        with self.lock:
+            if task_type not in self.task_types:
+                self.task_types.append(task_type)
+                self.stop_signals[task_type] = 0
+
+    def put(self, task_type: str, task, timeout: float = None) -> bool:
+        item = self._dumps(task)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait_seconds = 0.05
+        while not self.put_script(keys=[self._key('queue', task_type)], args=[item, self.queue_maxsize]):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(wait_seconds if deadline is None else min(wait_seconds, max(deadline - time.monotonic(), 0)))
+            wait_seconds = min(wait_seconds * 2, self.poll_interval)
+        return True
+
+    def put_delayed(self, task_type: str, task, delay: float):
+        self.put_delayed_script(keys=[self._key('delayed', task_type)], args=[self._dumps(task), delay])
+
+    def release_delayed(self) -> float or None:
+        with self.lock:
+            task_types = list(self.task_types)
+        for task_type in task_types:
+            try:
+                expired, _ = self.release_script(keys=self._task_keys(task_type), args=[1000])
+            except RedisError as e:
+                logger.error(f"检查 {task_type} 的超时和延迟任务时发生错误: {e}")
+                continue
+            if expired:
+                logger.warning(f"{expired} 个 {task_type} 任务超过可见性超时未确认，已重新放回队列")
+        return self.poll_interval
+
+    def get(self, task_type: str):
+        wait_seconds = 0.05
+        while True:
+            with self.lock:
+                if self.stop_signals[task_type] > 0:
+                    self.stop_signals[task_type] -= 1
+                    return None
+            try:
+                item = self.get_script(keys=self._task_keys(task_type)[:2], args=[self.visibility_timeout])
+            except RedisError as e:
+                logger.error(f"从 Redis 获取 {task_type} 任务时发生错误: {e}")
+                item = None
+            if item:
+                task = Task.from_dict(json.loads(item)['task'])
+                # 确认时按原始内容从执行中集合删除
+                task.receipt = item
+                return task
+            time.sleep(wait_seconds)
+            wait_seconds = min(wait_seconds * 2, self.poll_interval)
+
+    def ack(self, task_type: str, task):
+        if not self.client.zrem(self._key('inflight', task_type), task.receipt):
+            logger.warning(f"{task_type} 任务确认时已超过可见性超时，可能已被重复处理: {task.url}")
+
+    def stop_consumers(self, task_type: str, count: int):
+        with self.lock:
+            self.stop_signals[task_type] += count
+
+    def discard_queued(self) -> list:
+        return []
+
+    def claim(self, key: str) -> bool:
+        positions = list(bloom_positions(key, self.bit_size, self.hash_count))
+        return bool(self.claim_script(keys=[self._key('pending'), self._key('visited')], args=[key, *positions]))
+
+    def complete(self, key: str, success: bool):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.srem(self._key('pending'), key)
+        if success:
+            for position in bloom_positions(key, self.bit_size, self.hash_count):
+                pipeline.setbit(self._key('visited'), position, 1)
+        pipeline.execute()
+
+    def release(self, key: str):
+        self.client.srem(self._key('pending'), key)
+
+    def is_visited(self, key: str) -> bool:
+        pipeline = self.client.pipeline(transaction=False)
+        for position in bloom_positions(key, self.bit_size, self.hash_count):
+            pipeline.getbit(self._key('visited'), position)
+        return all(pipeline.execute())
+
+    def queue_sizes(self) -> dict:
+        """所有节点共享的队列长度，不包括执行中和延迟重试的任务"""
+        with self.lock:
+            task_types = list(self.task_types)
+        pipeline = self.client.pipeline(transaction=False)
+        for task_type in task_types:
+            pipeline.llen(self._key('queue', task_type))
+        return dict(zip(task_types, pipeline.execute()))
+
+    def is_drained(self, producers_running: int) -> bool:
+        with self.lock:
+            task_types = list(self.task_types)
+        keys = [self._key('producers')] + [key for task_type in task_types for key in self._task_keys(task_type)]
+        try:
+            drained = self.drained_script(keys=keys, args=[self.node_id, producers_running, self.producer_ttl])
+        except RedisError as e:
+            logger.error(f"检查 Redis 任务队列状态时发生错误: {e}")
+            drained = False
+        if not drained:
+            self.drained_since = None
+            return False
+        if self.drained_since is None:
+            self.drained_since = time.monotonic()
+        return time.monotonic() - self.drained_since >= self.drain_grace
+
+    def close(self):
+        self.client.hdel(self._key('producers'), self.node_id)
@@ -1,29 +1,72 @@
-import queue
 import threading
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, Set, List
+from typing import List
 
+from service.scheduler.task_backend import TaskBackend, MemoryTaskBackend
+from utils.bloom_filter import BloomFilter
+from utils.crawl_journal import CrawlJournal
 from utils.logger import logger
+from utils.metrics import metrics
+
+TASK_SECONDS = metrics.histogram('crawler_task_seconds', '消费者处理单个任务的耗时（秒）', ['task_type'])
+TASKS = metrics.counter('crawler_tasks_total', '消费者处理完成的任务数，result 为 success 或 failure',
+                        ['task_type', 'result'])
+TASK_RETRIES = metrics.counter('crawler_task_retries_total', '交给延迟重试队列的任务数', ['task_type'])
+
+# 消费者的处理结果：任务已交给异步保存（如批量提交的持久化服务），按成功统计，
+# 但消费者不记录任务的完成状态，由保存结束后的回调调用 complete_task 记录
+DEFERRED = object()
 
 
 class BaseScheduler(threading.Thread, ABC):
-    """基础调度器，负责管理队列、生产者、消费者和自监听停止条件"""
+    """
+    基础调度器，负责管理队列、生产者、消费者和自监听停止条件。
+    调度器统计已入队但尚未处理完成的任务数（put_task 时加一，task_done 时减一），
+    所有生产者停止且该计数归零时通过条件变量立即唤醒并停止，
+    随后向每个消费者发送一个停止哨兵（None），消费者处理完手头任务后退出，全程无需轮询。
+    需要稍后重试的任务放入延迟重试队列，消费者不必原地等待，
+    调度器线程在任务到期时将其放回任务队列，延迟中的任务同样计入未完成任务数。
+    任务队列和去重状态保存在 TaskBackend 中，使用共享后端（如 RedisTaskBackend）时多个节点共享同一个待爬队列，
+    此时按 poll_interval 定期检查全局的停止条件，而不是本节点的未完成任务数。
+    """
 
-    def __init__(self):
+    def __init__(self, stats_report_interval: float = 60, queue_maxsize: int = 0,
+                 visited_tasks: BloomFilter = None, journal: CrawlJournal = None, backend: TaskBackend = None,
+                 host_concurrency: int = 0):
+        """
+        :param stats_report_interval: 定期输出消费者吞吐统计的间隔（秒），为 0 时只在停止时输出
+        :param queue_maxsize: 每个任务队列的最大长度，队列满时生产者阻塞等待，为 0 时不限制
+        :param visited_tasks: 记录已成功完成任务的布隆过滤器，持久化到磁盘时可跨运行去重，不提供则只在本次运行内去重
+        :param journal: 爬取日志，记录任务的入队和完成，进程异常退出后可从中断的位置继续，不提供则不记录
+        :param backend: 任务队列和去重状态的存储后端，不提供则使用 queue_maxsize、visited_tasks 和 host_concurrency 创建 MemoryTaskBackend
+        :param host_concurrency: 每个任务队列中同一主机同时被处理的任务数上限，为 0 时不限制，只对 MemoryTaskBackend 有效
+        """
         super().__init__()
-        self.task_queues: Dict[str, queue.Queue] = {}
-        self.visited_tasks: Set[str] = set()
+        self.stats_report_interval = stats_report_interval
+        self.backend: TaskBackend = backend or MemoryTaskBackend(
+            queue_maxsize=queue_maxsize, visited_tasks=visited_tasks, host_concurrency=host_concurrency)
+        self.journal = journal
         self.producers: List[threading.Thread] = []
         self.consumers: List[threading.Thread] = []
         self.lock = threading.Lock()
+        # 生产者停止、任务全部完成或调度器被停止时通知调度器线程
+        self.condition = threading.Condition(self.lock)
+        # 已入队但尚未处理完成的任务数，包括队列中的任务和消费者正在处理的任务
+        self.unfinished_tasks = 0
+        # 有新的延迟任务时置为 True，唤醒调度器线程重新计算等待时间
+        self.delayed_tasks_updated = False
         self.running = True
         self.daemon = True
+        metrics.gauge('crawler_queue_depth', '任务队列中尚未开始处理的任务数', ['task_type'],
+                      function=lambda: {(task_type,): size for task_type, size in self.backend.queue_sizes().items()})
+        metrics.gauge('crawler_worker_utilization', '每种任务类型消费者的平均利用率（忙碌时间占比）', ['task_type'],
+                      function=self.consumer_utilization)
+        metrics.gauge('crawler_unfinished_tasks', '本节点已入队但尚未处理完成的任务数',
+                      function=lambda: self.unfinished_tasks)
 
     def register_task_type(self, task_type: str):
-        with self.lock:
-            if task_type not in self.task_queues:
-                self.task_queues[task_type] = queue.Queue()
+        self.backend.register_task_type(task_type)
 
     def register_producer(self, producer: threading.Thread):
         with self.lock:
@@ -33,16 +76,211 @@ class BaseScheduler(threading.Thread, ABC):
         with self.lock:
             self.consumers.append(consumer)
 
+    def put_task(self, task_type: str, task, timeout: float = None) -> bool:
+        """
+        将任务放入队列，队列已满时阻塞等待
+        :param task_type: 任务类型
+        :param task: 任务
+        :param timeout: 最长等待时间（秒），不提供则一直等待
+        :return: 是否成功放入队列，调度器已停止或等待超时时返回 False
+        """
+        with self.condition:
+            if not self.running:
+                return False
+            # 先计数再入队，避免消费者先完成任务导致计数短暂归零
+            self.unfinished_tasks += 1
+        if self.backend.put(task_type, task, timeout=timeout):
+            return True
+        self._finish_tasks(1)
+        return False
+
+    def retry_task(self, task_type: str, task, delay: float) -> bool:
+        """
+        将任务放入延迟重试队列，delay 秒后重新放入任务队列，任务的 attempt 加一
+        消费者调用后仍需对当前任务调用 task_done，任务保持执行中状态，不会被重复入队
+        :param task_type: 任务类型
+        :param task: 任务
+        :param delay: 延迟秒数
+        :return: 是否成功放入，调度器已停止时返回 False
+        """
+        with self.condition:
+            if not self.running:
+                return False
+            task.attempt = getattr(task, 'attempt', 0) + 1
+            self.unfinished_tasks += 1
+            self.backend.put_delayed(task_type, task, delay)
+            # 唤醒调度器线程，重新计算下一个任务的到期时间
+            self.delayed_tasks_updated = True
+            self.condition.notify_all()
+        return True
+
+    def get_task(self, task_type: str):
+        """
+        从队列中获取任务，队列为空时阻塞等待
+        :param task_type: 任务类型
+        :return: 任务，收到停止哨兵时返回 None
+        """
+        return self.backend.get(task_type)
+
+    def task_done(self, task_type: str, task):
+        """
+        消费者处理完一个任务（无论成功与否）后调用
+        :param task_type: 任务类型
+        :param task: get_task 返回的任务
+        """
+        self.backend.ack(task_type, task)
+        self._finish_tasks(1)
+
+    def _finish_tasks(self, count: int):
+        with self.condition:
+            self.unfinished_tasks -= count
+            if self.unfinished_tasks <= 0:
+                self.condition.notify_all()
+
+    def notify_producer_stopped(self):
+        """生产者停止时调用，唤醒调度器检查停止条件"""
+        with self.condition:
+            self.condition.notify_all()
+
+    @staticmethod
+    def _is_producer_running(producer: threading.Thread) -> bool:
+        """
+        生产者线程意外结束而未调用 stop 时同样视为已停止；生产者在调度器之后启动，尚未启动的视为运行中
+        """
+        return producer.running and (producer.is_alive() or producer.ident is None)
+
+    def _is_finished(self) -> bool:
+        """本节点的停止条件，调用方需持有锁，共享后端的全局停止条件由 _is_drained 判断"""
+        if not self.running:
+            return True
+        producers_running = any(self._is_producer_running(p) for p in self.producers)
+        return not self.backend.shared and not producers_running and self.unfinished_tasks <= 0
+
+    def _is_drained(self) -> bool:
+        """共享后端的全局停止条件，需要访问共享存储，不在持有锁时调用"""
+        with self.lock:
+            producers_running = sum(1 for p in self.producers if self._is_producer_running(p))
+        return self.backend.is_drained(producers_running) and not producers_running
+
+    def is_visited(self, key: str) -> bool:
+        """
+        :param key: 任务的唯一标识
+        :return: 任务是否已成功完成
+        """
+        return self.backend.is_visited(key)
+
+    def claim_task(self, key: str) -> bool:
+        """
+        在任务入队前调用，判断任务是否需要执行
+        :param key: 任务的唯一标识，如规范化后的 URL
+        :return: 任务既未完成也未在执行中时返回 True，并将其标记为执行中
+        """
+        return self.backend.claim(key)
+
+    def complete_task(self, key: str, success: bool):
+        """
+        在任务处理结束后调用，成功的任务会被记录为已完成，失败的任务在下次运行时仍会被执行
+        :param key: 任务的唯一标识
+        :param success: 任务是否成功
+        """
+        self.backend.complete(key, success)
+        if self.journal:
+            self.journal.record_completed(key, success)
+
+    def release_task(self, key: str):
+        """
+        放弃尚未完成的任务，如调度器停止时被丢弃的任务，任务既不记录为成功也不记录为失败，
+        爬取日志中仍为未完成状态，恢复时会重新入队
+        :param key: 任务的唯一标识
+        """
+        self.backend.release(key)
+
     def stop(self):
+        """停止调度器，队列中尚未开始处理的任务会被丢弃，正在处理的任务会继续完成"""
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
         logger.info("BaseScheduler 已停止")
-        self.running = False
+
+    def consumer_utilization(self) -> dict:
+        """
+        每种任务类型消费者的平均利用率
+        :return: {(任务类型,): 平均利用率}
+        """
+        with self.lock:
+            consumers = list(self.consumers)
+        utilizations = {}
+        for consumer in consumers:
+            utilizations.setdefault((consumer.task_type,), []).append(consumer.get_stats()['utilization'])
+        return {key: sum(values) / len(values) for key, values in utilizations.items()}
+
+    def report_consumer_stats(self):
+        """输出每个消费者的吞吐统计，用于评估消费者池的规模"""
+        with self.lock:
+            consumers = list(self.consumers)
+        total_processed = 0
+        for consumer in consumers:
+            stats = consumer.get_stats()
+            total_processed += stats['processed']
+            logger.info(f"消费者 {stats['name']}: 成功 {stats['processed']} / 失败 {stats['failed']} / "
+                        f"延迟重试 {stats['retried']}，"
+                        f"吞吐 {stats['throughput']:.2f} 个/分钟，利用率 {stats['utilization']:.1%}")
+        logger.info(f"共 {len(consumers)} 个消费者，累计成功处理 {total_processed} 个任务")
+
+    def _discard_queued_tasks(self):
+        """
+        丢弃队列中尚未开始处理的任务和延迟重试的任务，这些任务未被记录为已完成，下次运行时仍会被执行
+        共享后端的任务由其他节点或下次运行继续处理，不会被丢弃
+        """
+        discarded = self.backend.discard_queued()
+        counts = {}
+        for task_type, task in discarded:
+            self.release_task(task.key)
+            counts[task_type] = counts.get(task_type, 0) + 1
+        if discarded:
+            self._finish_tasks(len(discarded))
+        for task_type, count in counts.items():
+            logger.warning(f"调度器提前停止，丢弃了 {count} 个 {task_type} 任务")
+
+    def shutdown_consumers(self):
+        """向每个消费者发送停止哨兵，并等待它们处理完手头的任务"""
+        with self.lock:
+            consumers = list(self.consumers)
+        self._discard_queued_tasks()
+        counts = {}
+        for consumer in consumers:
+            counts[consumer.task_type] = counts.get(consumer.task_type, 0) + 1
+        for task_type, count in counts.items():
+            self.backend.stop_consumers(task_type, count)
+        for consumer in consumers:
+            if consumer.is_alive() and consumer is not threading.current_thread():
+                consumer.join()
+        self.report_consumer_stats()
 
     def run(self):
-        while self.running:
-            time.sleep(1)
-            with self.lock:
-                if not any(p.is_alive() for p in self.producers) and all(q.empty() for q in self.task_queues.values()):
-                    self.stop()
+        next_report_at = time.monotonic() + self.stats_report_interval if self.stats_report_interval else None
+        while True:
+            # 只在生产者停止、任务完成、调度器被停止或有新的延迟任务时被唤醒，
+            # 另外在延迟任务到期时、按统计间隔和共享后端的检查间隔定期唤醒
+            timeouts = [self.backend.release_delayed(), self.backend.poll_interval]
+            if next_report_at is not None:
+                timeouts.append(max(next_report_at - time.monotonic(), 0))
+            timeouts = [timeout for timeout in timeouts if timeout is not None]
+            with self.condition:
+                self.condition.wait_for(lambda: self._is_finished() or self.delayed_tasks_updated,
+                                        timeout=min(timeouts) if timeouts else None)
+                self.delayed_tasks_updated = False
+                finished = self._is_finished()
+            if finished or (self.backend.shared and self._is_drained()):
+                break
+            if next_report_at is not None and time.monotonic() >= next_report_at:
+                self.report_consumer_stats()
+                next_report_at = time.monotonic() + self.stats_report_interval
+        self.stop()
+        self.shutdown_consumers()
+        self.backend.flush()
 
 
 class BaseProducer(threading.Thread, ABC):
@@ -60,35 +298,79 @@ class BaseProducer(threading.Thread, ABC):
         if self.running:
             logger.info(f"Producer {self.task_type} 已停止")
             self.running = False
+            self.scheduler.notify_producer_stopped()
 
     @abstractmethod
     def run(self):
-        while self.running and self.scheduler.running:
-            logger.info(f"生成 {self.task_type} 的任务")
-            time.sleep(1)
+        """生成任务并通过 scheduler.put_task 放入队列，结束时必须调用 stop"""
+        pass
 
 
 class BaseConsumer(threading.Thread, ABC):
-    """基础消费者，负责注册到调度器"""
+    """基础消费者，负责注册到调度器，并统计自身的吞吐情况"""
 
-    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT'):
-        super().__init__()
+    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT', worker_id: int = 0):
+        super().__init__(name=f'{task_type}-Consumer-{worker_id}')
         self.scheduler = scheduler
         self.task_type = task_type
+        self.worker_id = worker_id
         self.scheduler.register_task_type(self.task_type)
         self.scheduler.register_consumer(self)
         self.running = True
+        self.started_at = time.time()
+        self.processed_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.busy_seconds = 0.0
 
     def stop(self):
         if self.running:
-            logger.info(f"Consumer {self.task_type} 已停止")
+            logger.info(f"Consumer {self.name} 已停止")
             self.running = False
 
+    def record_task(self, elapsed: float, success: bool):
+        """
+        记录一次任务处理的结果
+        :param elapsed: 处理耗时（秒）
+        :param success: 是否处理成功
+        """
+        self.busy_seconds += elapsed
+        if success:
+            self.processed_count += 1
+        else:
+            self.failed_count += 1
+        TASK_SECONDS.observe(elapsed, task_type=self.task_type)
+        TASKS.inc(task_type=self.task_type, result='success' if success else 'failure')
+
+    def record_retry(self, elapsed: float):
+        """
+        记录一次交给延迟重试队列的任务处理
+        :param elapsed: 处理耗时（秒）
+        """
+        self.busy_seconds += elapsed
+        self.retried_count += 1
+        TASK_SECONDS.observe(elapsed, task_type=self.task_type)
+        TASK_RETRIES.inc(task_type=self.task_type)
+
+    def get_stats(self) -> dict:
+        """
+        获取消费者的吞吐统计
+        :return: 包含成功数、失败数、延迟重试数、吞吐量（个/分钟）和利用率的字典
+        """
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            'name': self.name,
+            'processed': self.processed_count,
+            'failed': self.failed_count,
+            'retried': self.retried_count,
+            'throughput': self.processed_count / elapsed * 60,
+            'utilization': min(self.busy_seconds / elapsed, 1.0),
+        }
+
     @abstractmethod
     def run(self):
-        while self.running and self.scheduler.running:
-            try:
-                task = self.scheduler.task_queues[self.task_type].get(timeout=1)
-                logger.info(f"获取到 {self.task_type} 的任务")
-            except queue.Empty:
-                pass
+        """
+        通过 scheduler.get_task 获取任务，收到 None 时退出，
+        每个任务处理完成后必须调用 scheduler.task_done(task_type, task)
+        """
+        pass
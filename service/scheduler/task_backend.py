@@ -0,0 +1,218 @@
+import heapq
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Set
+
+from service.scheduler.frontier import Frontier
+from utils.bloom_filter import BloomFilter
+
+
+class TaskBackend(ABC):
+    """
+    调度器的任务队列和去重状态存储后端，BaseScheduler 通过它存取任务：
+    - 任务队列：每种任务类型一个队列，支持有界队列（背压）和延迟重试
+    - 去重：执行中的任务（pending）和已成功完成的任务（visited）
+    默认的 MemoryTaskBackend 只在本进程内有效；shared 为 True 的后端（如 RedisTaskBackend）
+    由多个爬虫节点共享同一个待爬队列和去重集合，调度器通过 is_drained 判断全局的停止条件
+    """
+    # 是否由多个节点共享，共享后端的停止条件由 is_drained 判断，而不是本节点的未完成任务数
+    shared = False
+    # 共享后端需要定期检查全局状态和处理超时任务的间隔（秒）
+    poll_interval = None
+
+    @abstractmethod
+    def register_task_type(self, task_type: str):
+        """注册任务类型，创建对应的队列"""
+        pass
+
+    @abstractmethod
+    def put(self, task_type: str, task, timeout: float = None) -> bool:
+        """
+        将任务放入队列，队列已满时阻塞等待
+        :param timeout: 最长等待时间（秒），不提供则一直等待
+        :return: 是否成功放入，等待超时时返回 False
+        """
+        pass
+
+    @abstractmethod
+    def put_delayed(self, task_type: str, task, delay: float):
+        """将任务放入延迟重试队列，delay 秒后由 release_delayed 放回任务队列"""
+        pass
+
+    @abstractmethod
+    def release_delayed(self) -> float or None:
+        """
+        将到期的延迟任务放回任务队列，由调度器线程调用
+        :return: 距离下次需要调用的秒数，没有延迟任务时返回 None
+        """
+        pass
+
+    @abstractmethod
+    def get(self, task_type: str):
+        """
+        从队列中获取任务，队列为空时阻塞等待
+        :return: 任务，收到 stop_consumers 发出的停止信号时返回 None
+        """
+        pass
+
+    @abstractmethod
+    def ack(self, task_type: str, task):
+        """确认任务已处理完成（无论成功与否），task 为 get 返回的任务"""
+        pass
+
+    @abstractmethod
+    def stop_consumers(self, task_type: str, count: int):
+        """向 count 个消费者发送停止信号，使它们的 get 返回 None"""
+        pass
+
+    @abstractmethod
+    def discard_queued(self) -> list:
+        """
+        调度器提前停止时调用，丢弃本节点尚未开始处理的任务
+        :return: 被丢弃的 (任务类型, 任务) 列表
+        """
+        pass
+
+    @abstractmethod
+    def claim(self, key: str) -> bool:
+        """任务既未完成也未在执行中时标记为执行中并返回 True，与 BaseScheduler.claim_task 相同"""
+        pass
+
+    @abstractmethod
+    def complete(self, key: str, success: bool):
+        """任务结束，成功的任务记录为已完成"""
+        pass
+
+    @abstractmethod
+    def release(self, key: str):
+        """放弃执行中的任务，不记录为已完成"""
+        pass
+
+    @abstractmethod
+    def is_visited(self, key: str) -> bool:
+        """任务是否已成功完成"""
+        pass
+
+    def queue_sizes(self) -> dict:
+        """
+        各任务队列中尚未开始处理的任务数，用于监控
+        :return: {任务类型: 任务数}
+        """
+        return {}
+
+    def is_drained(self, producers_running: int) -> bool:
+        """
+        共享后端的全局停止条件，由调度器线程按 poll_interval 定期调用
+        :param producers_running: 本节点仍在运行的生产者数量
+        :return: 所有节点的生产者都已停止，且队列、执行中和延迟重试的任务都为空
+        """
+        return True
+
+    def flush(self):
+        """将去重状态写回持久化存储"""
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryTaskBackend(TaskBackend):
+    """
+    进程内的任务存储后端：
+    - 任务队列使用 Frontier，按优先级出队，不同主机的任务轮流出队，可限制每个主机同时被处理的任务数
+    - 延迟重试队列为按到期时间排列的堆
+    - 已完成的任务记录在布隆过滤器中，持久化到磁盘时可跨运行去重
+    """
+
+    def __init__(self, queue_maxsize: int = 0, visited_tasks: BloomFilter = None, host_concurrency: int = 0):
+        """
+        :param queue_maxsize: 每个任务队列的最大长度，为 0 时不限制
+        :param visited_tasks: 记录已成功完成任务的布隆过滤器，不提供则只在本次运行内去重
+        :param host_concurrency: 每个任务队列中同一主机同时被处理的任务数上限，为 0 时不限制
+        """
+        self.queue_maxsize = queue_maxsize
+        self.host_concurrency = host_concurrency
+        self.task_queues: Dict[str, Frontier] = {}
+        # 已成功完成的任务，使用布隆过滤器，内存占用有界
+        self.visited_tasks: BloomFilter = visited_tasks or BloomFilter(capacity=1000000)
+        # 已入队但尚未完成的任务，数量受队列长度和消费者数量限制
+        self.pending_tasks: Set[str] = set()
+        # 延迟重试队列，元素为 (到期时间, 序号, 任务类型, 任务)，序号保证到期时间相同时按加入顺序排列
+        self.delayed_tasks = []
+        self.delayed_sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def register_task_type(self, task_type: str):
+        with self.lock:
+            if task_type not in self.task_queues:
+                self.task_queues[task_type] = Frontier(maxsize=self.queue_maxsize,
+                                                       host_concurrency=self.host_concurrency)
+
+    def put(self, task_type: str, task, timeout: float = None) -> bool:
+        return self.task_queues[task_type].put(task, timeout=timeout)
+
+    def put_delayed(self, task_type: str, task, delay: float):
+        with self.lock:
+            ready_at = time.monotonic() + delay
+            heapq.heappush(self.delayed_tasks, (ready_at, next(self.delayed_sequence), task_type, task))
+
+    def release_delayed(self) -> float or None:
+        """任务队列已满时留到下次再放"""
+        while True:
+            with self.lock:
+                if not self.delayed_tasks:
+                    return None
+                ready_at, _, task_type, task = self.delayed_tasks[0]
+                wait_seconds = ready_at - time.monotonic()
+                if wait_seconds > 0:
+                    return wait_seconds
+                if not self.task_queues[task_type].put(task, block=False):
+                    return 0.1
+                heapq.heappop(self.delayed_tasks)
+
+    def get(self, task_type: str):
+        return self.task_queues[task_type].get()
+
+    def ack(self, task_type: str, task):
+        self.task_queues[task_type].task_done(task)
+
+    def stop_consumers(self, task_type: str, count: int):
+        self.task_queues[task_type].stop_consumers(count)
+
+    def discard_queued(self) -> list:
+        with self.lock:
+            delayed_tasks, self.delayed_tasks = self.delayed_tasks, []
+        discarded = [(task_type, task) for _, _, task_type, task in delayed_tasks]
+        for task_type, task_queue in self.task_queues.items():
+            discarded.extend((task_type, task) for task in task_queue.drain())
+        return discarded
+
+    def claim(self, key: str) -> bool:
+        with self.lock:
+            if key in self.pending_tasks or key in self.visited_tasks:
+                return False
+            self.pending_tasks.add(key)
+            return True
+
+    def complete(self, key: str, success: bool):
+        with self.lock:
+            self.pending_tasks.discard(key)
+            if success:
+                self.visited_tasks.add(key)
+
+    def release(self, key: str):
+        with self.lock:
+            self.pending_tasks.discard(key)
+
+    def is_visited(self, key: str) -> bool:
+        return key in self.visited_tasks
+
+    def queue_sizes(self) -> dict:
+        with self.lock:
+            task_queues = dict(self.task_queues)
+        return {task_type: task_queue.qsize() for task_type, task_queue in task_queues.items()}
+
+    def flush(self):
+        self.visited_tasks.flush()
@@ -0,0 +1,96 @@
+"""
+CSDN 博客的流水线处理，每个阶段有自己的队列和消费者：
+CSDN-URL（下载 HTML）-> CSDN-HTML（在进程池中解析）-> CSDN-MIRROR（镜像图片）-> CSDN-PERSIST（保存文章）
+URL 由 CSDNURLProducer 生成，任务类型为 CSDN-URL
+"""
+from concurrent.futures import Executor
+
+from service.cache.html_cache import HTMLCache
+from service.cache.image_cache import ImageMirrorCache
+from service.downloader.html_downloader import HTMLDownloader
+from service.downloader.image_downloader import CSDNImageDownloader
+from service.parser.csdn_parser import CSDNContentParser, extract_article
+from service.persistence.persistence import Persistence
+from service.scheduler.scheduler import DEFERRED
+from service.scheduler.url_base_scheduler import URLScheduler, PipelineConsumer, Task
+from utils.logger import logger
+from utils.metrics import STEP_SECONDS, ARTICLES
+from utils.rate_limiter import HostRateLimiter
+from utils.retry import RetryPolicy
+
+
+class CSDNDownloadConsumer(PipelineConsumer):
+    """下载阶段：下载文章 HTML，主要等待网络 IO"""
+
+    def __init__(self, url_scheduler: URLScheduler, worker_id: int = 0, html_cache: HTMLCache = None,
+                 host_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None):
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-URL', next_task_type='CSDN-HTML',
+                         worker_id=worker_id)
+        self.html_downloader = HTMLDownloader(html_cache=html_cache, host_limiter=host_limiter,
+                                              retry_policy=retry_policy)
+
+    def _process_task(self, task: Task) -> str or None:
+        logger.info("开始下载CSDN博客: %s", task.url)
+        # 可重试的下载失败抛出 RetryLater，由调度器延迟重试
+        html_content = self.html_downloader.try_download(task.url, task.attempt)
+        if not html_content:
+            logger.error("CSDN博客下载失败: %s", task.url)
+            return None
+        return html_content
+
+
+class CSDNParseConsumer(PipelineConsumer):
+    """
+    解析阶段：BeautifulSoup 解析是纯 Python 的 CPU 密集操作，受 GIL 限制无法用线程扩展，
+    因此把 HTML 交给进程池解析，消费者线程只负责提交和等待，线程数应与进程数相同
+    """
+
+    def __init__(self, url_scheduler: URLScheduler, executor: Executor, worker_id: int = 0):
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-HTML', next_task_type='CSDN-MIRROR',
+                         worker_id=worker_id)
+        self.executor = executor
+
+    def _process_task(self, task: Task) -> dict:
+        # 在进程池中解析时子进程的指标无法汇总，在消费者线程中统计解析耗时
+        with STEP_SECONDS.time(step='parse'):
+            return self.executor.submit(extract_article, task.payload, task.url).result()
+
+
+class CSDNMirrorConsumer(PipelineConsumer):
+    """镜像阶段：下载/上传文章中的图片，并将占位符替换为镜像链接"""
+
+    def __init__(self, url_scheduler: URLScheduler, persistence: Persistence, worker_id: int = 0,
+                 image_cache: ImageMirrorCache = None, host_limiter: HostRateLimiter = None):
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-MIRROR', next_task_type='CSDN-PERSIST',
+                         worker_id=worker_id)
+        self.parser = CSDNContentParser(persistence, CSDNImageDownloader(host_limiter=host_limiter),
+                                        image_cache=image_cache)
+
+    def _process_task(self, task: Task) -> dict:
+        return self.parser.apply_mirrored_images(task.payload)
+
+
+class CSDNPersistConsumer(PipelineConsumer):
+    """持久化阶段：保存文章，是流水线的最后一个阶段"""
+
+    def __init__(self, url_scheduler: URLScheduler, persistence: Persistence, worker_id: int = 0):
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-PERSIST', worker_id=worker_id)
+        self.persistence = persistence
+
+    def _process_task(self, task: Task):
+        result = task.payload
+        # 异步保存的文章在提交成功后才记录为已爬取
+        on_saved = self.complete_later(task) if self.persistence.asynchronous else None
+        with STEP_SECONDS.time(step='save'):
+            self.persistence.save_article(
+                title=result['title'],
+                cover=result['cover'],
+                content=result['html'],
+                category='编程开发',
+                brief=result['brief'],
+                urls=result['image_urls'],
+                on_saved=on_saved
+            )
+        ARTICLES.inc()
+        logger.info("CSDN博客爬取成功: %s", task.url)
+        return DEFERRED if on_saved else True
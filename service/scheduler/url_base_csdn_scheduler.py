@@ -1,60 +1,107 @@
 import os
+from urllib.parse import urlsplit
 
+from service.cache.html_cache import HTMLCache
+from service.cache.image_cache import ImageMirrorCache
 from service.downloader.html_downloader import HTMLDownloader
 from service.downloader.image_downloader import CSDNImageDownloader
 from service.parser.csdn_parser import CSDNContentParser
 from service.persistence.persistence import Persistence
-from service.scheduler.url_base_scheduler import URLScheduler, URLProducer, URLConsumer
+from service.scheduler.scheduler import DEFERRED
+from service.scheduler.url_base_scheduler import URLScheduler, URLProducer, URLConsumer, Task
+from service.scheduler.url_source import URLFileSource, find_url_file
 from utils.data import resolve_data_path
+from utils.metrics import STEP_SECONDS, ARTICLES
+from utils.rate_limiter import HostRateLimiter
+from utils.retry import RetryPolicy
 
 from utils.logger import logger
 
 
 class CSDNURLProducer(URLProducer):
-    def __init__(self, url_scheduler: URLScheduler):
-        self.urls = []
+    def __init__(self, url_scheduler: URLScheduler, start_offset: int = 0, resume_urls: list = None):
+        """
+        :param url_scheduler: URL 调度器
+        :param start_offset: URL 文件的起始字节偏移量，用于从上次中断的位置继续
+        :param resume_urls: 上次运行中已入队但未完成的 URL，优先重新入队
+        """
         self.index = 0
-        self.load_urls()
-        super().__init__(scheduler=url_scheduler, task_type='CSDN-URL')
-
-    def load_urls(self):
-        dataset_dir = resolve_data_path('./dataset')
-        csdn_urls_file = os.path.join(dataset_dir, 'csdn_urls.txt')
-        if not os.path.exists(csdn_urls_file):
-            logger.warning(f"文件不存在: {csdn_urls_file}，无法加载CSDN博客链接")
-            return
-        with open(csdn_urls_file, 'r') as f:
-            self.urls = [line.strip() for line in f.readlines()]
+        self.url_source = self.load_urls(start_offset)
+        self.urls = iter(self.url_source) if self.url_source else iter(())
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-URL', resume_urls=resume_urls)
+
+    @staticmethod
+    def url_file_path() -> str or None:
+        """CSDN 博客链接文件的路径，文件不存在时返回 None"""
+        return find_url_file(resolve_data_path('./dataset'), 'csdn_urls.txt')
+
+    @staticmethod
+    def load_urls(start_offset: int = 0) -> URLFileSource or None:
+        csdn_urls_file = CSDNURLProducer.url_file_path()
+        if not csdn_urls_file:
+            logger.warning(f"文件不存在: {os.path.join(resolve_data_path('./dataset'), 'csdn_urls.txt')}，"
+                           f"无法加载CSDN博客链接")
+            return None
+        return URLFileSource(csdn_urls_file, start_offset=start_offset)
+
+    @property
+    def offset(self) -> int:
+        """当前已读取到的 URL 文件字节偏移量"""
+        return self.url_source.offset if self.url_source else 0
 
     def _generate_url(self):
-        url = self.urls[self.index]
-        self.index += 1
-        if self.index >= len(self.urls):
+        url = next(self.urls, None)
+        if url is None:
             self.stop()
+            return None
+        self.index += 1
         return url
 
+    def _url_host(self, url: str) -> str or None:
+        """
+        所有博客都在 blog.csdn.net 下，按主机名公平调度没有意义，改为按作者轮流处理，
+        避免单个作者的大量文章占满队列。请求频率仍由按主机名限流的 HostRateLimiter 控制
+        :return: blog.csdn.net/<作者>，无法识别作者时返回 None
+        """
+        parts = urlsplit(url)
+        author = parts.path.strip('/').split('/', 1)[0]
+        if not parts.hostname or not author:
+            return None
+        return f'{parts.hostname}/{author}'
+
 
 class CSDNURLConsumer(URLConsumer):
-    def __init__(self, url_scheduler: URLScheduler, persistence: Persistence):
-        super().__init__(scheduler=url_scheduler, task_type='CSDN-URL')
+    def __init__(self, url_scheduler: URLScheduler, persistence: Persistence, worker_id: int = 0,
+                 image_cache: ImageMirrorCache = None, html_cache: HTMLCache = None,
+                 host_limiter: HostRateLimiter = None, retry_policy: RetryPolicy = None):
+        super().__init__(scheduler=url_scheduler, task_type='CSDN-URL', worker_id=worker_id)
         self.persistence = persistence
-        self.html_downloader = HTMLDownloader()
-        self.image_downloader = CSDNImageDownloader()
-        self.parser = CSDNContentParser(self.persistence, self.image_downloader)
+        self.html_downloader = HTMLDownloader(html_cache=html_cache, host_limiter=host_limiter,
+                                              retry_policy=retry_policy)
+        self.image_downloader = CSDNImageDownloader(host_limiter=host_limiter)
+        self.parser = CSDNContentParser(self.persistence, self.image_downloader, image_cache=image_cache)
 
-    def _process_url(self, url):
-        logger.info(f"开始处理CSDN博客: {url}")
-        html_content = self.html_downloader.download(url)
+    def _process_task(self, task: Task):
+        url = task.url
+        logger.info("开始处理CSDN博客: %s", url)
+        # 可重试的下载失败抛出 RetryLater，由调度器延迟重试，消费者不原地等待
+        html_content = self.html_downloader.try_download(url, task.attempt)
         if html_content:
             result = self.parser.parse(html_content, url=url)
-            self.persistence.save_article(
-                title=result['title'],
-                cover=result['cover'],
-                content=result['html'],
-                category='编程开发',
-                brief=result['brief'],
-                urls=result['image_urls']
-            )
-            logger.info(f"CSDN博客爬取成功: {url}")
-        else:
-            logger.error(f"CSDN博客爬取失败: {url}")
+            # 异步保存的文章在提交成功后才记录为已爬取
+            on_saved = self.complete_later(task) if self.persistence.asynchronous else None
+            with STEP_SECONDS.time(step='save'):
+                self.persistence.save_article(
+                    title=result['title'],
+                    cover=result['cover'],
+                    content=result['html'],
+                    category='编程开发',
+                    brief=result['brief'],
+                    urls=result['image_urls'],
+                    on_saved=on_saved
+                )
+            ARTICLES.inc()
+            logger.info("CSDN博客爬取成功: %s", url)
+            return DEFERRED if on_saved else True
+        logger.error("CSDN博客爬取失败: %s", url)
+        return False
@@ -1,15 +1,55 @@
-import queue
 import time
 from abc import abstractmethod, ABC
+from typing import Callable
+from urllib.parse import urlsplit
 
-from service.scheduler.scheduler import BaseScheduler, BaseProducer, BaseConsumer
+from service.scheduler.scheduler import BaseScheduler, BaseProducer, BaseConsumer, DEFERRED
 from utils.logger import logger
+from utils.retry import RetryLater
+from utils.url import canonicalize_url
 
 
 class Task:
-    def __init__(self, url, task_type):
+    def __init__(self, url, task_type, payload=None, priority: int = 0, host: str = None):
+        """
+        :param priority: 优先级，越大越先处理
+        :param host: 公平调度使用的主机键，不同主机键的任务轮流处理，不提供则使用 URL 的主机名
+        """
         self.url = url
         self.task_type = task_type
+        # 流水线中上一阶段的处理结果，交给下一阶段继续处理
+        self.payload = payload
+        # 去重使用的唯一标识
+        self.key = canonicalize_url(url)
+        # 本阶段已尝试的次数，由调度器在延迟重试时增加
+        self.attempt = 0
+        self.priority = priority
+        self.host = host or urlsplit(url).hostname or ''
+
+    def next_stage(self, task_type: str, payload) -> 'Task':
+        """
+        生成流水线下一阶段的任务，去重标识不变
+        :param task_type: 下一阶段的任务类型
+        :param payload: 本阶段的处理结果
+        :return: 下一阶段的任务
+        """
+        task = Task(self.url, task_type, payload, priority=self.priority, host=self.host)
+        task.key = self.key
+        return task
+
+    def to_dict(self) -> dict:
+        """转换为可 JSON 序列化的字典，用于保存到共享的任务队列，payload 需要可 JSON 序列化"""
+        return {'url': self.url, 'task_type': self.task_type, 'payload': self.payload, 'key': self.key,
+                'attempt': self.attempt, 'priority': self.priority, 'host': self.host}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Task':
+        """从 to_dict 的结果恢复任务"""
+        task = cls(data['url'], data['task_type'], data.get('payload'), priority=data.get('priority', 0),
+                   host=data.get('host'))
+        task.key = data.get('key') or task.key
+        task.attempt = data.get('attempt', 0)
+        return task
 
 
 class URLScheduler(BaseScheduler):
@@ -18,35 +58,227 @@ class URLScheduler(BaseScheduler):
 
 
 class URLProducer(BaseProducer):
-    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT_URL'):
+    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT_URL', resume_urls: list = None):
+        """
+        :param resume_urls: 上次运行中已入队但未完成的 URL，在生成新的 URL 之前重新入队
+        """
         super().__init__(scheduler=scheduler, task_type=task_type)
+        self.resume_urls = list(resume_urls or [])
+
+    @property
+    def offset(self) -> int or None:
+        """URL 来源当前的读取位置，写入爬取日志用于恢复，由支持恢复的子类实现"""
+        return None
 
-    def _generate_url(self):
+    def _generate_url(self) -> str or None:
+        """
+        生成下一个 URL，由子类实现具体逻辑
+        :return: URL，没有更多 URL 时返回 None
+        """
         return f"https://example.com/{time.time()}"
 
+    def _url_priority(self, url: str) -> int:
+        """
+        URL 的优先级，越大越先处理，由子类按需覆盖，如提高新发布文章的优先级
+        :param url: 生成的 URL
+        """
+        return 0
+
+    def _url_host(self, url: str) -> str or None:
+        """
+        URL 的公平调度键，键相同的任务共享同一个主机队列和并发上限，由子类按需覆盖，
+        如同一主机下按作者区分
+        :param url: 生成的 URL
+        :return: 公平调度键，返回 None 时使用 URL 的主机名
+        """
+        return None
+
+    def _put_task(self, task: Task) -> bool:
+        """
+        将任务放入队列，队列已满时阻塞等待消费者取走任务（背压），期间仍响应停止信号
+        :return: 是否成功放入队列
+        """
+        while self.running and self.scheduler.running:
+            if self.scheduler.put_task(self.task_type, task, timeout=1):
+                return True
+        return False
+
     def run(self):
+        # 生产者不做限速，尽可能快地填充队列，由有界队列提供背压，请求频率由下载器的限流器控制
+        try:
+            self._produce()
+        except Exception as e:
+            # 生产者异常退出时仍需停止，否则调度器一直等待生产者而无法结束
+            logger.error("Producer %s 异常退出: %s", self.task_type, e, exc_info=True)
+        finally:
+            self.stop()
+
+    def _produce(self):
+        journal = self.scheduler.journal
+        if self.resume_urls:
+            logger.info(f"重新入队上次运行中未完成的 {len(self.resume_urls)} 个 URL")
         while self.running and self.scheduler.running:
-            url = self._generate_url()
-            self.scheduler.task_queues[self.task_type].put(Task(url, self.task_type))
-            logger.info(f"生成 URL: {url}")
-            time.sleep(1)
-        self.stop()
+            resumed = bool(self.resume_urls)
+            url = self.resume_urls.pop(0) if resumed else self._generate_url()
+            if url is None:
+                break
+            try:
+                task = Task(url, self.task_type, priority=self._url_priority(url), host=self._url_host(url))
+            except ValueError as e:
+                # 无法解析的 URL（如 http://[::1/a）只跳过该行，不结束整个 URL 来源
+                logger.warning("跳过无效的 URL: %s，%s", url, e)
+                continue
+            if not self.scheduler.claim_task(task.key):
+                logger.info("跳过已爬取或重复的 URL: %s", url)
+                if resumed and journal and self.scheduler.is_visited(task.key):
+                    # 上次运行中已完成但完成记录未写入日志
+                    journal.record_completed(task.key, success=True)
+                continue
+            if not self._put_task(task):
+                self.scheduler.release_task(task.key)
+                break
+            if journal:
+                journal.record_enqueued(task.key, url, None if resumed else self.offset)
+            logger.info("生成 URL: %s", url)
 
 
 class URLConsumer(BaseConsumer):
-    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT_URL'):
-        super().__init__(scheduler=scheduler, task_type=task_type)
+    def __init__(self, scheduler: BaseScheduler, task_type='DEFAULT_URL', worker_id: int = 0):
+        super().__init__(scheduler=scheduler, task_type=task_type, worker_id=worker_id)
+
+    def _process_url(self, url) -> bool:
+        """
+        处理 URL，由子类实现具体逻辑
+        :param url: 待处理的 URL
+        :return: 是否处理成功
+        """
+        logger.info("处理 URL: %s", url)
+        return True
 
-    def _process_url(self, url):
-        logger.info(f"处理 URL: {url}")
+    def _process_task(self, task: Task):
+        """
+        处理任务，默认处理任务的 URL，需要任务其余信息（如 attempt、payload）的子类可以覆盖此方法
+        :param task: 待处理的任务
+        :return: 处理结果，交给异步保存时返回 DEFERRED
+        :raise RetryLater: 任务暂时失败，交给调度器延迟重试
+        """
+        return self._process_url(task.url)
+
+    def complete_later(self, task: Task) -> Callable[[bool], None]:
+        """
+        任务交给异步保存时使用，_process_task 应返回 DEFERRED
+        :return: 保存结束后调用的回调，参数为是否保存成功，记录任务的完成状态
+        """
+        def on_saved(success: bool):
+            self.scheduler.complete_task(task.key, success)
+        return on_saved
+
+    def _retry_later(self, task: Task, retry: RetryLater, start_time: float) -> bool:
+        """
+        将暂时失败的任务交给调度器的延迟重试队列，消费者继续处理下一个任务
+        :return: 是否成功交给调度器，调度器已停止时返回 False
+        """
+        if not self.scheduler.retry_task(self.task_type, task, retry.delay):
+            return False
+        logger.info("%.2f 秒后第 %s 次尝试处理 URL %s", retry.delay, task.attempt + 1, task.url)
+        self.record_retry(time.time() - start_time)
+        self.scheduler.task_done(self.task_type, task)
+        return True
 
     def run(self):
-        while self.running and self.scheduler.running:
+        self.started_at = time.time()
+        while True:
+            task = self.scheduler.get_task(self.task_type)
+            if task is None:
+                break
+            start_time = time.time()
+            try:
+                result = self._process_task(task)
+            except RetryLater as retry:
+                if not self._retry_later(task, retry, start_time):
+                    # 调度器已停止，任务保持未完成状态，下次运行时重新执行
+                    self.scheduler.release_task(task.key)
+                    self.scheduler.task_done(self.task_type, task)
+                continue
+            except Exception as e:
+                # 单个任务失败不应导致整个消费者线程退出
+                logger.error("处理 URL %s 时发生错误: %s", task.url, e)
+                result = False
+            if result is DEFERRED:
+                # 完成状态由 complete_later 的回调在保存结束后记录
+                success = True
+            else:
+                success = bool(result)
+                self.scheduler.complete_task(task.key, success)
+            self.record_task(time.time() - start_time, success)
+            self.scheduler.task_done(self.task_type, task)
+        self.stop()
+
+
+class PipelineConsumer(URLConsumer):
+    """
+    流水线阶段消费者：处理本阶段的任务，并把结果作为下一阶段任务的 payload 放入下一阶段的队列。
+    每个阶段有自己的队列和消费者数量，下一阶段的队列满时阻塞等待（背压）。
+    任务先放入下一阶段再标记本阶段完成，调度器的未完成任务计数不会在流水线中途归零；
+    只有最后一个阶段（next_task_type 为 None）或处理失败时才记录任务的完成状态
+    """
+
+    def __init__(self, scheduler: BaseScheduler, task_type: str, next_task_type: str = None, worker_id: int = 0):
+        super().__init__(scheduler=scheduler, task_type=task_type, worker_id=worker_id)
+        self.next_task_type = next_task_type
+        if self.next_task_type:
+            self.scheduler.register_task_type(self.next_task_type)
+
+    def _process_task(self, task: Task):
+        """
+        处理本阶段的任务，由子类实现具体逻辑
+        :param task: 待处理的任务，task.payload 为上一阶段的结果
+        :return: 本阶段的结果，最后一个阶段返回是否成功或 DEFERRED；处理失败时返回 None 或 False
+        :raise RetryLater: 任务暂时失败，交给调度器延迟重试
+        """
+        return self._process_url(task.url)
+
+    def _hand_off(self, task: Task, payload) -> bool:
+        """
+        将结果交给下一阶段，期间仍响应调度器的停止信号
+        :return: 是否成功放入下一阶段的队列
+        """
+        next_task = task.next_stage(self.next_task_type, payload)
+        while self.scheduler.running:
+            if self.scheduler.put_task(self.next_task_type, next_task, timeout=1):
+                return True
+        logger.warning("调度器已停止，%s 任务未能入队: %s", self.next_task_type, task.url)
+        return False
+
+    def run(self):
+        self.started_at = time.time()
+        while True:
+            task = self.scheduler.get_task(self.task_type)
+            if task is None:
+                break
+            start_time = time.time()
             try:
-                task = self.scheduler.task_queues[self.task_type].get(timeout=1)
-                self._process_url(task.url)
-            except queue.Empty:
-                pass
+                result = self._process_task(task)
+            except RetryLater as retry:
+                if not self._retry_later(task, retry, start_time):
+                    self.scheduler.release_task(task.key)
+                    self.scheduler.task_done(self.task_type, task)
+                continue
+            except Exception as e:
+                # 单个任务失败不应导致整个消费者线程退出
+                logger.error("%s 阶段处理 URL %s 时发生错误: %s", self.task_type, task.url, e)
+                result = None
+            success = result is not None and result is not False
+            if success and self.next_task_type:
+                # 已交给下一阶段的任务，完成状态由后续阶段记录
+                if not self._hand_off(task, result):
+                    # 调度器已停止，任务保持未完成状态，下次运行时重新执行
+                    self.scheduler.release_task(task.key)
+                    success = False
+            elif result is not DEFERRED:
+                self.scheduler.complete_task(task.key, success)
+            self.record_task(time.time() - start_time, success)
+            self.scheduler.task_done(self.task_type, task)
         self.stop()
 
 
@@ -64,7 +296,7 @@ class URLConsumer(BaseConsumer):
 
 
 def main():
-    scheduler = URLScheduler()
+    scheduler = URLScheduler(queue_maxsize=10)
     producer = URLProducer(scheduler, task_type='example')
     consumer = URLConsumer(scheduler, task_type='example')
 
@@ -0,0 +1,89 @@
+import gzip
+import io
+import os
+from typing import Iterator
+
+from utils.logger import logger
+
+try:
+    import zstandard
+except ImportError:  # zstd 压缩为可选功能，未安装 zstandard 时不支持 .zst 文件
+    zstandard = None
+
+
+class URLFileSource:
+    """
+    按行惰性读取 URL 种子文件，内存占用与文件大小无关
+    - 支持纯文本、gzip（.gz）、zstd（.zst，需要安装 zstandard）格式
+    - 跳过空行和以 # 开头的注释行
+    - 支持从指定字节偏移量（解压后的偏移量）恢复读取，当前偏移量可通过 offset 获取
+    """
+
+    def __init__(self, file_path: str, start_offset: int = 0):
+        """
+        :param file_path: URL 文件路径
+        :param start_offset: 开始读取的字节偏移量，应为某一行的起始位置
+        """
+        self.file_path = file_path
+        self.start_offset = start_offset
+        self.offset = start_offset
+
+    def _open(self) -> io.BufferedIOBase:
+        if self.file_path.endswith('.gz'):
+            return gzip.open(self.file_path, 'rb')
+        if self.file_path.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError(f"读取 {self.file_path} 需要安装 zstandard")
+            raw_file = open(self.file_path, 'rb')
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=True))
+        return open(self.file_path, 'rb')
+
+    @staticmethod
+    def _skip(file: io.BufferedIOBase, offset: int):
+        """跳过前 offset 个字节，压缩流不支持随机访问时逐块读取丢弃"""
+        if file.seekable():
+            file.seek(offset)
+            return
+        remaining = offset
+        while remaining > 0:
+            chunk = file.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._open() as file:
+            if self.start_offset:
+                self._skip(file, self.start_offset)
+                logger.info(f"从偏移量 {self.start_offset} 处继续读取 {self.file_path}")
+            self.offset = self.start_offset
+            for raw_line in file:
+                self.offset += len(raw_line)
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line or line.startswith('#'):
+                    continue
+                yield line
+
+
+def find_url_file(dir_path: str, file_name: str) -> str or None:
+    """
+    在目录中查找 URL 文件，依次尝试纯文本、gzip、zstd 格式
+    :param dir_path: 目录路径
+    :param file_name: 纯文本格式的文件名，如 csdn_urls.txt
+    :return: 找到的文件路径，未找到时返回 None
+    """
+    for suffix in ('', '.gz', '.zst'):
+        file_path = os.path.join(dir_path, file_name + suffix)
+        if os.path.exists(file_path):
+            return file_path
+    return None
+
+
+def url_file_identity(file_path: str) -> dict:
+    """
+    URL 文件的标识，用于判断恢复时记录的偏移量是否仍然有效
+    :param file_path: URL 文件路径
+    :return: 包含绝对路径、大小和修改时间的字典
+    """
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
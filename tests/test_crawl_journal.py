@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.crawl_journal import CrawlJournal
+
+
+class CrawlJournalTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.file_path = os.path.join(temp_dir.name, 'crawl.journal')
+
+    def open_journal(self, **options) -> CrawlJournal:
+        settings = dict(sync_interval=0.05)
+        settings.update(options)
+        journal = CrawlJournal(self.file_path, **settings)
+        self.addCleanup(journal.close)
+        return journal
+
+    def line_count(self) -> int:
+        with open(self.file_path, encoding='utf-8') as file:
+            return sum(1 for _ in file)
+
+    def test_resume_after_restart(self):
+        journal = self.open_journal()
+        journal.record_enqueued('a', 'https://a.com/1', 10)
+        journal.record_enqueued('b', 'https://a.com/2', 20)
+        journal.record_enqueued('c', 'https://a.com/3', 30)
+        journal.record_completed('a', success=True)
+        journal.record_completed('b', success=False)
+        journal.close()
+
+        journal = self.open_journal()
+        self.assertEqual(journal.offset, 30)
+        self.assertEqual(journal.pending_urls(), ['https://a.com/3'])
+        self.assertEqual(sorted(journal.pending_urls(include_failed=True)), ['https://a.com/2', 'https://a.com/3'])
+
+    def test_periodic_compaction(self):
+        journal = self.open_journal(compact_records=50)
+        for i in range(200):
+            journal.record_enqueued(str(i), f'https://a.com/{i}', i)
+            journal.record_completed(str(i), success=True)
+        journal.record_enqueued('pending', 'https://a.com/pending', 200)
+        time.sleep(0.3)
+        # 运行中压缩后只保留运行信息、偏移量和未完成的任务
+        self.assertLess(self.line_count(), 50)
+        journal.close()
+
+        journal = self.open_journal()
+        self.assertEqual(journal.offset, 200)
+        self.assertEqual(journal.pending_urls(), ['https://a.com/pending'])
+
+    def test_reset_offset_when_source_changed(self):
+        source = {'path': '/data/csdn_urls.txt', 'size': 100, 'mtime': 1}
+        journal = self.open_journal(source=source)
+        journal.record_enqueued('a', 'https://a.com/1', 50)
+        journal.close()
+
+        journal = self.open_journal(source=source)
+        self.assertEqual(journal.offset, 50)
+        journal.close()
+
+        journal = self.open_journal(source=dict(source, size=200))
+        self.assertEqual(journal.offset, 0)
+        # 未完成的任务仍然保留
+        self.assertEqual(journal.pending_urls(), ['https://a.com/1'])
+        self.assertEqual(journal.meta['source']['size'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
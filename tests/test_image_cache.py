@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from service.cache.image_cache import ImageMirrorCache
+
+
+class ImageMirrorCacheTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.dir_path = temp_dir.name
+
+    def open_cache(self, **options) -> ImageMirrorCache:
+        cache = ImageMirrorCache(os.path.join(self.dir_path, 'image_mirror.sqlite3'), **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_url_and_content_hit(self):
+        cache = self.open_cache()
+        cache.put('https://img.example.com/a.png', 'sha-a', 'https://oa.example.com/a.png', 100)
+        self.assertEqual(cache.get_by_url('https://img.example.com/a.png'), 'https://oa.example.com/a.png')
+        self.assertEqual(cache.get_by_content('sha-a'), 'https://oa.example.com/a.png')
+        self.assertIsNone(cache.get_by_url('https://img.example.com/b.png'))
+        self.assertEqual(cache.stats(), {'urls': 1, 'images': 1, 'bytes': 100})
+
+    def test_missing_local_file_is_a_miss(self):
+        cache = self.open_cache(local_files=True)
+        mirror_path = os.path.join(self.dir_path, 'a.png')
+        with open(mirror_path, 'wb') as file:
+            file.write(b'png')
+        cache.put('https://img.example.com/a.png', 'sha-a', mirror_path, 3)
+        self.assertEqual(cache.get_by_url('https://img.example.com/a.png'), mirror_path)
+
+        # 上次运行的工作目录已被清理
+        os.remove(mirror_path)
+        self.assertIsNone(cache.get_by_url('https://img.example.com/a.png'))
+        self.assertIsNone(cache.get_by_content('sha-a'))
+        self.assertEqual(cache.stats(), {'urls': 0, 'images': 0, 'bytes': 0})
+
+    def test_evict_least_recently_used(self):
+        cache = self.open_cache(max_entries=2)
+        for name in ('a', 'b', 'c'):
+            cache.put(f'https://img.example.com/{name}.png', f'sha-{name}', f'https://oa.example.com/{name}.png', 1)
+        cache.get_by_url('https://img.example.com/a.png')
+        with cache.lock:
+            cache._evict()
+        self.assertIsNone(cache.get_by_url('https://img.example.com/b.png'))
+        self.assertIsNotNone(cache.get_by_url('https://img.example.com/a.png'))
+        self.assertIsNotNone(cache.get_by_url('https://img.example.com/c.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from service.persistence.oa_system_persistence import OASystemPersistence
+from utils.config import config
+
+
+class StubOASystem:
+    """
+    代替 OA 系统的本地 HTTP 服务，记录收到的文章，按 status_codes 的顺序返回状态码，用完后返回 200
+    """
+
+    def __init__(self, status_codes: list = None):
+        self.status_codes = list(status_codes or [])
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append((self.path, body))
+                    status_code = stub.status_codes.pop(0) if stub.status_codes else 200
+                data = json.dumps({'code': 200 if status_code == 200 else status_code, 'data': {}}).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def articles(self) -> list:
+        """收到的所有文章，批量接口的请求展开为单篇文章"""
+        with self.lock:
+            requests = list(self.requests)
+        articles = []
+        for _, body in requests:
+            articles.extend(body if isinstance(body, list) else [body])
+        return articles
+
+    def wait_for_articles(self, count: int, timeout: float = 5) -> list:
+        deadline = time.monotonic() + timeout
+        while len(self.articles()) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.articles()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OASystemPersistenceBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubOASystem()
+        self.saved = []
+
+    def tearDown(self):
+        self.stub.close()
+
+    def create_persistence(self, **options) -> OASystemPersistence:
+        section = dict(config.get('OASystem'), BaseURL=self.stub.base_url, AddArticleApiPath='/article/add',
+                       BatchAddArticleApiPath='', BatchSize=20, BatchIntervalSeconds=60, BatchQueueMaxSize=100,
+                       MaxRetries=3, Authorization='test-token')
+        section.update(options)
+        # 请求时仍会读取配置，测试结束后才恢复
+        patcher = mock.patch.dict(config.default_config, {'OASystem': section})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        persistence = OASystemPersistence(batch_mode=True)
+        self.addCleanup(persistence.close)
+        return persistence
+
+    def save(self, persistence: OASystemPersistence, title: str):
+        persistence.save_article(title=title, cover='', content='<p>content</p>', category='编程开发',
+                                 brief='brief', urls=[],
+                                 on_saved=lambda success: self.saved.append((title, success)))
+
+    def test_flush_by_batch_size(self):
+        persistence = self.create_persistence(BatchSize=3, BatchAddArticleApiPath='/article/batch-add')
+        for i in range(3):
+            self.save(persistence, f'article-{i}')
+        articles = self.stub.wait_for_articles(3)
+        self.assertEqual([article['title'] for article in articles], ['article-0', 'article-1', 'article-2'])
+        # 攒够一批后一次调用批量接口
+        self.assertEqual([path for path, _ in self.stub.requests], ['/article/batch-add'])
+
+    def test_flush_by_time_window(self):
+        persistence = self.create_persistence(BatchSize=100, BatchIntervalSeconds=0.3)
+        start = time.monotonic()
+        self.save(persistence, 'article-0')
+        self.save(persistence, 'article-1')
+        self.assertEqual(self.stub.articles(), [])
+        articles = self.stub.wait_for_articles(2)
+        self.assertEqual(sorted(article['title'] for article in articles), ['article-0', 'article-1'])
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def test_callback_after_submit(self):
+        persistence = self.create_persistence(BatchSize=100)
+        self.save(persistence, 'article-0')
+        # 文章还在缓冲区中，不应被确认
+        time.sleep(0.1)
+        self.assertEqual(self.saved, [])
+        persistence.close()
+        self.assertEqual(self.saved, [('article-0', True)])
+
+    def test_retry_with_backoff_on_server_error(self):
+        self.stub.status_codes = [500, 503]
+        persistence = self.create_persistence(BatchSize=1)
+        with mock.patch('service.persistence.oa_system_persistence.time.sleep') as sleep:
+            self.save(persistence, 'article-0')
+            persistence.close()
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2])
+        self.assertEqual(len(self.stub.requests), 3)
+        self.assertEqual(self.saved, [('article-0', True)])
+
+    def test_failed_articles_saved_after_retries(self):
+        self.stub.status_codes = [500] * 3
+        persistence = self.create_persistence(BatchSize=1, MaxRetries=2)
+        with tempfile.TemporaryDirectory() as data_dir, \
+                mock.patch('service.persistence.oa_system_persistence.resolve_data_path', return_value=data_dir), \
+                mock.patch('service.persistence.oa_system_persistence.time.sleep'):
+            self.save(persistence, 'article-0')
+            persistence.close()
+            with open(os.path.join(data_dir, 'failed_articles.jsonl'), encoding='utf-8') as failed_file:
+                failed = [json.loads(line) for line in failed_file]
+        self.assertEqual([article['title'] for article in failed], ['article-0'])
+        self.assertEqual(self.saved, [('article-0', False)])
+
+    def test_flush_loop_survives_errors(self):
+        self.stub.status_codes = [500, 500]
+        persistence = self.create_persistence(BatchSize=1, MaxRetries=1)
+        with mock.patch('service.persistence.oa_system_persistence.resolve_data_path',
+                        return_value=os.path.join(tempfile.gettempdir(), 'missing-dir', 'oa-system')), \
+                mock.patch('service.persistence.oa_system_persistence.time.sleep'):
+            # 写入失败文章的文件出错时，该批次仍按失败回调，提交线程继续处理之后的文章
+            self.save(persistence, 'article-0')
+            self.stub.wait_for_articles(2)
+            with mock.patch.object(persistence, '_with_retry', side_effect=ValueError('not json')):
+                self.save(persistence, 'article-1')
+                deadline = time.monotonic() + 5
+                while len(self.saved) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            self.save(persistence, 'article-2')
+            persistence.close()
+        self.assertEqual(self.saved, [('article-0', False), ('article-1', False), ('article-2', True)])
+
+    def test_flush_on_close(self):
+        persistence = self.create_persistence(BatchSize=100)
+        for i in range(5):
+            self.save(persistence, f'article-{i}')
+        persistence.close()
+        self.assertEqual(sorted(article['title'] for article in self.stub.articles()),
+                         [f'article-{i}' for i in range(5)])
+        self.assertEqual(sorted(self.saved), [(f'article-{i}', True) for i in range(5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
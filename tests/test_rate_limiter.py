@@ -0,0 +1,51 @@
+import unittest
+
+from utils.rate_limiter import HostRateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, headers: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HostRateLimiterStreamTest(unittest.TestCase):
+    url = 'https://img.example.com/a.png'
+
+    def setUp(self):
+        self.limiter = HostRateLimiter(max_concurrency=2)
+
+    def in_flight(self) -> int:
+        return self.limiter.stats()['img.example.com']['in_flight']
+
+    def test_slot_held_until_body_read(self):
+        with self.limiter.stream(self.url, FakeResponse) as response:
+            self.assertEqual(response.status_code, 200)
+            # 响应头已返回，但响应体未读完，仍占用并发数
+            self.assertEqual(self.in_flight(), 1)
+        self.assertEqual(self.in_flight(), 0)
+        self.assertEqual(self.limiter.stats()['img.example.com']['succeeded'], 1)
+
+    def test_read_error_counts_as_throttled(self):
+        with self.assertRaises(ConnectionError):
+            with self.limiter.stream(self.url, FakeResponse):
+                raise ConnectionError('connection reset')
+        stats = self.limiter.stats()['img.example.com']
+        self.assertEqual((stats['in_flight'], stats['throttled']), (0, 1))
+
+    def test_abort_releases_with_status_code(self):
+        with self.assertRaises(ValueError):
+            with self.limiter.stream(self.url, FakeResponse):
+                raise ValueError('unsupported content type')
+        stats = self.limiter.stats()['img.example.com']
+        self.assertEqual((stats['in_flight'], stats['succeeded'], stats['throttled']), (0, 1, 0))
+
+    def test_throttled_response(self):
+        with self.limiter.stream(self.url, lambda: FakeResponse(429)):
+            pass
+        stats = self.limiter.stats()['img.example.com']
+        self.assertEqual((stats['in_flight'], stats['throttled']), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
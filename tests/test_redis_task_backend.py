@@ -0,0 +1,128 @@
+import time
+import unittest
+
+from service.scheduler.redis_task_backend import RedisTaskBackend
+from service.scheduler.url_base_scheduler import Task
+
+try:
+    import fakeredis
+except ImportError:  # 测试需要 fakeredis[lua]，未安装时跳过
+    fakeredis = None
+
+
+@unittest.skipIf(fakeredis is None, "需要安装 fakeredis[lua]")
+class RedisTaskBackendTest(unittest.TestCase):
+    def setUp(self):
+        # 同一个 FakeServer 上的多个客户端相当于连接同一个 Redis 的多个节点
+        self.server = fakeredis.FakeServer()
+
+    def create_backend(self, node_id: str, **options) -> RedisTaskBackend:
+        settings = dict(prefix='test', capacity=10000, poll_interval=0.05, drain_grace=0)
+        settings.update(options)
+        backend = RedisTaskBackend(client=fakeredis.FakeRedis(server=self.server), node_id=node_id, **settings)
+        backend.register_task_type('CSDN-URL')
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_put_get_ack(self):
+        backend = self.create_backend('node-1')
+        task = Task('https://blog.csdn.net/author/article/details/1', 'CSDN-URL', payload={'html': '<p>'}, priority=3)
+        self.assertTrue(backend.put('CSDN-URL', task))
+        self.assertEqual(backend.queue_sizes(), {'CSDN-URL': 1})
+
+        received = backend.get('CSDN-URL')
+        self.assertEqual(received.url, task.url)
+        self.assertEqual(received.payload, {'html': '<p>'})
+        self.assertEqual(received.priority, 3)
+        self.assertEqual(backend.queue_sizes(), {'CSDN-URL': 0})
+        # 确认前任务在执行中集合中，全局任务未处理完
+        self.assertEqual(backend.client.zcard(backend._key('inflight', 'CSDN-URL')), 1)
+        self.assertFalse(backend.is_drained(producers_running=0))
+
+        backend.ack('CSDN-URL', received)
+        self.assertEqual(backend.client.zcard(backend._key('inflight', 'CSDN-URL')), 0)
+        self.assertTrue(backend.is_drained(producers_running=0))
+
+    def test_bounded_queue(self):
+        backend = self.create_backend('node-1', queue_maxsize=1)
+        self.assertTrue(backend.put('CSDN-URL', Task('https://a.com/1', 'CSDN-URL')))
+        self.assertFalse(backend.put('CSDN-URL', Task('https://a.com/2', 'CSDN-URL'), timeout=0.1))
+
+    def test_requeue_after_visibility_timeout(self):
+        backend = self.create_backend('node-1', visibility_timeout=0.2)
+        backend.put('CSDN-URL', Task('https://a.com/1', 'CSDN-URL'))
+        first = backend.get('CSDN-URL')
+        # 未超时的任务不会被放回队列
+        backend.release_delayed()
+        self.assertEqual(backend.queue_sizes(), {'CSDN-URL': 0})
+
+        time.sleep(0.3)
+        backend.release_delayed()
+        self.assertEqual(backend.queue_sizes(), {'CSDN-URL': 1})
+        second = backend.get('CSDN-URL')
+        self.assertEqual(second.url, first.url)
+        backend.ack('CSDN-URL', second)
+        self.assertEqual(backend.client.zcard(backend._key('inflight', 'CSDN-URL')), 0)
+
+    def test_delayed_retry(self):
+        backend = self.create_backend('node-1')
+        backend.put_delayed('CSDN-URL', Task('https://a.com/1', 'CSDN-URL'), delay=0.2)
+        backend.release_delayed()
+        self.assertEqual(backend.queue_sizes(), {'CSDN-URL': 0})
+        self.assertFalse(backend.is_drained(producers_running=0))
+        time.sleep(0.3)
+        backend.release_delayed()
+        self.assertEqual(backend.get('CSDN-URL').url, 'https://a.com/1')
+
+    def test_dedup_shared_between_nodes(self):
+        node_1 = self.create_backend('node-1')
+        node_2 = self.create_backend('node-2')
+        key = 'https://blog.csdn.net/author/article/details/1'
+
+        self.assertTrue(node_1.claim(key))
+        # 执行中的任务不能被另一个节点认领
+        self.assertFalse(node_2.claim(key))
+
+        # 失败的任务释放后可以被重新认领
+        node_1.complete(key, success=False)
+        self.assertFalse(node_2.is_visited(key))
+        self.assertTrue(node_2.claim(key))
+
+        node_2.complete(key, success=True)
+        self.assertTrue(node_1.is_visited(key))
+        self.assertFalse(node_1.claim(key))
+        self.assertFalse(node_2.claim(key))
+
+        # 放弃的任务不记录为已完成
+        other = 'https://blog.csdn.net/author/article/details/2'
+        self.assertTrue(node_2.claim(other))
+        node_2.release(other)
+        self.assertTrue(node_1.claim(other))
+
+    def test_tasks_shared_between_nodes(self):
+        node_1 = self.create_backend('node-1')
+        node_2 = self.create_backend('node-2')
+        for i in range(4):
+            node_1.put('CSDN-URL', Task(f'https://a.com/{i}', 'CSDN-URL'))
+        received = [node_1.get('CSDN-URL'), node_2.get('CSDN-URL'), node_2.get('CSDN-URL'), node_1.get('CSDN-URL')]
+        self.assertEqual(sorted(task.url for task in received), [f'https://a.com/{i}' for i in range(4)])
+        for task in received:
+            node_1.ack('CSDN-URL', task)
+
+    def test_drained_waits_for_producers_on_all_nodes(self):
+        node_1 = self.create_backend('node-1')
+        node_2 = self.create_backend('node-2')
+        # 节点 1 的生产者仍在运行时，节点 2 不能停止
+        self.assertFalse(node_1.is_drained(producers_running=1))
+        self.assertFalse(node_2.is_drained(producers_running=0))
+        self.assertTrue(node_1.is_drained(producers_running=0))
+        self.assertTrue(node_2.is_drained(producers_running=0))
+
+    def test_stop_consumers(self):
+        backend = self.create_backend('node-1')
+        backend.stop_consumers('CSDN-URL', 1)
+        self.assertIsNone(backend.get('CSDN-URL'))
+
+
+if __name__ == '__main__':
+    unittest.main()
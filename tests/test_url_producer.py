@@ -0,0 +1,52 @@
+import unittest
+
+from service.scheduler.url_base_scheduler import URLScheduler, URLProducer, URLConsumer
+
+
+class ListURLProducer(URLProducer):
+    def __init__(self, scheduler: URLScheduler, urls: list):
+        self.urls = iter(urls)
+        super().__init__(scheduler=scheduler, task_type='TEST-URL')
+
+    def _generate_url(self):
+        url = next(self.urls, None)
+        if isinstance(url, Exception):
+            raise url
+        return url
+
+
+class RecordingConsumer(URLConsumer):
+    def __init__(self, scheduler: URLScheduler):
+        super().__init__(scheduler=scheduler, task_type='TEST-URL')
+        self.urls = []
+
+    def _process_task(self, task):
+        self.urls.append(task.url)
+        return True
+
+
+class URLProducerTest(unittest.TestCase):
+    def run_crawl(self, urls: list) -> list:
+        scheduler = URLScheduler()
+        producer = ListURLProducer(scheduler, urls)
+        consumer = RecordingConsumer(scheduler)
+        scheduler.start()
+        producer.start()
+        consumer.start()
+        scheduler.join(timeout=10)
+        consumer.join(timeout=10)
+        self.assertFalse(scheduler.is_alive())
+        self.assertFalse(consumer.is_alive())
+        return consumer.urls
+
+    def test_skip_invalid_url(self):
+        urls = self.run_crawl(['https://a.com/1', 'http://[::1/a', 'https://a.com/2'])
+        self.assertEqual(urls, ['https://a.com/1', 'https://a.com/2'])
+
+    def test_scheduler_stops_when_producer_raises(self):
+        urls = self.run_crawl(['https://a.com/1', RuntimeError('读取 csdn_urls.txt.zst 需要安装 zstandard')])
+        self.assertEqual(urls, ['https://a.com/1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
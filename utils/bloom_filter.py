@@ -0,0 +1,111 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+
+from utils.logger import logger
+
+
+def bloom_size(capacity: int, error_rate: float) -> tuple:
+    """
+    根据容量和误判率计算布隆过滤器的参数
+    :return: 位数组长度和哈希函数个数
+    """
+    bit_size = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+    hash_count = max(int(round(bit_size / capacity * math.log(2))), 1)
+    return bit_size, hash_count
+
+
+def bloom_positions(key: str, bit_size: int, hash_count: int):
+    """
+    计算元素在位数组中的位置（双重哈希），其他布隆过滤器实现（如 Redis 位图）使用相同的算法
+    :return: hash_count 个位置的迭代器
+    """
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    for i in range(hash_count):
+        yield (h1 + i * h2) % bit_size
+
+
+class BloomFilter:
+    """
+    布隆过滤器，内存占用只与容量和误判率有关，与元素长度无关
+    指定 file_path 时通过 mmap 映射到磁盘文件，重启后可继续使用之前的记录
+    """
+    MAGIC = b'BLOOMv1\0'
+    HEADER = struct.Struct('<8sQQ')  # magic, 位数组长度 m, 哈希函数个数 k
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, file_path: str = None):
+        """
+        :param capacity: 预计元素数量，超过后误判率会上升
+        :param error_rate: 期望的误判率
+        :param file_path: 持久化文件路径，不提供则只保存在内存中
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_size, self.hash_count = bloom_size(capacity, error_rate)
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self._file = None
+        byte_size = (self.bit_size + 7) // 8
+        if file_path:
+            self._open_file(byte_size)
+            self.bits = mmap.mmap(self._file.fileno(), self.HEADER.size + byte_size)
+            self.offset = self.HEADER.size
+        else:
+            self.bits = bytearray(byte_size)
+            self.offset = 0
+
+    def _open_file(self, byte_size: int):
+        header = self.HEADER.pack(self.MAGIC, self.bit_size, self.hash_count)
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'rb') as f:
+                existing_header = f.read(self.HEADER.size)
+            if existing_header == header:
+                self._file = open(self.file_path, 'r+b')
+                logger.info(f"已加载布隆过滤器文件: {self.file_path}")
+                return
+            logger.warning(f"布隆过滤器文件 {self.file_path} 的参数与当前配置不一致，将重新创建")
+        self._file = open(self.file_path, 'w+b')
+        self._file.write(header)
+        self._file.truncate(self.HEADER.size + byte_size)
+        self._file.flush()
+
+    def _positions(self, key: str):
+        return bloom_positions(key, self.bit_size, self.hash_count)
+
+    def add(self, key: str) -> bool:
+        """
+        添加元素
+        :return: 元素此前不存在时返回 True
+        """
+        added = False
+        with self.lock:
+            for position in self._positions(key):
+                index = self.offset + (position >> 3)
+                mask = 1 << (position & 7)
+                if not self.bits[index] & mask:
+                    self.bits[index] |= mask
+                    added = True
+        return added
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return all(self.bits[self.offset + (position >> 3)] & (1 << (position & 7))
+                       for position in self._positions(key))
+
+    def flush(self):
+        """将修改写回磁盘文件"""
+        if self._file:
+            with self.lock:
+                self.bits.flush()
+
+    def close(self):
+        if self._file:
+            self.flush()
+            self.bits.close()
+            self._file.close()
+            self._file = None
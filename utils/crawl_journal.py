@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+
+from utils.logger import logger
+
+
+class CrawlJournal:
+    """
+    爬取日志，以追加写的方式记录任务的状态变化，进程异常退出后可以从中断的位置继续：
+    - E：任务已入队，同时记录 URL 文件当前的字节偏移量
+    - S / F：任务成功 / 失败
+    - M：运行信息，如本地持久化服务的工作目录
+    - O：压缩日志时保存的 URL 文件偏移量
+    写入先进入内存缓冲区，由后台线程按时间间隔或条数批量写入并 fsync，
+    异常退出时最多丢失最近一个批次，丢失的记录在恢复时会重新读取 URL 文件中对应的行，任务不会丢失。
+    打开、关闭时以及运行中记录数或文件大小超过阈值时压缩日志，只保留偏移量、运行信息、未完成和失败的任务。
+    运行信息中保存 URL 文件的标识，URL 文件被替换或修改后偏移量失效，从头读取
+    """
+
+    def __init__(self, file_path: str, sync_interval: float = 1.0, sync_batch_size: int = 1000,
+                 compact_records: int = 100000, compact_max_bytes: int = 64 * 1024 * 1024, source: dict = None):
+        """
+        :param file_path: 日志文件路径
+        :param sync_interval: 批量写入并 fsync 的间隔（秒）
+        :param sync_batch_size: 缓冲区中的记录数达到该值时立即写入
+        :param compact_records: 上次压缩后写入的记录数达到该值时压缩日志，为 0 时不按记录数压缩
+        :param compact_max_bytes: 日志文件超过该大小时压缩日志，为 0 时不按大小压缩
+        :param source: URL 文件的标识，如路径、大小和修改时间，与日志中记录的不一致时偏移量重置为 0
+        """
+        self.file_path = file_path
+        self.sync_interval = sync_interval
+        self.sync_batch_size = sync_batch_size
+        self.compact_records = compact_records
+        self.compact_max_bytes = compact_max_bytes
+        # 当前状态，加载时为上次运行结束时的状态，运行中随写入的记录更新，用于压缩日志
+        self.offset = 0
+        self.meta = {}
+        self.in_flight = {}
+        self.failed = {}
+        self._load()
+        if source is not None:
+            self._check_source(source)
+        self._compact(self._snapshot())
+        self.buffer = []
+        # 上次压缩后写入的记录数
+        self.records = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.file = open(self.file_path, 'a', encoding='utf-8')
+        self.sync_thread = threading.Thread(target=self._sync_loop, name='CrawlJournal-Sync', daemon=True)
+        self.sync_thread.start()
+        if self.in_flight or self.offset:
+            logger.info(f"已加载爬取日志: {file_path}，URL 文件偏移量 {self.offset}，"
+                        f"未完成 {len(self.in_flight)} 个，失败 {len(self.failed)} 个")
+
+    def _apply(self, fields: list):
+        """将一条记录应用到当前状态"""
+        op = fields[0]
+        if op == 'E' and len(fields) == 4:
+            key, url = fields[1], fields[2]
+            self.in_flight[key] = url
+            self.failed.pop(key, None)
+            if fields[3]:
+                self.offset = max(self.offset, int(fields[3]))
+        elif op in ('S', 'F') and len(fields) == 2:
+            url = self.in_flight.pop(fields[1], None)
+            if op == 'F' and url:
+                self.failed[fields[1]] = url
+        elif op == 'O' and len(fields) == 2:
+            self.offset = max(self.offset, int(fields[1]))
+        elif op == 'M' and len(fields) == 2:
+            self.meta.update(json.loads(fields[1]))
+
+    def _load(self):
+        """重放日志，恢复上次运行的状态，忽略异常退出时写了一半的最后一行"""
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    break
+                self._apply(line.rstrip('\n').split('\t'))
+
+    def _check_source(self, source: dict):
+        """
+        URL 文件与上次运行时不同时，记录的偏移量可能落在某一行的中间或跳过新的内容，重置为 0。
+        已爬取的 URL 由去重过滤，未完成和失败的任务仍然保留
+        :param source: 本次运行的 URL 文件标识
+        """
+        recorded = self.meta.get('source')
+        if recorded is not None and recorded != source and self.offset:
+            logger.warning(f"URL 文件已变化（上次 {recorded}，本次 {source}），"
+                           f"丢弃偏移量 {self.offset}，从头读取 URL 文件")
+            self.offset = 0
+        self.meta['source'] = source
+
+    def _snapshot(self) -> tuple:
+        return dict(self.meta), self.offset, dict(self.failed), dict(self.in_flight)
+
+    def _compact(self, snapshot: tuple):
+        """将状态快照写入新文件后替换旧日志，避免日志无限增长"""
+        meta, offset, failed, in_flight = snapshot
+        tmp_path = f'{self.file_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(f"M\t{json.dumps(meta, ensure_ascii=False)}\n")
+            file.write(f"O\t{offset}\n")
+            for key, url in failed.items():
+                file.write(f"E\t{key}\t{url}\t\nF\t{key}\n")
+            for key, url in in_flight.items():
+                file.write(f"E\t{key}\t{url}\t\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.file_path)
+
+    def _append(self, *fields):
+        with self.condition:
+            if self.closed:
+                return
+            self._apply(list(fields))
+            self.buffer.append('\t'.join(fields) + '\n')
+            self.records += 1
+            if len(self.buffer) >= self.sync_batch_size:
+                self.condition.notify()
+
+    def record_enqueued(self, key: str, url: str, offset: int = None):
+        """
+        任务入队后调用
+        :param key: 任务的唯一标识
+        :param url: 任务的 URL
+        :param offset: 读取该 URL 后 URL 文件的字节偏移量，恢复时从最大的偏移量继续读取
+        """
+        self._append('E', key, url, '' if offset is None else str(offset))
+
+    def record_completed(self, key: str, success: bool):
+        """
+        任务成功或最终失败后调用
+        :param key: 任务的唯一标识
+        :param success: 是否成功
+        """
+        self._append('S' if success else 'F', key)
+
+    def set_meta(self, **meta):
+        """记录运行信息，恢复时通过 meta 读取"""
+        self._append('M', json.dumps(meta, ensure_ascii=False))
+
+    def pending_urls(self, include_failed: bool = False) -> list:
+        """
+        上次运行中已入队但未完成的 URL，恢复时需要重新入队，应在开始记录本次运行的任务之前调用
+        :param include_failed: 是否同时返回上次运行中失败的 URL
+        """
+        urls = list(self.in_flight.values())
+        if include_failed:
+            urls.extend(self.failed.values())
+        return urls
+
+    def _sync(self):
+        with self.condition:
+            lines, self.buffer = self.buffer, []
+        if not lines:
+            return
+        self.file.write(''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _need_compact(self) -> bool:
+        if self.compact_records and self.records >= self.compact_records:
+            return True
+        return bool(self.compact_max_bytes) and os.fstat(self.file.fileno()).st_size >= self.compact_max_bytes
+
+    def _compact_running(self):
+        """
+        运行中压缩日志，只在后台写入线程中调用。缓冲区中的记录已应用到状态快照，直接丢弃
+        """
+        with self.condition:
+            snapshot = self._snapshot()
+            self.buffer = []
+            self.records = 0
+        self.file.close()
+        self._compact(snapshot)
+        self.file = open(self.file_path, 'a', encoding='utf-8')
+        logger.debug(f"已压缩爬取日志: {self.file_path}，未完成 {len(snapshot[3])} 个，失败 {len(snapshot[2])} 个")
+
+    def _sync_loop(self):
+        while True:
+            with self.condition:
+                if self.closed:
+                    return
+                self.condition.wait_for(lambda: self.closed or len(self.buffer) >= self.sync_batch_size,
+                                        timeout=self.sync_interval)
+            self._sync()
+            if self._need_compact():
+                self._compact_running()
+
+    def close(self):
+        """写入剩余记录并压缩日志"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.sync_thread.join()
+        self.file.close()
+        # 关闭后不再接受新的记录，当前状态即为全部记录重放后的状态
+        self._compact(self._snapshot())
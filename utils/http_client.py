@@ -0,0 +1,150 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.config import config
+from utils.logger import logger
+from utils.metrics import metrics
+
+HTTP_REQUESTS = metrics.counter('crawler_http_requests_total', 'HTTP 请求数，按主机和状态码类别（2xx、4xx、error 等）统计',
+                                ['host', 'status'])
+HTTP_REQUEST_SECONDS = metrics.histogram('crawler_http_request_seconds', 'HTTP 请求耗时（秒），流式下载只统计到收到响应头',
+                                         ['host'])
+HTTP_RECEIVED_BYTES = metrics.counter('crawler_http_received_bytes_total', '收到的 HTTP 响应体字节数', ['host'])
+
+
+class HttpClient:
+    """
+    单例模式 HTTP 客户端，所有下载器和持久化服务共享同一个连接池：
+    - 使用 keep-alive 复用 TCP/TLS 连接，避免每个请求重新握手
+    - 可按域名配置连接池大小（Http.HostPoolMaxSize），其余域名使用默认大小（Http.PoolMaxSize）
+    - 连接失败和 502/503/504 时由 urllib3 自动重试，POST 请求只在连接建立失败时重试
+    - status_retries=False 的请求使用另一组连接池，urllib3 只重试连接建立失败，不重试 429/5xx，也不按 Retry-After 等待，
+      供自己按 RetryPolicy 延迟重试的下载器使用，避免 urllib3 在工作线程中原地等待，且重试次数不计入重试预算
+    requests.Session 的连接池由 urllib3 管理，可在多线程间共享
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._lock:
+                if not cls._instance:
+                    cls._instance = super(HttpClient, cls).__new__(cls)
+                    cls._instance.__initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self.__initialized:
+            return
+        self.pool_connections = config.get('Http', 'PoolConnections') or 16
+        self.pool_maxsize = config.get('Http', 'PoolMaxSize') or 16
+        self.max_retries = config.get('Http', 'MaxRetries') or 0
+        self.backoff_factor = config.get('Http', 'BackoffFactor') or 0
+        self.session = self._create_session(status_retries=True)
+        self.connect_retry_session = self._create_session(status_retries=False)
+        self.__initialized = True
+
+    def _create_session(self, status_retries: bool) -> requests.Session:
+        session = requests.Session()
+        default_adapter = self._create_adapter(self.pool_maxsize, status_retries)
+        session.mount('http://', default_adapter)
+        session.mount('https://', default_adapter)
+        for host, pool_maxsize in (config.get('Http', 'HostPoolMaxSize') or {}).items():
+            host_adapter = self._create_adapter(pool_maxsize, status_retries)
+            session.mount(f'http://{host}', host_adapter)
+            session.mount(f'https://{host}', host_adapter)
+        return session
+
+    def _create_adapter(self, pool_maxsize: int, status_retries: bool = True) -> HTTPAdapter:
+        """
+        :param pool_maxsize: 连接池大小
+        :param status_retries: 是否重试 502/503/504 并遵循 Retry-After，为 False 时只重试连接建立失败
+        """
+        if status_retries:
+            retry = Retry(
+                total=self.max_retries,
+                backoff_factor=self.backoff_factor,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({'GET', 'HEAD'}),
+                raise_on_status=False,
+                respect_retry_after_header=True,
+            )
+        else:
+            retry = Retry(
+                total=self.max_retries,
+                read=0,
+                status=0,
+                backoff_factor=self.backoff_factor,
+                status_forcelist=(),
+                allowed_methods=frozenset({'GET', 'HEAD'}),
+                raise_on_status=False,
+                respect_retry_after_header=False,
+            )
+        return HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method: str, url: str, status_retries: bool = True, **kwargs) -> requests.Response:
+        """
+        发出请求并记录请求数、耗时和响应字节数，流式下载的响应字节数由调用方记录
+        :param status_retries: 是否由 urllib3 重试 502/503/504 并按 Retry-After 等待，
+                               自己处理重试和限流的调用方应为 False，每个 429/5xx 响应都会直接返回
+        """
+        host = urlsplit(url).hostname or ''
+        session = self.session if status_retries else self.connect_retry_session
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except Exception:
+            HTTP_REQUESTS.inc(host=host, status='error')
+            raise
+        finally:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, host=host)
+        HTTP_REQUESTS.inc(host=host, status=f'{response.status_code // 100}xx')
+        if not kwargs.get('stream'):
+            HTTP_RECEIVED_BYTES.inc(len(response.content), host=host)
+        return response
+
+    def stats(self) -> dict:
+        """
+        获取各个主机连接池的统计信息
+        :return: {主机: {requests: 请求数, new_connections: 新建连接数, reused: 复用连接的请求数, idle: 空闲连接数}}
+        """
+        result = {}
+        adapters = [*self.session.adapters.values(), *self.connect_retry_session.adapters.values()]
+        for adapter in {id(adapter): adapter for adapter in adapters}.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                try:
+                    pool = pools[key]
+                except KeyError:
+                    continue
+                # 两组连接池中同一主机的统计合并
+                stats = result.setdefault(f'{pool.scheme}://{pool.host}:{pool.port}',
+                                          {'requests': 0, 'new_connections': 0, 'reused': 0, 'idle': 0})
+                stats['requests'] += pool.num_requests
+                stats['new_connections'] += pool.num_connections
+                stats['reused'] += max(pool.num_requests - pool.num_connections, 0)
+                # urllib3 用 None 占位未建立的连接
+                stats['idle'] += sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+        return result
+
+    def log_stats(self):
+        """输出连接池命中情况"""
+        for host, stats in self.stats().items():
+            hit_rate = stats['reused'] / stats['requests'] if stats['requests'] else 0
+            logger.info(f"连接池 {host}: 请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 个，"
+                        f"复用率 {hit_rate:.1%}，空闲连接 {stats['idle']} 个")
+
+
+# 单例实例
+http_client = HttpClient()
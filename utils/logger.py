@@ -1,7 +1,12 @@
+import atexit
 import logging
+import multiprocessing
 import os
-from datetime import datetime
+import queue
 import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - [%(filename)s:%(lineno)04d] - %(levelname)8s - %(message)s'
 
 
 # 定义日志颜色类
@@ -21,18 +26,44 @@ class LogColorFormatter(logging.Formatter):
         return f"{log_color}{log_message}{self.RESET}"
 
 
+class LazyQueueHandler(QueueHandler):
+    """
+    只把日志记录放入队列，消息的 % 格式化和输出都留给后台线程，调用日志的工作线程不再做任何格式化和 IO。
+    默认的 QueueHandler.prepare 会在调用线程中格式化消息，这里只提前格式化异常堆栈，以释放其引用的栈帧
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
 class Logger:
     _instance = None
     _lock = threading.Lock()  # 用于确保线程安全
     _logger = None
     _initialized = False  # 确保只初始化一次
+    _listener = None
+    _handlers = []
 
-    def __new__(cls, log_file: str = None, console_level: int = logging.INFO, file_level: int = logging.DEBUG):
+    def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(Logger, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, log_file: str = None, console_level: int = logging.INFO, file_level: int = logging.DEBUG):
+    def __init__(self, log_file: str = None, console_level: int = logging.INFO, file_level: int = logging.DEBUG,
+                 async_mode: bool = True, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 10,
+                 when: str = None):
+        """
+        :param log_file: 日志文件路径，不提供则使用项目 log 目录下的 crawler.log
+        :param console_level: 控制台输出的日志级别
+        :param file_level: 文件输出的日志级别
+        :param async_mode: 是否异步输出，工作线程只把日志记录放入队列，由后台线程格式化并写入控制台和文件
+        :param max_bytes: 日志文件达到该大小时轮转，为 0 时不按大小轮转
+        :param backup_count: 保留的历史日志文件数量
+        :param when: 按时间轮转的周期，如 'midnight'、'H'，取值同 TimedRotatingFileHandler，提供时不再按大小轮转
+        """
         if Logger._initialized:  # 如果已经初始化过，则跳过
             return
 
@@ -41,35 +72,93 @@ class Logger:
                 return
 
             Logger._logger = logging.getLogger("UnifiedLogger")
-            Logger._logger.setLevel(logging.DEBUG)  # 设置基础日志级别
-
-            # 控制台输出
-            if not Logger._logger.handlers:
-                console_handler = logging.StreamHandler()
-                console_handler.setLevel(console_level)
-                console_format = LogColorFormatter(
-                    '%(asctime)s - [%(filename)s:%(lineno)04d] - %(levelname)8s - %(message)s'
-                )
-                console_handler.setFormatter(console_format)
-                Logger._logger.addHandler(console_handler)
-
-                # 文件输出
-                if log_file is None:
-                    current_dir = os.path.dirname(os.path.abspath(__file__))
-                    log_dir = os.path.join(current_dir, '..', 'log')
-                    os.makedirs(log_dir, exist_ok=True)
-                    log_file = os.path.join(log_dir, f"log_{datetime.now().strftime('%Y%m%d%H%M%S')}.log")
-
-                file_handler = logging.FileHandler(log_file, encoding='utf-8')
-                file_handler.setLevel(file_level)
-                file_format = logging.Formatter(
-                    '%(asctime)s - [%(filename)s:%(lineno)04d] - %(levelname)8s - %(message)s'
-                )
-                file_handler.setFormatter(file_format)
-                Logger._logger.addHandler(file_handler)
-
+            Logger._configure(log_file, console_level, file_level, async_mode, max_bytes, backup_count, when)
+            # 进程退出时等待后台线程写完队列中剩余的日志
+            atexit.register(Logger.shutdown)
             Logger._initialized = True
 
+    @staticmethod
+    def _default_log_file() -> str:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        log_dir = os.path.join(current_dir, '..', 'log')
+        os.makedirs(log_dir, exist_ok=True)
+        # 多个进程轮转同一个文件会互相覆盖，解析子进程各自写入以进程名区分的文件
+        process_name = multiprocessing.current_process().name
+        file_name = 'crawler.log' if process_name == 'MainProcess' else f'crawler.{process_name}.log'
+        return os.path.join(log_dir, file_name)
+
+    @classmethod
+    def _configure(cls, log_file: str, console_level: int, file_level: int, async_mode: bool, max_bytes: int,
+                   backup_count: int, when: str):
+        """创建控制台和文件输出，调用方需持有锁"""
+        # 控制台输出
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(LogColorFormatter(LOG_FORMAT))
+
+        # 文件输出，按时间或大小轮转
+        log_file = log_file or cls._default_log_file()
+        if when:
+            file_handler = TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count,
+                                                    encoding='utf-8')
+        else:
+            file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                               encoding='utf-8')
+        file_handler.setLevel(file_level)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        handlers = [console_handler, file_handler]
+        if async_mode:
+            log_queue = queue.SimpleQueue()
+            cls._listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            cls._listener.start()
+            cls._logger.addHandler(LazyQueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                cls._logger.addHandler(handler)
+        cls._handlers = handlers
+        # 低于所有输出级别的日志在调用处直接丢弃，不创建日志记录
+        cls._logger.setLevel(min(console_level, file_level))
+
+    @classmethod
+    def reconfigure(cls, log_file: str = None, console_level: int = logging.INFO, file_level: int = logging.DEBUG,
+                    async_mode: bool = True, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 10,
+                    when: str = None):
+        """
+        按配置重新创建日志输出，参数同 __init__。配置模块依赖日志模块，因此日志先按默认参数初始化，
+        加载配置后再调用本方法，之前的日志会先写完
+        """
+        cls.get_logger()
+        with cls._lock:
+            cls._close_handlers()
+            cls._configure(log_file, console_level, file_level, async_mode, max_bytes, backup_count, when)
+
+    @classmethod
+    def _close_handlers(cls):
+        """停止后台线程并关闭所有输出，调用方需持有锁"""
+        if cls._listener:
+            # stop 会先输出队列中剩余的日志
+            cls._listener.stop()
+            cls._listener = None
+        for handler in list(cls._logger.handlers):
+            cls._logger.removeHandler(handler)
+        for handler in cls._handlers:
+            handler.close()
+        cls._handlers = []
+
+    @classmethod
+    def shutdown(cls):
+        """写完队列中剩余的日志，之后的日志在当前线程同步输出"""
+        with cls._lock:
+            if cls._listener is None:
+                return
+            cls._listener.stop()
+            cls._listener = None
+            for handler in list(cls._logger.handlers):
+                cls._logger.removeHandler(handler)
+            for handler in cls._handlers:
+                cls._logger.addHandler(handler)
+
     @classmethod
     def get_logger(cls) -> logging.Logger:
         if cls._logger is None:
@@ -87,3 +176,4 @@ if __name__ == '__main__':
     logger.warning("This is a warning message.")
     logger.error("This is an error message.")
     logger.critical("This is a critical message.")
+    logger.info("Lazy formatting: %s of %d", 'message', 1)
@@ -0,0 +1,360 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+from utils.logger import logger
+
+# 默认的耗时直方图分桶（秒），覆盖从毫秒级的解析到数十秒的下载
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类，按标签值分别统计，线程安全"""
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _label_values(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self) -> List[tuple]:
+        """
+        :return: [(后缀, 标签值, 额外标签, 值)]
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for suffix, values, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """只增不减的计数器，名称应以 _total 结尾"""
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def totals(self) -> Dict[tuple, float]:
+        with self.lock:
+            return dict(self.values)
+
+    def samples(self) -> List[tuple]:
+        return [('', key, '', value) for key, value in sorted(self.totals().items())]
+
+
+class Gauge(_Metric):
+    """
+    可增可减的数值，也可以提供 function 在输出时实时读取，
+    function 返回数值（无标签时）或 {标签值元组: 数值}
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function: Callable = None):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._label_values(labels)] = value
+
+    def set_function(self, function: Callable):
+        """设置实时读取数值的函数，覆盖之前设置的函数和数值"""
+        with self.lock:
+            self.function = function
+            self.values = {}
+
+    def current(self) -> Dict[tuple, float]:
+        with self.lock:
+            function, values = self.function, dict(self.values)
+        if function is None:
+            return values
+        try:
+            result = function()
+        except Exception as e:
+            logger.error(f"读取指标 {self.name} 时发生错误: {e}")
+            return {}
+        return result if isinstance(result, dict) else {(): result}
+
+    def samples(self) -> List[tuple]:
+        return [('', key, '', value) for key, value in sorted(self.current().items())]
+
+
+class _HistogramValue:
+    def __init__(self, bucket_count: int):
+        self.buckets = [0] * bucket_count
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    """分桶直方图，用于统计耗时分布，可以估算分位数"""
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[tuple, _HistogramValue] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                histogram = self.values[key] = _HistogramValue(len(self.buckets) + 1)
+            histogram.buckets[index] += 1
+            histogram.count += 1
+            histogram.sum += value
+
+    @contextmanager
+    def time(self, **labels):
+        """统计 with 语句块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[tuple, tuple]:
+        """
+        :return: {标签值: (各桶计数（非累积）, 总数, 总和)}
+        """
+        with self.lock:
+            return {key: (list(value.buckets), value.count, value.sum) for key, value in self.values.items()}
+
+    def quantile(self, q: float, buckets: list, count: int) -> float:
+        """
+        根据分桶计数估算分位数，桶内按线性分布插值
+        :param q: 分位数，如 0.95
+        :param buckets: snapshot 中的各桶计数
+        :param count: 总数
+        """
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(buckets):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index >= len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def samples(self) -> List[tuple]:
+        samples = []
+        for key, (buckets, count, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), buckets):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append(('_count', key, '', count))
+            samples.append(('_sum', key, '', total))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    单例模式指标注册表，各模块通过 counter / gauge / histogram 获取同名指标（不存在时创建），
+    通过 MetricsServer 以 Prometheus 文本格式输出，通过 MetricsReporter 定期输出汇总日志
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            with cls._lock:
+                if not cls._instance:
+                    cls._instance = super(MetricsRegistry, cls).__new__(cls)
+                    cls._instance.__initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self.__initialized:
+            return
+        self.metrics: Dict[str, _Metric] = {}
+        self.lock = threading.Lock()
+        self.__initialized = True
+
+    def _get_or_create(self, metric_class, name: str, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=(), function: Callable = None) -> Gauge:
+        gauge = self._get_or_create(Gauge, name, documentation, labelnames)
+        if function is not None:
+            gauge.set_function(function)
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> _Metric or None:
+        with self.lock:
+            return self.metrics.get(name)
+
+    def render(self) -> str:
+        """所有指标的 Prometheus 文本格式"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+class MetricsServer:
+    """在后台线程中提供 Prometheus 格式的 /metrics 接口"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9464):
+        """
+        :param registry: 指标注册表
+        :param host: 监听地址，默认只允许本机访问
+        :param port: 监听端口，为 0 时由系统分配，实际端口可通过 port 获取
+        """
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"指标接口已启动: http://{self.server.server_address[0]}:{self.port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsReporter(threading.Thread):
+    """
+    定期输出一行指标汇总日志：计数器的总数和区间速率，直方图的次数、平均值和 p95，仪表的当前值
+    """
+
+    def __init__(self, registry: MetricsRegistry, interval: float, names: list):
+        """
+        :param registry: 指标注册表
+        :param interval: 输出间隔（秒）
+        :param names: 需要汇总的指标名称，按顺序输出，未注册的指标跳过
+        """
+        super().__init__(name='MetricsReporter', daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self.names = names
+        self.stopped = threading.Event()
+        self.previous_totals = {}
+        self.previous_at = time.monotonic()
+
+    @staticmethod
+    def _label_text(key: tuple) -> str:
+        return '/'.join(str(value) for value in key)
+
+    def summary(self) -> str:
+        """生成汇总文本，计数器速率为距离上次汇总的平均值"""
+        now = time.monotonic()
+        elapsed = max(now - self.previous_at, 1e-6)
+        self.previous_at = now
+        parts = []
+        for name in self.names:
+            metric = self.registry.get(name)
+            if metric is None:
+                continue
+            items = []
+            if isinstance(metric, Counter):
+                for key, total in sorted(metric.totals().items()):
+                    rate = (total - self.previous_totals.get((name, key), 0)) / elapsed
+                    self.previous_totals[(name, key)] = total
+                    label = self._label_text(key)
+                    items.append(f"{label + '=' if label else ''}{total:g} ({rate:.2f}/s)")
+            elif isinstance(metric, Histogram):
+                for key, (buckets, count, total) in sorted(metric.snapshot().items()):
+                    label = self._label_text(key)
+                    items.append(f"{label + ' ' if label else ''}{count} 次 平均 {total / max(count, 1) * 1000:.0f}ms "
+                                 f"p95 {metric.quantile(0.95, buckets, count) * 1000:.0f}ms")
+            else:
+                for key, value in sorted(metric.current().items()):
+                    label = self._label_text(key)
+                    items.append(f"{label + '=' if label else ''}{value:g}")
+            if items:
+                parts.append(f"{name}[{', '.join(items)}]")
+        return '; '.join(parts)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.log_summary()
+
+    def log_summary(self):
+        summary = self.summary()
+        if summary:
+            logger.info(f"指标汇总: {summary}")
+
+    def stop(self):
+        """停止定期输出，并输出最后一次汇总"""
+        self.stopped.set()
+        self.log_summary()
+
+
+# 单例实例
+metrics = MetricsRegistry()
+
+# 多个模块共用的指标
+STEP_SECONDS = metrics.histogram('crawler_step_seconds', '单篇文章各处理步骤的耗时（秒）', ['step'])
+ARTICLES = metrics.counter('crawler_articles_total', '已保存的文章数')
+IMAGES = metrics.counter('crawler_images_total', '图片镜像结果数，cached 为缓存命中', ['result'])
@@ -0,0 +1,264 @@
+import asyncio
+import contextlib
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator
+from urllib.parse import urlsplit
+
+from utils.logger import logger
+
+
+class RateLimiter:
+    """
+    令牌桶限流器，线程安全，可在多个下载器之间共享
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        :param rate: 每秒允许的请求数，小于等于 0 时不限流
+        :param burst: 令牌桶容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _try_acquire(self) -> float:
+        """
+        尝试获取一个令牌
+        :return: 获取成功时返回 0，否则返回需要等待的秒数
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            wait_seconds = self._try_acquire()
+            if not wait_seconds:
+                return
+            time.sleep(wait_seconds)
+
+    async def acquire_async(self):
+        """acquire 的 asyncio 版本，等待令牌时不阻塞事件循环"""
+        if self.rate <= 0:
+            return
+        while True:
+            wait_seconds = self._try_acquire()
+            if not wait_seconds:
+                return
+            await asyncio.sleep(wait_seconds)
+
+    def set_rate(self, rate: float):
+        """
+        调整每秒允许的请求数，已积累的令牌保留
+        :param rate: 新的每秒请求数
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+def parse_retry_after(value: str or None) -> float or None:
+    """
+    解析 Retry-After 响应头
+    :param value: 秒数或 HTTP 日期
+    :return: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class _HostState:
+    """单个主机的限流状态"""
+
+    def __init__(self, rate: float, burst: int, min_rate: float, max_concurrency: int, min_concurrency: int):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else 0
+        self.bucket = RateLimiter(rate, burst)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = min(max(min_concurrency, 1), self.max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        # Retry-After 指定的恢复时间（time.monotonic），在此之前不发出新请求
+        self.blocked_until = 0.0
+        self.succeeded = 0
+        self.throttled = 0
+
+
+class HostRateLimiter:
+    """
+    按主机划分的自适应限流器，线程安全，HTML 下载器和图片下载器共享同一个实例：
+    - 每个主机一个令牌桶，控制请求频率
+    - 每个主机的并发请求数按 AIMD 调整：成功时缓慢增加（每个并发窗口约加一），
+      遇到 403/429/5xx 或连接错误、超时时减半，请求频率同样减半，成功后逐步恢复到配置的上限
+    - 响应中包含 Retry-After 时，在指定时间之前不再向该主机发出请求
+    """
+
+    def __init__(self, rate: float = 0, burst: int = 1, min_rate: float = 0.1, max_concurrency: int = 8,
+                 min_concurrency: int = 1, decrease_factor: float = 0.5, hosts: dict = None):
+        """
+        :param rate: 每个主机每秒允许的请求数上限，小于等于 0 时只控制并发数
+        :param burst: 令牌桶容量
+        :param min_rate: 退避后每秒请求数的下限
+        :param max_concurrency: 每个主机的并发请求数上限
+        :param min_concurrency: 退避后并发请求数的下限
+        :param decrease_factor: 遇到限流或错误时请求频率和并发数的缩减比例
+        :param hosts: 按主机覆盖的配置，如 {'blog.csdn.net': {'rate': 2, 'max_concurrency': 8}}
+        """
+        self.defaults = dict(rate=rate, burst=burst, min_rate=min_rate, max_concurrency=max_concurrency,
+                             min_concurrency=min_concurrency)
+        self.hosts = hosts or {}
+        self.decrease_factor = decrease_factor
+        self.states = {}
+        self.condition = threading.Condition()
+
+    def _get_state(self, host: str) -> _HostState:
+        """获取主机的限流状态，调用方需持有锁"""
+        state = self.states.get(host)
+        if state is None:
+            state = _HostState(**{**self.defaults, **self.hosts.get(host, {})})
+            self.states[host] = state
+        return state
+
+    def acquire(self, url: str):
+        """
+        发出请求前调用，主机被 Retry-After 阻塞或并发数已满时阻塞等待，随后等待令牌
+        请求结束后必须调用 release
+        :param url: 请求的 URL
+        """
+        host = urlsplit(url).hostname or ''
+        with self.condition:
+            state = self._get_state(host)
+            while True:
+                wait_seconds = state.blocked_until - time.monotonic()
+                if wait_seconds > 0:
+                    self.condition.wait(wait_seconds)
+                elif state.in_flight < int(state.concurrency):
+                    state.in_flight += 1
+                    break
+                else:
+                    self.condition.wait()
+        state.bucket.acquire()
+
+    def release(self, url: str, status_code: int = None, error: bool = False, retry_after: float = None):
+        """
+        请求结束后调用，根据结果调整该主机的请求频率和并发数
+        :param url: 请求的 URL
+        :param status_code: HTTP 状态码，请求未得到响应时不提供
+        :param error: 是否发生连接错误或超时
+        :param retry_after: 响应头 Retry-After 指定的等待秒数
+        """
+        host = urlsplit(url).hostname or ''
+        throttled = error or status_code in (403, 429) or (status_code or 0) >= 500
+        with self.condition:
+            state = self._get_state(host)
+            state.in_flight -= 1
+            if throttled:
+                state.throttled += 1
+                state.concurrency = max(state.min_concurrency, state.concurrency * self.decrease_factor)
+                if state.max_rate > 0:
+                    state.bucket.set_rate(max(state.min_rate, state.bucket.rate * self.decrease_factor))
+            else:
+                state.succeeded += 1
+                state.concurrency = min(state.max_concurrency, state.concurrency + 1 / state.concurrency)
+                if state.max_rate > 0:
+                    # 每次成功恢复上限的 5%，约 20 次成功后完全恢复
+                    state.bucket.set_rate(min(state.max_rate, state.bucket.rate + state.max_rate * 0.05))
+            if retry_after:
+                state.blocked_until = max(state.blocked_until, time.monotonic() + retry_after)
+            self.condition.notify_all()
+
+    def send(self, url: str, request: Callable):
+        """
+        在限流下发出请求，并根据响应调整限流状态
+        :param url: 请求的 URL
+        :param request: 发出请求的函数，返回 requests.Response，不应在内部重试 429/503（如 urllib3 的状态码重试），
+                        否则限流器只能看到最后一个响应，且在原地等待期间一直占用该主机的并发数
+        :return: request 的返回值，请求异常时原样抛出
+        """
+        self.acquire(url)
+        try:
+            response = request()
+        except Exception:
+            self.release(url, error=True)
+            raise
+        self.release(url, status_code=response.status_code,
+                     retry_after=parse_retry_after(response.headers.get('Retry-After')))
+        return response
+
+    @contextlib.contextmanager
+    def stream(self, url: str, request: Callable) -> Iterator:
+        """
+        在限流下发出流式请求，与 send 不同，并发数一直占用到 with 块结束，即响应体读取完成或中止时才释放，
+        读取大文件期间该主机的并发请求数仍受限制
+        :param url: 请求的 URL
+        :param request: 发出流式请求的函数，返回 requests.Response，要求同 send
+        :return: 上下文管理器，产出 request 的返回值
+        """
+        self.acquire(url)
+        try:
+            response = request()
+        except Exception:
+            self.release(url, error=True)
+            raise
+        try:
+            yield response
+        except OSError:
+            # 读取响应体时连接中断或超时（requests 的异常均为 OSError 的子类）
+            self.release(url, error=True)
+            raise
+        except BaseException:
+            # 调用方主动中止，如 Content-Type 不符或超过大小上限，按响应状态码调整
+            self.release(url, status_code=response.status_code,
+                         retry_after=parse_retry_after(response.headers.get('Retry-After')))
+            raise
+        self.release(url, status_code=response.status_code,
+                     retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+    def stats(self) -> dict:
+        """
+        获取各个主机当前的限流状态
+        :return: {主机: {rate: 每秒请求数, concurrency: 并发数上限, in_flight: 进行中的请求数, succeeded: 成功数, throttled: 被限流数}}
+        """
+        with self.condition:
+            return {
+                host: {
+                    'rate': state.bucket.rate,
+                    'concurrency': int(state.concurrency),
+                    'in_flight': state.in_flight,
+                    'succeeded': state.succeeded,
+                    'throttled': state.throttled,
+                }
+                for host, state in self.states.items()
+            }
+
+    def log_stats(self):
+        """输出各个主机的限流状态"""
+        for host, stats in self.stats().items():
+            rate = f"{stats['rate']:.2f} 次/秒" if stats['rate'] > 0 else '不限'
+            logger.info(f"限流器 {host}: 当前频率 {rate}，并发数 {stats['concurrency']}，"
+                        f"成功 {stats['succeeded']} 次，被限流 {stats['throttled']} 次")
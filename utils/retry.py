@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+
+from utils.metrics import metrics
+
+RETRY_BUDGET_REJECTED = metrics.counter('crawler_retry_budget_rejected_total', '重试预算不足而放弃的重试次数')
+
+
+class RetryLater(Exception):
+    """任务暂时失败，应在 delay 秒后重试，由消费者交给调度器的延迟重试队列，而不是原地等待"""
+
+    def __init__(self, delay: float, reason: str = ''):
+        super().__init__(f"{delay:.2f} 秒后重试: {reason}")
+        self.delay = delay
+        self.reason = reason
+
+
+class RetryBudget:
+    """
+    重试预算，线程安全，所有下载器共享：
+    每个请求存入 ratio 个令牌，每次重试取出一个令牌，另外每秒补充 min_per_second 个令牌保证少量重试，
+    令牌不足时不再重试，避免在目标网站故障期间重试请求占满连接池
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1, max_tokens: float = 100):
+        """
+        :param ratio: 重试请求数与正常请求数的比例上限
+        :param min_per_second: 每秒至少允许的重试次数
+        :param max_tokens: 最多积累的令牌数
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = float(max_tokens)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated_at) * self.min_per_second)
+        self.updated_at = now
+
+    def record_request(self):
+        """每发出一个首次请求时调用"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_retry(self) -> bool:
+        """
+        尝试取出一个重试令牌
+        :return: 是否允许重试
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.rejected += 1
+            RETRY_BUDGET_REJECTED.inc()
+            return False
+
+
+class RetryPolicy:
+    """
+    重试策略：
+    - 按状态码区分可重试的失败（限流、服务端错误）和永久失败（404、410 等），永久失败不重试
+    - 重试间隔按指数增长，并在 [0, 间隔] 内随机取值（full jitter），避免大量请求同时重试
+    - 响应头 Retry-After 指定的等待时间优先
+    - 提供重试预算时，预算耗尽后不再重试
+    """
+    # CSDN 限流时可能返回 403
+    RETRYABLE_STATUS_CODES = frozenset({403, 408, 425, 429, 500, 502, 503, 504})
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1, max_delay: float = 60,
+                 budget: RetryBudget = None, retryable_status_codes=None):
+        """
+        :param max_attempts: 最多尝试次数，包括首次请求
+        :param base_delay: 第一次重试的最大间隔（秒），之后每次翻倍
+        :param max_delay: 重试间隔的上限（秒）
+        :param budget: 重试预算，不提供则不限制
+        :param retryable_status_codes: 可重试的状态码，不提供时使用 RETRYABLE_STATUS_CODES
+        """
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retryable_status_codes = frozenset(retryable_status_codes or self.RETRYABLE_STATUS_CODES)
+
+    def is_retryable(self, status_code: int = None) -> bool:
+        """
+        :param status_code: HTTP 状态码，请求未得到响应（连接错误、超时）时不提供
+        :return: 该失败是否可以重试
+        """
+        return status_code is None or status_code in self.retryable_status_codes
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """
+        :param attempt: 已失败的次数减一，即第几次重试（从 0 开始）
+        :param retry_after: 响应头 Retry-After 指定的等待秒数
+        :return: 重试前需要等待的秒数
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def record_request(self, attempt: int):
+        """
+        每次发出请求时调用，首次请求为重试预算存入令牌
+        :param attempt: 第几次尝试（从 0 开始）
+        """
+        if self.budget and attempt == 0:
+            self.budget.record_request()
+
+    def next_delay(self, attempt: int, status_code: int = None, retry_after: float = None) -> float or None:
+        """
+        请求失败后调用，判断是否重试
+        :param attempt: 失败的是第几次尝试（从 0 开始）
+        :param status_code: HTTP 状态码，请求未得到响应时不提供
+        :param retry_after: 响应头 Retry-After 指定的等待秒数
+        :return: 重试前需要等待的秒数，不应重试时返回 None
+        """
+        if attempt + 1 >= self.max_attempts or not self.is_retryable(status_code):
+            return None
+        if self.budget and not self.budget.try_retry():
+            return None
+        return self.backoff(attempt, retry_after)
@@ -0,0 +1,30 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 不影响页面内容的跟踪参数，规范化 URL 时去除
+TRACKING_PARAMS = {
+    'spm', 'from', 'share_token', 'ops_request_misc', 'request_id', 'biz_id', 'fromshare', 'sharetype',
+    'sharesource', 'sharerId', 'sharerefer', 'fbclid', 'gclid',
+}
+TRACKING_PARAM_PREFIXES = ('utm_', 'depth_1-')
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    规范化 URL，用于去重：
+    - 协议和域名转为小写，去除默认端口
+    - 去除 # 片段
+    - 去除 utm_*、spm 等跟踪参数，其余参数按名称排序
+    :param url: 原始 URL
+    :return: 规范化后的 URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query_params = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PARAM_PREFIXES)
+    ]
+    query = urlencode(sorted(query_params))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))